@@ -0,0 +1,169 @@
+"""
+Benchmark: serialización de listados de fotos (consulta + JSON)
+
+Compara, para proyectos de 1k, 10k y 50k fotos:
+
+- pydantic: objetos ORM validados con List[PhotoResponse] y codificados por
+  FastAPI (camino de response_model anterior)
+- rows/json: filas de columnas y render_rows con el módulo json
+- rows/orjson: filas de columnas y render_rows con orjson
+
+Se mide el tiempo de consulta más serialización sin el coste HTTP, y se
+comprueba que los tres caminos producen el mismo documento.
+
+Uso:
+    python benchmark_serialization.py [--sizes 1000,10000,50000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+# Base de datos temporal: el benchmark no debe tocar la base de datos real
+_tmpdir = tempfile.mkdtemp(prefix="photosite360-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import contextlib
+import io
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.requests import Request
+
+from utils import response_formats
+
+
+def create_photos(project_id, count):
+    """Inserta `count` fotos con coordenadas en todos los sistemas"""
+    db = main.SessionLocal()
+    start = datetime(2024, 1, 1)
+    db.bulk_insert_mappings(main.Photo, [
+        {
+            "title": f"pano_{index}",
+            "description": "Fotografía 360 de benchmark",
+            "url": f"https://example.invalid/photosite360/photos/pano_{index}.jpg",
+            "project_id": project_id,
+            "created_at": start + timedelta(seconds=index),
+            "geo_latitude": 40.4 + index * 1e-6,
+            "geo_longitude": -3.7 - index * 1e-6,
+            "utm_easting": 440000.0 + index * 0.1,
+            "utm_northing": 4470000.0 + index * 0.1,
+            "utm_zone": 30,
+            "utm_hemisphere": "N",
+            "utm_datum": "ETRS89",
+            "project_x": index * 0.1,
+            "project_y": index * 0.1,
+            "project_z": 0.0,
+            "object_type": "360photo",
+            "thumbnail_url": f"https://example.invalid/photosite360/photos/pano_{index}_thumb.jpg",
+        }
+        for index in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+async def pydantic_path(project_id, limit):
+    """Camino anterior: ORM + response_model + JSONResponse"""
+    db = main.SessionLocal()
+    try:
+        photos = db.query(main.Photo).filter(main.Photo.project_id == project_id).order_by(main.Photo.id).limit(limit).all()
+        field = create_response_field(name="Response", type_=List[main.PhotoResponse])
+        content = await serialize_response(field=field, response_content=photos)
+        return JSONResponse(content).body
+    finally:
+        db.close()
+
+
+def rows_path(project_id, limit):
+    """Camino actual: columnas sueltas + render_rows"""
+    db = main.SessionLocal()
+    try:
+        columns = main.listing_columns(main.Photo, main.PhotoResponse.model_fields, None, "objects")
+        rows = (
+            db.query(main.Photo)
+            .filter(main.Photo.project_id == project_id)
+            .with_entities(*[getattr(main.Photo, name) for name in columns])
+            .order_by(main.Photo.id)
+            .limit(limit)
+            .all()
+        )
+        request = Request({"type": "http", "method": "GET", "headers": []})
+        return response_formats.render_rows(request, columns, rows).body
+    finally:
+        db.close()
+
+
+def best_of(repeat, function):
+    timings, body = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), body
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = main.SessionLocal()
+        user = main.User(
+            email="bench@photosite360.local",
+            username="bench",
+            full_name="Benchmark",
+            hashed_password="x"
+        )
+        db.add(user)
+        db.commit()
+        project = main.Project(name="Benchmark", owner_id=user.id)
+        db.add(project)
+        db.commit()
+        project_id = project.id
+        db.close()
+        create_photos(project_id, max(sizes))
+
+    orjson_available = response_formats.ORJSON_AVAILABLE
+
+    print("=" * 80)
+    print("BENCHMARK DE SERIALIZACIÓN DE LISTADOS")
+    print(f"orjson disponible: {orjson_available}")
+    print("=" * 80)
+    print(f"{'filas':>8} {'pydantic':>12} {'rows/json':>12} {'rows/orjson':>12} {'mejora':>8} {'KB':>8}")
+
+    for size in sizes:
+        pydantic_ms, expected = best_of(args.repeat, lambda: asyncio.run(pydantic_path(project_id, size)))
+
+        response_formats.ORJSON_AVAILABLE = False
+        json_ms, json_body = best_of(args.repeat, lambda: rows_path(project_id, size))
+        response_formats.ORJSON_AVAILABLE = orjson_available
+        orjson_ms, orjson_body = (None, json_body)
+        if orjson_available:
+            orjson_ms, orjson_body = best_of(args.repeat, lambda: rows_path(project_id, size))
+
+        reference = json.loads(expected)
+        if json.loads(json_body) != reference or json.loads(orjson_body) != reference:
+            raise SystemExit(f"Las respuestas difieren con {size} filas")
+
+        fastest = orjson_ms or json_ms
+        print(
+            f"{size:>8} {pydantic_ms:>10.1f}ms {json_ms:>10.1f}ms "
+            f"{(f'{orjson_ms:.1f}ms' if orjson_ms else '-'):>12} {pydantic_ms / fastest:>7.1f}x {len(expected) / 1024:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Tamaños de proyecto separados por comas")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se toma la mejor)")
+    run(parser.parse_args())
@@ -0,0 +1,154 @@
+"""
+Benchmark: latencia de GET /api/projects/{id}/photos durante subidas concurrentes
+
+Lanza N subidas simultáneas de fotos 360 y, mientras tanto, mide la latencia
+de peticiones GET al listado de fotos del mismo proyecto. Compara:
+
+- inline: la subida se ejecuta directamente en el event loop (comportamiento antiguo)
+- pool:   la subida se ejecuta en el pool acotado de CloudinaryService
+
+La subida a Cloudinary se sustituye por una espera bloqueante que simula el
+tiempo de red, de modo que el benchmark no necesita credenciales. Con
+STORAGE_BACKEND=local se mide la escritura real en disco.
+
+Uso:
+    python benchmark_uploads.py [--uploads 20] [--upload-seconds 1.5] [--size-mb 5]
+
+Requiere httpx (pip install "httpx<0.28").
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# Base de datos temporal: el benchmark no debe tocar la base de datos real
+_tmpdir = tempfile.mkdtemp(prefix="photosite360-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import contextlib
+import io
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+
+import httpx
+import cloudinary.uploader
+from services import cloudinary_service, storage
+from services.cloudinary_service import CloudinaryService
+
+
+def percentile(values, pct):
+    """Percentil por interpolación lineal"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def fake_upload(upload_seconds):
+    """Sustituto de cloudinary.uploader.upload_large que bloquea como una subida real"""
+    def upload_large(file, **options):
+        chunk_size = options.get("chunk_size", 20 * 1024 * 1024)
+        while file.read(chunk_size):
+            pass
+        time.sleep(upload_seconds)
+        return {"secure_url": f"https://example.invalid/{options.get('public_id')}"}
+    return upload_large
+
+
+async def inline_upload(fileobj, folder, public_id, filename=None):
+    """Comportamiento antiguo: subida síncrona dentro del event loop"""
+    return CloudinaryService.upload_stream(fileobj, folder, public_id, filename)
+
+
+async def run_scenario(name, uploads, size_mb, headers, project_id):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        payload = os.urandom(int(size_mb * 1024 * 1024))
+        latencies = []
+        done = asyncio.Event()
+
+        async def upload(index):
+            response = await client.post(
+                f"/api/projects/{project_id}/photos/upload",
+                files={"file": (f"pano_{index}.jpg", payload, "image/jpeg")},
+                data={"title": f"pano_{index}"},
+                headers=headers
+            )
+            response.raise_for_status()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get(f"/api/projects/{project_id}/photos", headers=headers)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(index) for index in range(uploads)))
+        total = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"[{name}] {uploads} subidas de {size_mb} MB en {total:.2f}s")
+    print(f"   GET /photos: {len(latencies)} peticiones")
+    print(f"   p50 = {percentile(latencies, 50):.1f} ms")
+    print(f"   p99 = {percentile(latencies, 99):.1f} ms")
+    print(f"   max = {max(latencies):.1f} ms")
+
+
+async def run(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = main.SessionLocal()
+        user = main.User(
+            email="bench@photosite360.local",
+            username="bench",
+            full_name="Benchmark",
+            hashed_password=main.get_password_hash("bench")
+        )
+        db.add(user)
+        db.commit()
+        project = main.Project(name="Benchmark", owner_id=user.id)
+        db.add(project)
+        db.commit()
+        project_id = project.id
+        db.close()
+
+    token = main.create_access_token({"sub": "bench@photosite360.local"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    if storage.STORAGE_BACKEND == "cloudinary":
+        cloudinary.uploader.upload_large = fake_upload(args.upload_seconds)
+    original_async = CloudinaryService.upload_stream_async
+
+    print("=" * 80)
+    print("BENCHMARK DE SUBIDAS CONCURRENTES")
+    print(f"STORAGE_BACKEND = {storage.STORAGE_BACKEND}")
+    print(f"UPLOAD_MAX_CONCURRENCY = {cloudinary_service.UPLOAD_MAX_CONCURRENCY}")
+    print("=" * 80)
+
+    # Las trazas de main (middleware de logging) se silencian durante la medición
+    for name, implementation in (("inline", inline_upload), ("pool", original_async)):
+        CloudinaryService.upload_stream_async = staticmethod(implementation)
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer):
+            await run_scenario(name, args.uploads, args.size_mb, headers, project_id)
+        print("\n".join(line for line in buffer.getvalue().splitlines() if line.startswith(("[", "   "))))
+
+    CloudinaryService.upload_stream_async = original_async
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=20, help="Subidas simultáneas")
+    parser.add_argument("--upload-seconds", type=float, default=1.5, help="Duración simulada de cada subida")
+    parser.add_argument("--size-mb", type=float, default=5, help="Tamaño de cada fichero")
+    asyncio.run(run(parser.parse_args()))
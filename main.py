@@ -1,14 +1,14 @@
 from services.email_service import EmailService
 from fastapi import FastAPI, Request, Response
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Body, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Body, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, text, Index, JSON
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, text, Index, JSON, inspect, func, event, cast
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from passlib.context import CryptContext
+from sqlalchemy.orm import sessionmaker, Session, relationship, make_transient_to_detached
 from jose.exceptions import JWTError as JWTException
 from jose import jwt
 from datetime import datetime, timedelta
@@ -16,6 +16,11 @@ from pydantic import BaseModel
 from typing import Optional, List
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import asyncio
+import itertools
+import hashlib
+import json
+import math
 import shutil
 from pathlib import Path
 import re
@@ -30,12 +35,44 @@ load_dotenv()
 
 # ✅ IMPORTS DE SERVICIOS
 from services.cloudinary_service import CloudinaryService
+from services.job_runner import JobRunner
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+from services.upload_sessions import UploadSessionStore
+from services.tile_cache import TileCache
+from services.storage import STORAGE_BACKEND, get_storage_backend
+from utils.static_files import RangeStaticFiles
+from utils.upload_stream import hash_stream
+from utils.image_metadata import read_image_metadata
+from utils.pagination import paginate, parse_bbox, parse_list
+from utils.response_formats import LIST_FORMATS, encode_body, format_rows, render_rows, select_fields
+from utils.spatial_index import bbox_filter, install_spatial_indexes
+from utils.cache import LRUCache
+from utils.mvt import DEFAULT_EXTENT, encode_layer, encode_tile, mercator_to_geo, tile_bounds
+
+# Importación opcional de derivados de imagen (requiere Pillow)
+try:
+    from services.derivatives import DerivativePipeline
+    DERIVATIVES_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️  WARNING: Image derivatives disabled - {e}")
+    DERIVATIVES_AVAILABLE = False
 
 # Importaciones opcionales para coordenadas
 try:
     import pandas as pd
     import openpyxl
-    from utils.coordinate_transforms import CoordinateTransformer
+    from utils.coordinate_transforms import (
+        BATCH_FIELDS,
+        batch_row,
+        get_coordinate_transformer,
+        get_project_frame,
+        invalidate_project_frame,
+        project_frame_cache_stats,
+    )
+    from utils.transformer_registry import get_transformer_registry
+    from services.coordinate_recalculation import CoordinateRecalculator
+    from utils.name_matching import NameMatchIndex
+    from utils.coordinate_import import iter_coordinate_chunks, find_columns
     COORDINATES_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️  WARNING: Coordinate features disabled - {e}")
@@ -45,6 +82,8 @@ except ImportError as e:
 SECRET_KEY = "tu_clave_secreta_super_segura_cambiala_en_produccion"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43200  # 30 días
+# Emails (separados por comas) con acceso a los endpoints internos de diagnóstico
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
 
 # Configuración de Cloudinary
 cloudinary.config(
@@ -112,6 +151,10 @@ class Project(Base):
     map_origin_lng = Column(Float, nullable=True)
     map_rotation = Column(Float, default=0.0)
 
+    # Se incrementa cada vez que cambia la posición o el tipo de un objeto
+    # del proyecto; forma parte de la clave de las cachés del mapa
+    objects_revision = Column(Integer, default=0)
+
     owner = relationship("User", back_populates="projects")
     photos = relationship("Photo", back_populates="project", cascade="all, delete-orphan")
     gallery_images = relationship("GalleryImage", back_populates="project", cascade="all, delete-orphan")
@@ -129,6 +172,10 @@ class Photo(Base):
     # Coordenadas geográficas WGS84
     geo_latitude = Column(Float, nullable=True)
     geo_longitude = Column(Float, nullable=True)
+    geo_altitude = Column(Float, nullable=True)
+
+    # Orientación de la cámara en grados respecto al norte (EXIF/GPano)
+    heading = Column(Float, nullable=True)
 
     # Coordenadas UTM ETRS89
     utm_easting = Column(Float, nullable=True)
@@ -148,8 +195,25 @@ class Photo(Base):
     # Tipo de objeto
     object_type = Column(String, default="360photo")
 
+    # SHA-256 del fichero original (deduplicación de subidas)
+    content_hash = Column(String(64), nullable=True, index=True)
+
+    # Derivados generados tras la subida
+    thumbnail_url = Column(String, nullable=True)
+    preview_url = Column(String, nullable=True)
+    tiles_url = Column(String, nullable=True)
+    tile_config = Column(JSONType, nullable=True)
+
     project = relationship("Project", back_populates="photos")
 
+    # Listados paginados y filtrados por proyecto
+    __table_args__ = (
+        Index('idx_photos_project_id', 'project_id', 'id'),
+        Index('idx_photos_project_created', 'project_id', 'created_at', 'id'),
+        Index('idx_photos_project_type', 'project_id', 'object_type'),
+        Index('idx_photos_project_xy', 'project_id', 'project_x', 'project_y'),
+    )
+
 class GalleryImage(Base):
     __tablename__ = "gallery_images"
     id = Column(Integer, primary_key=True, index=True)
@@ -172,6 +236,10 @@ class GalleryImage(Base):
     # Coordenadas geográficas WGS84
     geo_latitude = Column(Float, nullable=True)
     geo_longitude = Column(Float, nullable=True)
+    geo_altitude = Column(Float, nullable=True)
+
+    # Orientación de la cámara en grados respecto al norte (EXIF/GPano)
+    heading = Column(Float, nullable=True)
 
     # Coordenadas UTM ETRS89
     utm_easting = Column(Float, nullable=True)
@@ -191,8 +259,25 @@ class GalleryImage(Base):
     # Tipo de objeto
     object_type = Column(String, default="image")
 
+    # SHA-256 del fichero original (deduplicación de subidas)
+    content_hash = Column(String(64), nullable=True, index=True)
+
+    # Derivados generados tras la subida
+    thumbnail_url = Column(String, nullable=True)
+    preview_url = Column(String, nullable=True)
+
     project = relationship("Project", back_populates="gallery_images")
 
+    # Listados paginados y filtrados por proyecto
+    __table_args__ = (
+        Index('idx_gallery_project_id', 'project_id', 'id'),
+        Index('idx_gallery_project_uploaded', 'project_id', 'uploaded_at', 'id'),
+        Index('idx_gallery_project_level', 'project_id', 'level'),
+        Index('idx_gallery_project_room', 'project_id', 'room'),
+        Index('idx_gallery_project_image_type', 'project_id', 'image_type'),
+        Index('idx_gallery_project_xy', 'project_id', 'project_x', 'project_y'),
+    )
+
 class Incident(Base):
     __tablename__ = "incidents"
     id = Column(Integer, primary_key=True, index=True)
@@ -226,6 +311,15 @@ class Incident(Base):
 
     project = relationship("Project", back_populates="incidents")
 
+    # Listados paginados y filtrados por proyecto
+    __table_args__ = (
+        Index('idx_incidents_project_id', 'project_id', 'id'),
+        Index('idx_incidents_project_created', 'project_id', 'created_at', 'id'),
+        Index('idx_incidents_project_status', 'project_id', 'status'),
+        Index('idx_incidents_project_severity', 'project_id', 'severity'),
+        Index('idx_incidents_project_xy', 'project_id', 'project_x', 'project_y'),
+    )
+
 class Invitation(Base):
     __tablename__ = "invitations"
     id = Column(Integer, primary_key=True, index=True)
@@ -235,56 +329,82 @@ class Invitation(Base):
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False)
 
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False)
+    project_id = Column(Integer, index=True)
+    owner_id = Column(Integer, index=True)
+
+    # Estado: 'queued', 'running', 'completed', 'failed'
+    status = Column(String, default="queued", index=True)
+
+    # Progreso
+    total_items = Column(Integer, nullable=True)
+    processed_items = Column(Integer, default=0)
+    updated_items = Column(Integer, default=0)
+    rows_per_second = Column(Float, nullable=True)
+    errors = Column(JSONType, default=[])
+    error_count = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
 # Crear tablas
 Base.metadata.create_all(bind=engine)
 
+# Columnas añadidas después de crear las tablas: (tabla, columna, definición SQL)
+AUTO_MIGRATION_COLUMNS = [
+    ("photos", "coordinate_source", "VARCHAR DEFAULT 'manual'"),
+    ("gallery_images", "coordinate_source", "VARCHAR DEFAULT 'manual'"),
+    ("photos", "thumbnail_url", "VARCHAR"),
+    ("photos", "preview_url", "VARCHAR"),
+    ("photos", "tiles_url", "VARCHAR"),
+    ("photos", "tile_config", "JSONB" if IS_POSTGRES else "JSON"),
+    ("gallery_images", "thumbnail_url", "VARCHAR"),
+    ("gallery_images", "preview_url", "VARCHAR"),
+    ("photos", "content_hash", "VARCHAR(64)"),
+    ("gallery_images", "content_hash", "VARCHAR(64)"),
+    ("photos", "geo_altitude", "FLOAT"),
+    ("photos", "heading", "FLOAT"),
+    ("gallery_images", "geo_altitude", "FLOAT"),
+    ("gallery_images", "heading", "FLOAT"),
+    ("projects", "objects_revision", "INTEGER DEFAULT 0"),
+]
+
 # Función para ejecutar migraciones automáticas
 def run_auto_migrations():
     """Ejecuta migraciones necesarias para agregar campos faltantes"""
     try:
+        inspector = inspect(engine)
+        existing = {}
         with engine.connect() as conn:
-            # Verificar si coordinate_source existe en photos
-            result = conn.execute(text("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name = 'photos' AND column_name = 'coordinate_source'
-            """))
-
-            if not result.fetchone():
-                print("⚙️  Running migration: Adding coordinate_source to photos...")
-                conn.execute(text("""
-                    ALTER TABLE photos
-                    ADD COLUMN coordinate_source VARCHAR DEFAULT 'manual'
-                """))
-                conn.commit()
-                print("✅ Migration complete: coordinate_source added to photos")
-
-            # Verificar si coordinate_source existe en gallery_images
-            result = conn.execute(text("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name = 'gallery_images' AND column_name = 'coordinate_source'
-            """))
-
-            if not result.fetchone():
-                print("⚙️  Running migration: Adding coordinate_source to gallery_images...")
-                conn.execute(text("""
-                    ALTER TABLE gallery_images
-                    ADD COLUMN coordinate_source VARCHAR DEFAULT 'manual'
-                """))
+            for table, column, definition in AUTO_MIGRATION_COLUMNS:
+                if table not in existing:
+                    existing[table] = {c["name"] for c in inspector.get_columns(table)}
+                if column in existing[table]:
+                    continue
+
+                print(f"⚙️  Running migration: Adding {column} to {table}...")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
                 conn.commit()
-                print("✅ Migration complete: coordinate_source added to gallery_images")
+                existing[table].add(column)
+                print(f"✅ Migration complete: {column} added to {table}")
+
+            # Índices declarados en los modelos que falten en tablas ya existentes
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn, checkfirst=True)
+            conn.commit()
 
     except Exception as e:
         print(f"⚠️  Migration warning: {e}")
         # No fallar si la migración tiene problemas, solo advertir
 
 # Ejecutar migraciones automáticas
-if DATABASE_URL.startswith("postgresql://"):
-    run_auto_migrations()
+run_auto_migrations()
 
-# Contexto de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # ============================================================================
@@ -511,6 +631,48 @@ class ProjectUpdate(BaseModel):
     map_origin_lng: Optional[float] = None
     map_rotation: Optional[float] = None
 
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None
+    title: Optional[str] = ""
+    description: Optional[str] = ""
+    geo_latitude: Optional[float] = None
+    geo_longitude: Optional[float] = None
+    geo_altitude: Optional[float] = None
+    heading: Optional[float] = None
+    utm_easting: Optional[float] = None
+    utm_northing: Optional[float] = None
+    utm_zone: Optional[int] = None
+    utm_hemisphere: Optional[str] = None
+    utm_datum: Optional[str] = "ETRS89"
+    project_x: Optional[float] = None
+    project_y: Optional[float] = None
+    project_z: Optional[float] = None
+
+class GalleryUploadItem(BaseModel):
+    image_type: Optional[str] = "edification"
+    level: Optional[str] = None
+    room: Optional[str] = None
+    pk_value: Optional[str] = None
+    section: Optional[str] = None
+    custom_tags: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    geo_latitude: Optional[float] = None
+    geo_longitude: Optional[float] = None
+    geo_altitude: Optional[float] = None
+    heading: Optional[float] = None
+    utm_easting: Optional[float] = None
+    utm_northing: Optional[float] = None
+    utm_zone: Optional[int] = None
+    utm_hemisphere: Optional[str] = None
+    utm_datum: Optional[str] = "ETRS89"
+    project_x: Optional[float] = None
+    project_y: Optional[float] = None
+    project_z: Optional[float] = None
+
 class PhotoResponse(BaseModel):
     id: int
     title: str
@@ -520,6 +682,8 @@ class PhotoResponse(BaseModel):
     created_at: datetime
     geo_latitude: Optional[float] = None
     geo_longitude: Optional[float] = None
+    geo_altitude: Optional[float] = None
+    heading: Optional[float] = None
     utm_easting: Optional[float] = None
     utm_northing: Optional[float] = None
     utm_zone: Optional[int] = None
@@ -529,6 +693,9 @@ class PhotoResponse(BaseModel):
     project_y: Optional[float] = None
     project_z: Optional[float] = None
     object_type: Optional[str] = "360photo"
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    tiles_url: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -550,6 +717,8 @@ class GalleryImageResponse(BaseModel):
     custom_tags: List[str] = []
     geo_latitude: Optional[float] = None
     geo_longitude: Optional[float] = None
+    geo_altitude: Optional[float] = None
+    heading: Optional[float] = None
     utm_easting: Optional[float] = None
     utm_northing: Optional[float] = None
     utm_zone: Optional[int] = None
@@ -559,6 +728,8 @@ class GalleryImageResponse(BaseModel):
     project_y: Optional[float] = None
     project_z: Optional[float] = None
     object_type: Optional[str] = "image"
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -566,6 +737,165 @@ class GalleryImageResponse(BaseModel):
 # FastAPI app
 app = FastAPI(title="PhotoSite360 API")
 
+# Trabajos en segundo plano (recálculos de coordenadas, etc.)
+job_runner = JobRunner()
+MAX_STORED_JOB_ERRORS = 100
+
+# Hashing de contraseñas (bcrypt) en un pool propio
+password_hasher = PasswordHasher()
+
+# Subidas reanudables por bloques (fotos 360 grandes)
+upload_sessions = UploadSessionStore()
+
+# Miniaturas, vistas previas y teselas 360 (pool de procesos)
+derivative_pipeline = DerivativePipeline() if DERIVATIVES_AVAILABLE else None
+
+def embedded_coordinates(fileobj, project: Project) -> dict:
+    """
+    Coordenadas a partir de los metadatos GPS/GPano de la imagen
+
+    Solo se leen las cabeceras del JPEG. Si hay posición se completan UTM
+    y, con origen de proyecto, las coordenadas locales.
+    """
+    metadata = read_image_metadata(fileobj)
+    values = {key: metadata[key] for key in ("geo_altitude", "heading") if key in metadata}
+    latitude, longitude = metadata.get("geo_latitude"), metadata.get("geo_longitude")
+    if latitude is None or longitude is None:
+        return values
+
+    values.update(geo_latitude=latitude, geo_longitude=longitude, coordinate_source="geo")
+    if COORDINATES_AVAILABLE:
+        frame = get_project_frame(project)
+        utm = get_coordinate_transformer().geo_to_utm(latitude, longitude, frame.utm_zone if frame else None)
+        values.update(utm)
+        if frame:
+            values.update(frame.utm_to_local(utm["utm_easting"], utm["utm_northing"]))
+    return values
+
+POSITION_FIELDS = ("geo_latitude", "geo_longitude", "utm_easting", "utm_northing", "project_x", "project_y")
+
+def apply_embedded_coordinates(record, embedded: dict):
+    """
+    Aplica las coordenadas de los metadatos sin pisar las del cliente
+
+    Si el cliente envió alguna posición solo se completan altitud y rumbo.
+    """
+    has_position = any(getattr(record, field) is not None for field in POSITION_FIELDS)
+    for field, value in embedded.items():
+        if has_position and field not in ("geo_altitude", "heading"):
+            continue
+        if getattr(record, field) is None:
+            setattr(record, field, value)
+
+DERIVATIVE_COLUMNS = ("thumbnail_url", "preview_url", "tiles_url", "tile_config")
+
+def find_duplicate_asset(db: Session, model, content_hash: str, project_id: int, owner_id: Optional[int] = None):
+    """
+    Registro ya subido con el mismo contenido (SHA-256)
+
+    Se prefiere uno del mismo proyecto: en ese caso la subida no crea nada
+    nuevo. Si solo existe en otro proyecto se reutiliza su fichero.
+
+    Args:
+        owner_id: Limitar a proyectos de este usuario (cuando el hash lo
+            declara el cliente en lugar de calcularse con el fichero)
+    """
+    if not content_hash:
+        return None
+    query = db.query(model).filter(model.content_hash == content_hash.lower())
+    if owner_id is not None:
+        query = query.join(Project, Project.id == model.project_id).filter(Project.owner_id == owner_id)
+    return query.order_by(model.project_id != project_id, model.id).first()
+
+def reused_derivatives(model, duplicate) -> dict:
+    """Derivados de un registro duplicado para copiarlos al nuevo"""
+    if duplicate is None:
+        return {}
+    return {column: getattr(duplicate, column) for column in DERIVATIVE_COLUMNS if hasattr(model, column)}
+
+def save_derivatives(model, record_id: int):
+    """Callback de DerivativePipeline que guarda las URLs en el registro"""
+    def apply(derivatives: dict):
+        values = {
+            model.thumbnail_url: derivatives["thumbnail_url"],
+            model.preview_url: derivatives["preview_url"],
+        }
+        if derivatives.get("tiles"):
+            values[model.tiles_url] = derivatives["tiles"]["url_template"]
+            values[model.tile_config] = derivatives["tiles"]
+        db = SessionLocal()
+        try:
+            db.query(model).filter(model.id == record_id).update(values, synchronize_session=False)
+            # thumbnail_url se publica en las teselas vectoriales
+            project_id = db.query(model.project_id).filter(model.id == record_id).scalar()
+            bump_objects_revision(db, [project_id])
+            db.commit()
+        finally:
+            db.close()
+    return apply
+
+# ============================================================================
+# REVISIÓN DE OBJETOS DEL PROYECTO (CACHÉS DEL MAPA)
+# ============================================================================
+
+# Modelos que se dibujan en el mapa y columnas que cambian su agregación
+MAP_MODELS = (Photo, GalleryImage, Incident, ProjectObject)
+MAP_TRACKED_COLUMNS = ("project_id", "utm_easting", "utm_northing", "object_type", "severity")
+# Atributos publicados o filtrables en las teselas vectoriales (MVT_LAYER_PROPERTIES)
+MAP_TILE_COLUMNS = (
+    "title", "filename", "name", "heading", "thumbnail_url", "incident_type", "status",
+    "image_type", "level", "room", "pk_value", "group_name", "pk", "axis",
+)
+
+# Clusters por (proyecto, revisión, zoom, celda, tesela, capas)
+map_cluster_cache = LRUCache(maxsize=int(os.getenv("MAP_CLUSTER_CACHE_SIZE", "4096")))
+
+def bump_objects_revision(db, project_ids):
+    """
+    Incrementa Project.objects_revision de los proyectos indicados
+
+    Los cambios hechos con el ORM se detectan solos (track_map_changes);
+    las escrituras masivas (bulk_update_mappings, SQL directo) deben llamar
+    a esta función antes de su commit.
+
+    Args:
+        db: Session o Connection (se ejecuta en su transacción)
+    """
+    ids = {project_id for project_id in project_ids if project_id is not None}
+    if not ids:
+        return
+    projects = Project.__table__
+    db.execute(
+        projects.update()
+        .where(projects.c.id.in_(ids))
+        .values(objects_revision=func.coalesce(projects.c.objects_revision, 0) + 1)
+    )
+    map_cluster_cache.invalidate(lambda key: key[0] in ids)
+
+@event.listens_for(SessionLocal, "before_flush")
+def track_map_changes(session, flush_context, instances):
+    """Sube la revisión de los proyectos cuyos objetos del mapa cambian en este flush"""
+    project_ids = set()
+    for obj in itertools.chain(session.new, session.deleted):
+        if isinstance(obj, MAP_MODELS):
+            project_ids.add(obj.project_id)
+
+    for obj in session.dirty:
+        if not isinstance(obj, MAP_MODELS):
+            continue
+        state = inspect(obj)
+        for name in MAP_TRACKED_COLUMNS + MAP_TILE_COLUMNS:
+            if not hasattr(type(obj), name):
+                continue
+            history = state.attrs[name].history
+            if history.has_changes():
+                project_ids.add(obj.project_id)
+                if name == "project_id":
+                    project_ids.update(history.deleted)
+
+    if project_ids:
+        bump_objects_revision(session.connection(), project_ids)
+
 # Crear tablas extendidas al iniciar la aplicacion
 @app.on_event("startup")
 async def startup_event():
@@ -578,6 +908,41 @@ async def startup_event():
         import traceback
         traceback.print_exc()
 
+    try:
+        install_spatial_indexes(engine)
+    except Exception as e:
+        print(f"[SPATIAL] Error creando índices espaciales: {e}")
+
+    # Los trabajos en curso de un proceso anterior no se reanudan
+    db = SessionLocal()
+    try:
+        interrupted = db.query(BackgroundJob).filter(
+            BackgroundJob.status.in_(["queued", "running"])
+        ).update({
+            BackgroundJob.status: "failed",
+            BackgroundJob.errors: ["Trabajo interrumpido por reinicio del servidor"],
+            BackgroundJob.finished_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        if interrupted:
+            print(f"[JOBS] {interrupted} trabajos interrumpidos marcados como fallidos")
+    except Exception as e:
+        print(f"[JOBS] Error revisando trabajos pendientes: {e}")
+    finally:
+        db.close()
+
+    try:
+        upload_sessions.collect_garbage()
+    except Exception as e:
+        print(f"[UPLOADS] Error limpiando sesiones de subida: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    job_runner.shutdown(wait=False)
+    password_hasher.shutdown(wait=False)
+    if derivative_pipeline:
+        derivative_pipeline.shutdown(wait=False)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -589,8 +954,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
+# Almacenamiento local: las imágenes se sirven desde la propia API
+if STORAGE_BACKEND == "local":
+    local_storage = get_storage_backend()
+    app.mount(local_storage.base_url, RangeStaticFiles(directory=local_storage.root), name="media")
+
 # Middleware para logging
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -609,11 +980,16 @@ def get_db():
         db.close()
 
 # Utilidades
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    """Hash síncrono para scripts; los endpoints usan password_hasher"""
+    return password_hasher.context.hash(password)
+
+def password_hasher_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many login requests, please retry",
+        headers={"Retry-After": "1"}
+    )
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -632,45 +1008,149 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except JWTException:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
+    # Usuario cacheado: se reincorpora a la sesión sin consultar la base de datos
+    cached = user_cache.get(email)
+    if cached is not None:
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
     user = db.query(User).filter(User.email == email).first()
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
+    user_cache.set(email, {column: getattr(user, column) for column in USER_CACHE_COLUMNS})
     return user
 
+def require_admin(current_user: User = Depends(get_current_user)):
+    """Dependencia que limita un endpoint a los usuarios de ADMIN_EMAILS"""
+    if (current_user.email or "").lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+# Usuarios autenticados por email (sub del token). El TTL acota el tiempo que
+# otro worker puede ver datos antiguos; en este proceso los cambios se
+# invalidan al momento con los eventos de User
+user_cache = LRUCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
+# El hash de la contraseña no se guarda en memoria: se carga si se accede a él
+USER_CACHE_COLUMNS = ("id", "email", "full_name", "username", "created_at")
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target):
+    """Quita de la caché al usuario modificado o borrado (también con su email anterior)"""
+    history = inspect(target).attrs.email.history
+    for email in [target.email, *history.deleted]:
+        if email:
+            user_cache.pop(email)
+
+# Decisiones de acceso por (usuario, proyecto) con los datos del proyecto que
+# usan los endpoints (origen y rotación del mapa). También se guardan las
+# denegaciones; cualquier cambio en el proyecto invalida sus entradas
+project_access_cache = LRUCache(
+    maxsize=int(os.getenv("PROJECT_ACCESS_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PROJECT_ACCESS_CACHE_TTL", "60"))
+)
+# objects_revision cambia con cada edición del mapa: se lee siempre de la base de datos
+PROJECT_ACCESS_COLUMNS = tuple(
+    column for column in Project.__table__.columns.keys() if column != "objects_revision"
+)
+
+def project_role(project: Project, user: User) -> Optional[str]:
+    """
+    Rol del usuario en el proyecto o None si no tiene acceso
+
+    Único punto de decisión de permisos de los endpoints de proyecto
+    (ver get_project_access); de momento solo existe el propietario.
+    """
+    if project.owner_id == user.id:
+        return "owner"
+    return None
+
+def get_project_access(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Project:
+    """
+    Dependencia de los endpoints /api/projects/{project_id}/...
+
+    Returns:
+        Proyecto incorporado a la sesión de la petición. Con la decisión en
+        caché no se consulta la base de datos (los atributos no cacheados se
+        cargan al acceder a ellos)
+
+    Raises:
+        HTTPException 404: el proyecto no existe o el usuario no tiene acceso
+    """
+    key = (current_user.id, project_id)
+    cached = project_access_cache.get(key)
+    if cached is None:
+        project = db.query(Project).filter(Project.id == project_id).first()
+        role = project_role(project, current_user) if project else None
+        cached = {
+            "role": role,
+            "project": {column: getattr(project, column) for column in PROJECT_ACCESS_COLUMNS} if role else None
+        }
+        project_access_cache.set(key, cached)
+        if role:
+            return project
+
+    if not cached["role"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project = Project(**cached["project"])
+    make_transient_to_detached(project)
+    return db.merge(project, load=False)
+
+@event.listens_for(Project, "after_insert")
+@event.listens_for(Project, "after_update")
+@event.listens_for(Project, "after_delete")
+def invalidate_project_access(mapper, connection, target):
+    """Quita las decisiones de acceso cacheadas del proyecto (de todos los usuarios)"""
+    project_access_cache.invalidate(lambda key: key[1] == target.id)
+
 # Endpoints
 @app.get("/")
 def read_root():
     return {"message": "PhotoSite360 API is running"}
 
-@app.post("/api/auth/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Verificar invitación si es necesario
-    if user.invitation_token:
-        invitation = db.query(Invitation).filter(
-            Invitation.token == user.invitation_token,
-            Invitation.used == False,
-            Invitation.expires_at > datetime.utcnow()
-        ).first()
-
-        if not invitation:
-            raise HTTPException(status_code=400, detail="Invalid or expired invitation token")
-
-        # Marcar invitación como usada
-        invitation.used = True
-        db.commit()
-
-    # Verificar si el email ya existe
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    # Verificar si el username ya existe
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already taken")
+# Las partes de base de datos de register/login se ejecutan en el threadpool
+# (los endpoints son async para esperar a password_hasher sin ocupar un hilo)
+def check_registration(db: Session, user: UserCreate):
+    """Valida la invitación y que email y username estén libres (HTTPException 400 si no)"""
+    try:
+        # Verificar invitación si es necesario
+        if user.invitation_token:
+            invitation = db.query(Invitation).filter(
+                Invitation.token == user.invitation_token,
+                Invitation.used == False,
+                Invitation.expires_at > datetime.utcnow()
+            ).first()
+
+            if not invitation:
+                raise HTTPException(status_code=400, detail="Invalid or expired invitation token")
+
+            # Marcar invitación como usada
+            invitation.used = True
+            db.commit()
+
+        # Verificar si el email ya existe
+        db_user = db.query(User).filter(User.email == user.email).first()
+        if db_user:
+            raise HTTPException(status_code=400, detail="Email already registered")
+
+        # Verificar si el username ya existe
+        db_user = db.query(User).filter(User.username == user.username).first()
+        if db_user:
+            raise HTTPException(status_code=400, detail="Username already taken")
+    finally:
+        # La conexión vuelve al pool mientras se espera a bcrypt
+        db.close()
 
-    # Crear nuevo usuario
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: str) -> int:
     db_user = User(
         email=user.email,
         full_name=user.full_name,
@@ -680,31 +1160,66 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    return db_user.id
+
+def find_login_user(db: Session, email: str) -> Optional[dict]:
+    """id, email y hash del usuario (la sesión se cierra antes de verificar)"""
+    try:
+        db_user = db.query(User).filter(User.email == email).first()
+        if not db_user:
+            return None
+        return {"id": db_user.id, "email": db_user.email, "hashed_password": db_user.hashed_password}
+    finally:
+        db.close()
+
+def store_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(User).filter(User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
 
-    return {"message": "User created successfully", "user_id": db_user.id}
+@app.post("/api/auth/register")
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    await run_in_threadpool(check_registration, db, user)
+
+    # Crear nuevo usuario
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+    user_id = await run_in_threadpool(create_user, db, user, hashed_password)
+
+    return {"message": "User created successfully", "user_id": user_id}
 
 @app.post("/api/auth/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: Session = Depends(get_db)):
     print(f"[LOGIN] Intento de login: {user.email}")
 
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await run_in_threadpool(find_login_user, db, user.email)
 
     if not db_user:
         print(f"[LOGIN] Usuario no encontrado: {user.email}")
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
-    print(f"[LOGIN] Usuario encontrado: ID={db_user.id}, Email={db_user.email}")
-    print(f"[LOGIN] Hash almacenado: {db_user.hashed_password[:50]}...")
+    print(f"[LOGIN] Usuario encontrado: ID={db_user['id']}, Email={db_user['email']}")
+    print(f"[LOGIN] Hash almacenado: {db_user['hashed_password'][:50]}...")
 
-    password_valid = verify_password(user.password, db_user.hashed_password)
+    try:
+        password_valid, new_hash = await password_hasher.verify_and_update(user.password, db_user["hashed_password"])
+    except PasswordHasherBusy:
+        print(f"[LOGIN] Cola de contraseñas llena, login rechazado: {user.email}")
+        raise password_hasher_busy()
     print(f"[LOGIN] Password valido?: {password_valid}")
 
     if not password_valid:
         print(f"[LOGIN] Password incorrecto para: {user.email}")
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
-    access_token = create_access_token(data={"sub": db_user.email})
-    print(f"[LOGIN] Login exitoso para {db_user.email}")
+    # Hash con otro coste (BCRYPT_ROUNDS cambiado): se guarda el regenerado
+    if new_hash:
+        await run_in_threadpool(store_password_hash, db, db_user["id"], new_hash)
+        print(f"[LOGIN] Hash de contraseña actualizado para {db_user['email']}")
+
+    access_token = create_access_token(data={"sub": db_user["email"]})
+    print(f"[LOGIN] Login exitoso para {db_user['email']}")
 
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -732,30 +1247,18 @@ def get_projects(db: Session = Depends(get_db), current_user: User = Depends(get
     return projects
 
 @app.get("/api/projects/{project_id}")
-def get_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+def get_project(project_id: int, project: Project = Depends(get_project_access), db: Session = Depends(get_db)):
+    # Respuesta completa: objects_revision no está en la caché de acceso
+    db.refresh(project)
     return project
 
 @app.put("/api/projects/{project_id}")
 def update_project(
     project_id: int,
     project_update: ProjectUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     update_data = project_update.dict(exclude_unset=True)
     print(f"[PROJECT] Proyecto {project_id} actualizado: {update_data}")
 
@@ -765,21 +1268,126 @@ def update_project(
     db.commit()
     db.refresh(project)
 
+    if COORDINATES_AVAILABLE and {'map_origin_lat', 'map_origin_lng', 'map_rotation'} & update_data.keys():
+        invalidate_project_frame(project_id)
+
     return project
 
 @app.delete("/api/projects/{project_id}")
-def delete_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
+def delete_project(project_id: int, project: Project = Depends(get_project_access), db: Session = Depends(get_db)):
     db.delete(project)
     db.commit()
+
+    if COORDINATES_AVAILABLE:
+        invalidate_project_frame(project_id)
+    tile_cache.purge(project_id)
+
     return {"message": "Project deleted successfully"}
 
+# Listados paginados: columnas de posición según el sistema del bbox
+BBOX_COLUMNS = {
+    "local": ("project_x", "project_y"),
+    "utm": ("utm_easting", "utm_northing"),
+    "geo": ("geo_longitude", "geo_latitude"),
+}
+
+def filter_listing(query, model, timestamp_column, filters: dict, date_from=None, date_to=None,
+                   bbox: Optional[str] = None, bbox_crs: str = "local"):
+    """
+    Filtros comunes de los listados de fotos, galería e incidencias
+
+    Args:
+        filters: {columna: "valor1,valor2"}; los valores vacíos se ignoran
+        bbox: 'min_x,min_y,max_x,max_y' en el sistema `bbox_crs`
+            ('local', 'utm' o 'geo' con lon,lat)
+
+    Raises:
+        HTTPException 400: bbox o sistema no válidos
+    """
+    for column, value in filters.items():
+        values = parse_list(value)
+        if values:
+            query = query.filter(getattr(model, column).in_(values))
+
+    if date_from is not None:
+        query = query.filter(timestamp_column >= date_from)
+    if date_to is not None:
+        query = query.filter(timestamp_column <= date_to)
+
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if box:
+        if bbox_crs not in BBOX_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"bbox_crs must be one of: {', '.join(BBOX_COLUMNS)}")
+        x_column, y_column = (getattr(model, name) for name in BBOX_COLUMNS[bbox_crs])
+        query = query.filter(x_column.between(box[0], box[2]), y_column.between(box[1], box[3]))
+    return query
+
+def paginate_listing(query, response: Response, model, timestamp_column, sort: str, order: str,
+                     limit: Optional[int], cursor: Optional[str], include_total: bool,
+                     columns: Optional[List[str]] = None):
+    """
+    Página de un listado; el cursor siguiente y el total van en cabeceras
+
+    El cuerpo sigue siendo una lista para no romper a los clientes actuales,
+    que tampoco envían limit ni cursor y reciben el listado completo.
+    X-Next-Cursor solo aparece si hay más resultados; X-Total-Count solo con
+    include_total=true (cuenta todas las filas filtradas).
+
+    Con `columns` se leen solo esas columnas (filas en lugar de objetos ORM);
+    la columna de orden se añade al final si hace falta para el cursor.
+    """
+    if sort not in ("id", "created_at"):
+        raise HTTPException(status_code=400, detail="sort must be 'id' or 'created_at'")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+    if include_total:
+        total = query.order_by(None).with_entities(func.count(model.id)).scalar()
+        response.headers["X-Total-Count"] = str(total)
+
+    if columns:
+        selected = [getattr(model, name) for name in columns]
+        if sort != "id" and timestamp_column.key not in columns:
+            selected.append(timestamp_column)
+        query = query.with_entities(*selected)
+
+    try:
+        rows, next_cursor = paginate(
+            query, model.id, timestamp_column, sort=sort, limit=limit,
+            cursor=cursor, descending=(order == "desc")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+def listing_columns(model, default_fields, fields: Optional[str], list_format: str) -> List[str]:
+    """
+    Columnas que se leen para un listado (?fields= o los campos por defecto)
+
+    Los listados leen filas de columnas en lugar de objetos ORM y se
+    serializan directamente con render_rows, sin validar cada fila con el
+    modelo Pydantic: los datos vienen de nuestra propia base de datos. El
+    response_model del endpoint se mantiene para la documentación OpenAPI.
+
+    Args:
+        default_fields: Campos sin ?fields= (los del modelo de respuesta)
+
+    Raises:
+        HTTPException 400: formato o campos desconocidos
+    """
+    if list_format not in LIST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(LIST_FORMATS)}")
+    try:
+        return select_fields(model, fields, default_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Endpoints de fotos 360
 @app.post("/api/projects/{project_id}/photos/upload")
 async def upload_photo(
@@ -790,6 +1398,8 @@ async def upload_photo(
     # Coordenadas geográficas WGS84
     geo_latitude: Optional[float] = Form(None),
     geo_longitude: Optional[float] = Form(None),
+    geo_altitude: Optional[float] = Form(None),
+    heading: Optional[float] = Form(None),
     # Coordenadas UTM ETRS89
     utm_easting: Optional[float] = Form(None),
     utm_northing: Optional[float] = Form(None),
@@ -800,29 +1410,36 @@ async def upload_photo(
     project_x: Optional[float] = Form(None),
     project_y: Optional[float] = Form(None),
     project_z: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    # Verificar que el proyecto pertenece al usuario
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Subir a Cloudinary
-    print(f"Subiendo foto 360: {file.filename}")
-    file_content = await file.read()
-    cloudinary_response = cloudinary.uploader.upload(
-        file_content,
-        folder=f"photosite360/photos/project_{project_id}",
-        public_id=f"photo_{datetime.utcnow().timestamp()}_{file.filename}",
-        resource_type="image"
-    )
+    # Deduplicación: mismo contenido ya subido
+    content_hash, _ = await run_in_threadpool(hash_stream, file.file)
+    duplicate = find_duplicate_asset(db, Photo, content_hash, project_id)
+    if duplicate and duplicate.project_id == project_id:
+        print(f"Foto 360 duplicada (sha256={content_hash}): ya existe con ID {duplicate.id}")
+        return {
+            "id": duplicate.id,
+            "title": duplicate.title,
+            "url": duplicate.url,
+            "duplicate": True,
+            "message": "Photo already uploaded"
+        }
 
-    cloudinary_url = cloudinary_response.get("secure_url")
-    print(f"Foto 360 subida exitosamente: {cloudinary_url}")
+    folder = f"photosite360/photos/project_{project_id}"
+    public_id = f"photo_{datetime.utcnow().timestamp()}_{file.filename}"
+    if duplicate:
+        cloudinary_url = duplicate.url
+        print(f"Foto 360 ya almacenada (sha256={content_hash}): se reutiliza {cloudinary_url}")
+    else:
+        # Subir a Cloudinary
+        print(f"Subiendo foto 360: {file.filename}")
+        upload = await CloudinaryService.upload_stream_async(file.file, folder, public_id, file.filename, content_hash)
+        cloudinary_url = upload["url"]
+        if not cloudinary_url:
+            raise HTTPException(status_code=502, detail="Error uploading image to storage")
+
+        print(f"Foto 360 subida exitosamente: {cloudinary_url} ({upload['size']} bytes, sha256={content_hash})")
 
     # Crear registro en la base de datos
     photo = Photo(
@@ -832,6 +1449,8 @@ async def upload_photo(
         project_id=project_id,
         geo_latitude=geo_latitude,
         geo_longitude=geo_longitude,
+        geo_altitude=geo_altitude,
+        heading=heading,
         utm_easting=utm_easting,
         utm_northing=utm_northing,
         utm_zone=utm_zone,
@@ -840,34 +1459,104 @@ async def upload_photo(
         project_x=project_x,
         project_y=project_y,
         project_z=project_z,
-        object_type="360photo"
+        object_type="360photo",
+        content_hash=content_hash,
+        **reused_derivatives(Photo, duplicate)
     )
 
+    # Posición y rumbo de los metadatos EXIF/XMP de la cámara
+    apply_embedded_coordinates(photo, await run_in_threadpool(embedded_coordinates, file.file, project))
+
     db.add(photo)
     db.commit()
     db.refresh(photo)
 
     print(f"Foto 360 guardada con ID: {photo.id}")
-    print(f"Coordenadas: WGS84({geo_latitude},{geo_longitude}), UTM({utm_easting},{utm_northing}), Proyecto({project_x},{project_y},{project_z})")
+    print(f"Coordenadas: WGS84({photo.geo_latitude},{photo.geo_longitude}), UTM({photo.utm_easting},{photo.utm_northing}), Proyecto({photo.project_x},{photo.project_y},{photo.project_z})")
+
+    # Miniatura, vista previa y teselas 360 en segundo plano
+    if derivative_pipeline and not photo.thumbnail_url:
+        source_path = await run_in_threadpool(derivative_pipeline.stage, file.file)
+        derivative_pipeline.submit(source_path, folder, public_id, save_derivatives(Photo, photo.id), tiles=True)
 
     return {
         "id": photo.id,
         "title": photo.title,
         "url": photo.url,
+        "duplicate": False,
         "message": "Photo uploaded successfully"
     }
 
 @app.get("/api/projects/{project_id}/photos", response_model=List[PhotoResponse])
-def get_photos(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
+def get_photos(
+    project_id: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    include_total: bool = False,
+    object_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    bbox_crs: str = "local",
+    fields: Optional[str] = None,
+    list_format: str = Query("objects", alias="format"),
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """Fotos 360 del proyecto, paginadas por cursor (ver paginate_listing)"""
+    query = filter_listing(
+        db.query(Photo).filter(Photo.project_id == project_id), Photo, Photo.created_at,
+        {"object_type": object_type}, date_from, date_to, bbox, bbox_crs
+    )
+    columns = listing_columns(Photo, PhotoResponse.model_fields, fields, list_format)
+    rows = paginate_listing(query, response, Photo, Photo.created_at, sort, order, limit, cursor, include_total, columns)
+    return render_rows(request, columns, rows, list_format, headers=response.headers)
+
+@app.get("/api/projects/{project_id}/photos/{photo_id}/tiles")
+def get_photo_tiles(
+    project_id: int,
+    photo_id: int,
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Configuración multirresolución (cubo teselado) de una foto 360
+
+    Devuelve el bloque `multiRes` que espera Pannellum; si el
+    almacenamiento no permite una plantilla de URL se incluye además el
+    mapa `urls` con la URL de cada tesela ("{nivel}/{cara}{fila}_{col}.jpg").
+    """
+    photo = db.query(Photo).filter(
+        Photo.id == photo_id,
+        Photo.project_id == project_id
     ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    if not photo.tile_config:
+        raise HTTPException(status_code=404, detail="Tiles not available for this photo")
+
+    config = photo.tile_config
+    extension = config.get("extension", "jpg")
+    multi_res = {
+        "tileResolution": config["tileResolution"],
+        "maxLevel": config["maxLevel"],
+        "cubeResolution": config["cubeResolution"],
+        "extension": extension,
+    }
+    if photo.tiles_url:
+        multi_res["basePath"] = ""
+        multi_res["path"] = photo.tiles_url[:-len(extension) - 1] if photo.tiles_url.endswith(f".{extension}") else photo.tiles_url
 
-    photos = db.query(Photo).filter(Photo.project_id == project_id).all()
-    return photos
+    return {
+        "type": "multires",
+        "preview": photo.preview_url,
+        "multiRes": multi_res,
+        "urls": config.get("urls")
+    }
 
 @app.put("/api/projects/{project_id}/photos/{photo_id}/coordinates")
 async def update_photo360_coordinates(
@@ -883,17 +1572,9 @@ async def update_photo360_coordinates(
     project_x: Optional[float] = None,
     project_y: Optional[float] = None,
     project_z: Optional[float] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Get photo
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
@@ -936,18 +1617,10 @@ async def upload_photo_coordinates_file(
     project_id: int,
     photo_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
     """Upload coordinates from TXT file for a photo"""
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Get photo
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
@@ -1031,16 +1704,9 @@ async def upload_photo_coordinates_file(
 def delete_photo(
     project_id: int,
     photo_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
         Photo.project_id == project_id
@@ -1052,25 +1718,203 @@ def delete_photo(
     db.commit()
     return {"message": "Photo deleted successfully"}
 
-# Endpoints de galería
-@app.post("/api/projects/{project_id}/gallery/upload")
-async def upload_gallery_image(
+# Subida reanudable de fotos 360 por bloques
+def get_upload_session(upload_id: str, project_id: int, current_user: User) -> dict:
+    try:
+        return upload_sessions.get(upload_id, current_user.id, project_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+
+@app.post("/api/projects/{project_id}/photos/uploads")
+def create_photo_upload_session(
     project_id: int,
-    file: UploadFile = File(...),
-    image_type: str = Form("edification"),
-    level: Optional[str] = Form(None),
-    room: Optional[str] = Form(None),
-    pk_value: Optional[str] = Form(None),
-    section: Optional[str] = Form(None),
-    custom_tags: Optional[str] = Form(None),
-    # Coordenadas geográficas WGS84
-    latitude: Optional[float] = Form(None),
-    longitude: Optional[float] = Form(None),
-    geo_latitude: Optional[float] = Form(None),
-    geo_longitude: Optional[float] = Form(None),
-    # Coordenadas UTM ETRS89
-    utm_easting: Optional[float] = Form(None),
-    utm_northing: Optional[float] = Form(None),
+    data: UploadSessionCreate,
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Inicia una subida por bloques
+
+    El cliente envía después cada bloque con PUT .../chunks/{index} (en
+    cualquier orden, en paralelo y reintentando los que fallen) y termina
+    con POST .../complete.
+    """
+    # Si el cliente envía el hash y la foto ya está en el proyecto no hace falta subirla
+    duplicate = find_duplicate_asset(db, Photo, data.sha256, project_id, owner_id=current_user.id)
+    if duplicate and duplicate.project_id == project_id:
+        print(f"[UPLOADS] {data.filename} ya subida (sha256={data.sha256}): foto {duplicate.id}")
+        return {
+            "duplicate": True,
+            "id": duplicate.id,
+            "title": duplicate.title,
+            "url": duplicate.url
+        }
+
+    fields = data.dict(exclude={"filename", "total_size", "chunk_size", "sha256"})
+    try:
+        meta = upload_sessions.create(
+            owner_id=current_user.id,
+            project_id=project_id,
+            filename=data.filename,
+            total_size=data.total_size,
+            chunk_size=data.chunk_size,
+            sha256=data.sha256,
+            fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    print(f"[UPLOADS] Sesión {meta['upload_id']}: {meta['filename']} ({meta['total_size']} bytes, {meta['total_chunks']} bloques)")
+    return upload_sessions.status(meta)
+
+@app.get("/api/projects/{project_id}/photos/uploads/{upload_id}")
+def get_photo_upload_session(
+    project_id: int,
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Bloques recibidos y pendientes (para reanudar tras un corte)"""
+    meta = get_upload_session(upload_id, project_id, current_user)
+    return upload_sessions.status(meta)
+
+@app.put("/api/projects/{project_id}/photos/uploads/{upload_id}/chunks/{index}")
+async def upload_photo_chunk(
+    project_id: int,
+    upload_id: str,
+    index: int,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Recibe un bloque como cuerpo binario (application/octet-stream)"""
+    meta = get_upload_session(upload_id, project_id, current_user)
+    try:
+        written = await upload_sessions.write_chunk(meta, index, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"upload_id": upload_id, "index": index, "size": written}
+
+@app.post("/api/projects/{project_id}/photos/uploads/{upload_id}/complete")
+async def complete_photo_upload_session(
+    project_id: int,
+    upload_id: str,
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Une los bloques, sube la imagen al almacenamiento y crea la foto"""
+    meta = get_upload_session(upload_id, project_id, current_user)
+    try:
+        assembled = await run_in_threadpool(upload_sessions.assemble, meta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    duplicate = find_duplicate_asset(db, Photo, assembled["sha256"], project_id)
+    if duplicate and duplicate.project_id == project_id:
+        upload_sessions.discard(upload_id)
+        print(f"[UPLOADS] Sesión {upload_id}: contenido duplicado de la foto {duplicate.id}")
+        return {
+            "id": duplicate.id,
+            "title": duplicate.title,
+            "url": duplicate.url,
+            "size": assembled["size"],
+            "sha256": assembled["sha256"],
+            "duplicate": True,
+            "message": "Photo already uploaded"
+        }
+
+    folder = f"photosite360/photos/project_{project_id}"
+    public_id = f"photo_{datetime.utcnow().timestamp()}_{meta['filename']}"
+    if duplicate:
+        cloudinary_url = duplicate.url
+    else:
+        with open(assembled["path"], "rb") as assembled_file:
+            upload = await CloudinaryService.upload_stream_async(
+                assembled_file, folder, public_id, meta["filename"], assembled["sha256"]
+            )
+        cloudinary_url = upload["url"]
+        if not cloudinary_url:
+            # Los bloques se conservan para poder reintentar el paso final
+            raise HTTPException(status_code=502, detail="Error uploading image to storage")
+
+    fields = meta["fields"]
+    photo = Photo(
+        title=fields.get("title") or meta["filename"],
+        description=fields.get("description") or "",
+        url=cloudinary_url,
+        project_id=project_id,
+        geo_latitude=fields.get("geo_latitude"),
+        geo_longitude=fields.get("geo_longitude"),
+        geo_altitude=fields.get("geo_altitude"),
+        heading=fields.get("heading"),
+        utm_easting=fields.get("utm_easting"),
+        utm_northing=fields.get("utm_northing"),
+        utm_zone=fields.get("utm_zone"),
+        utm_hemisphere=fields.get("utm_hemisphere"),
+        utm_datum=fields.get("utm_datum"),
+        project_x=fields.get("project_x"),
+        project_y=fields.get("project_y"),
+        project_z=fields.get("project_z"),
+        object_type="360photo",
+        content_hash=assembled["sha256"],
+        **reused_derivatives(Photo, duplicate)
+    )
+    with open(assembled["path"], "rb") as assembled_file:
+        apply_embedded_coordinates(photo, await run_in_threadpool(embedded_coordinates, assembled_file, project))
+    db.add(photo)
+    db.commit()
+    db.refresh(photo)
+
+    if derivative_pipeline and not photo.thumbnail_url:
+        source_path = derivative_pipeline.stage_path(assembled["path"])
+        derivative_pipeline.submit(source_path, folder, public_id, save_derivatives(Photo, photo.id), tiles=True)
+
+    upload_sessions.discard(upload_id)
+    print(f"[UPLOADS] Sesión {upload_id} completada: foto {photo.id} ({assembled['size']} bytes, sha256={assembled['sha256']})")
+
+    return {
+        "id": photo.id,
+        "title": photo.title,
+        "url": photo.url,
+        "size": assembled["size"],
+        "sha256": assembled["sha256"],
+        "duplicate": False,
+        "message": "Photo uploaded successfully"
+    }
+
+@app.delete("/api/projects/{project_id}/photos/uploads/{upload_id}")
+def abort_photo_upload_session(
+    project_id: int,
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancela la subida y borra los bloques recibidos"""
+    get_upload_session(upload_id, project_id, current_user)
+    upload_sessions.discard(upload_id)
+    return {"message": "Upload session deleted"}
+
+# Endpoints de galería
+@app.post("/api/projects/{project_id}/gallery/upload")
+async def upload_gallery_image(
+    project_id: int,
+    file: UploadFile = File(...),
+    image_type: str = Form("edification"),
+    level: Optional[str] = Form(None),
+    room: Optional[str] = Form(None),
+    pk_value: Optional[str] = Form(None),
+    section: Optional[str] = Form(None),
+    custom_tags: Optional[str] = Form(None),
+    # Coordenadas geográficas WGS84
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None),
+    geo_latitude: Optional[float] = Form(None),
+    geo_longitude: Optional[float] = Form(None),
+    geo_altitude: Optional[float] = Form(None),
+    heading: Optional[float] = Form(None),
+    # Coordenadas UTM ETRS89
+    utm_easting: Optional[float] = Form(None),
+    utm_northing: Optional[float] = Form(None),
     utm_zone: Optional[int] = Form(None),
     utm_hemisphere: Optional[str] = Form(None),
     utm_datum: Optional[str] = Form("ETRS89"),
@@ -1078,8 +1922,8 @@ async def upload_gallery_image(
     project_x: Optional[float] = Form(None),
     project_y: Optional[float] = Form(None),
     project_z: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
     # Usar geo_latitude/geo_longitude si latitude/longitude están presentes
     if latitude is not None and geo_latitude is None:
@@ -1087,26 +1931,33 @@ async def upload_gallery_image(
     if longitude is not None and geo_longitude is None:
         geo_longitude = longitude
 
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    # Subir a Cloudinary
-    print(f"Subiendo imagen de galeria: {file.filename}")
-    file_content = await file.read()
-    cloudinary_response = cloudinary.uploader.upload(
-        file_content,
-        folder=f"photosite360/gallery/project_{project_id}",
-        public_id=f"gallery_{datetime.utcnow().timestamp()}_{file.filename}",
-        resource_type="image"
-    )
+    # Deduplicación: mismo contenido ya subido
+    content_hash, file_size = await run_in_threadpool(hash_stream, file.file)
+    duplicate = find_duplicate_asset(db, GalleryImage, content_hash, project_id)
+    if duplicate and duplicate.project_id == project_id:
+        print(f"Imagen duplicada (sha256={content_hash}): ya existe con ID {duplicate.id}")
+        return {
+            "id": duplicate.id,
+            "filename": duplicate.filename,
+            "url": duplicate.url,
+            "duplicate": True,
+            "message": "Image already uploaded"
+        }
 
-    cloudinary_url = cloudinary_response.get("secure_url")
-    print(f"Imagen subida exitosamente: {cloudinary_url}")
+    folder = f"photosite360/gallery/project_{project_id}"
+    public_id = f"gallery_{datetime.utcnow().timestamp()}_{file.filename}"
+    if duplicate:
+        cloudinary_url = duplicate.url
+        print(f"Imagen ya almacenada (sha256={content_hash}): se reutiliza {cloudinary_url}")
+    else:
+        # Subir a Cloudinary
+        print(f"Subiendo imagen de galeria: {file.filename}")
+        upload = await CloudinaryService.upload_stream_async(file.file, folder, public_id, file.filename, content_hash)
+        cloudinary_url = upload["url"]
+        if not cloudinary_url:
+            raise HTTPException(status_code=502, detail="Error uploading image to storage")
+
+        print(f"Imagen subida exitosamente: {cloudinary_url} ({file_size} bytes, sha256={content_hash})")
 
     # Crear URL única
     unique_url = f"gallery_{project_id}_{datetime.utcnow().timestamp()}_{file.filename}"
@@ -1116,7 +1967,7 @@ async def upload_gallery_image(
         filename=file.filename,
         url=cloudinary_url,
         unique_url=unique_url,
-        file_size=len(file_content),
+        file_size=file_size,
         mime_type=file.content_type,
         project_id=project_id,
         image_type=image_type,
@@ -1127,6 +1978,8 @@ async def upload_gallery_image(
         custom_tags=custom_tags,
         geo_latitude=geo_latitude,
         geo_longitude=geo_longitude,
+        geo_altitude=geo_altitude,
+        heading=heading,
         utm_easting=utm_easting,
         utm_northing=utm_northing,
         utm_zone=utm_zone,
@@ -1135,23 +1988,186 @@ async def upload_gallery_image(
         project_x=project_x,
         project_y=project_y,
         project_z=project_z,
-        object_type="image"
+        object_type="image",
+        content_hash=content_hash,
+        **reused_derivatives(GalleryImage, duplicate)
     )
 
+    # Posición y rumbo de los metadatos EXIF/XMP de la cámara
+    apply_embedded_coordinates(gallery_image, await run_in_threadpool(embedded_coordinates, file.file, project))
+
     db.add(gallery_image)
     db.commit()
     db.refresh(gallery_image)
 
     print(f"Imagen de galeria guardada con ID: {gallery_image.id}")
-    print(f"Coordenadas: WGS84({geo_latitude},{geo_longitude}), UTM({utm_easting},{utm_northing}), Proyecto({project_x},{project_y},{project_z})")
+    print(f"Coordenadas: WGS84({gallery_image.geo_latitude},{gallery_image.geo_longitude}), UTM({gallery_image.utm_easting},{gallery_image.utm_northing}), Proyecto({gallery_image.project_x},{gallery_image.project_y},{gallery_image.project_z})")
+
+    # Miniatura y vista previa en segundo plano
+    if derivative_pipeline and not gallery_image.thumbnail_url:
+        source_path = await run_in_threadpool(derivative_pipeline.stage, file.file)
+        derivative_pipeline.submit(source_path, folder, public_id, save_derivatives(GalleryImage, gallery_image.id))
 
     return {
         "id": gallery_image.id,
         "filename": gallery_image.filename,
         "url": gallery_image.url,
+        "duplicate": False,
         "message": "Image uploaded successfully"
     }
 
+MAX_BATCH_UPLOAD_FILES = int(os.getenv("MAX_BATCH_UPLOAD_FILES", "500"))
+
+@app.post("/api/projects/{project_id}/gallery/upload-batch")
+async def upload_gallery_images_batch(
+    project_id: int,
+    files: List[UploadFile] = File(...),
+    metadata: Optional[str] = Form(None),
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Sube varias imágenes de galería en una sola petición
+
+    Args:
+        files: Imágenes a subir
+        metadata: JSON opcional con los metadatos de cada imagen, como lista
+            en el mismo orden que `files` o como objeto {filename: {...}}.
+            Admite los mismos campos que /gallery/upload (level, room,
+            pk_value, coordenadas...)
+
+    Las subidas se hacen en paralelo en el pool de subidas
+    (UPLOAD_MAX_CONCURRENCY) y todos los registros se guardan en un único
+    commit. Un fallo en un fichero no cancela el resto: el resultado indica
+    el estado de cada uno.
+    """
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {MAX_BATCH_UPLOAD_FILES})")
+
+    # Metadatos por fichero
+    try:
+        raw_metadata = json.loads(metadata) if metadata else []
+        if isinstance(raw_metadata, dict):
+            raw_metadata = [raw_metadata.get(file.filename) or {} for file in files]
+        if not isinstance(raw_metadata, list) or len(raw_metadata) > len(files):
+            raise ValueError("metadata must be a list with one entry per file or an object keyed by filename")
+        if any(entry is not None and not isinstance(entry, dict) for entry in raw_metadata):
+            raise ValueError("each metadata entry must be an object")
+        items = [GalleryUploadItem(**(entry or {})) for entry in raw_metadata]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata: {e}")
+    items += [GalleryUploadItem() for _ in range(len(files) - len(items))]
+
+    # Deduplicación: hash de cada fichero y una sola consulta de existentes
+    hashes = await asyncio.gather(*(run_in_threadpool(hash_stream, file.file) for file in files))
+    existing = {}
+    for image in db.query(GalleryImage).filter(
+        GalleryImage.content_hash.in_({content_hash for content_hash, _ in hashes})
+    ).order_by(GalleryImage.project_id != project_id, GalleryImage.id):
+        existing.setdefault(image.content_hash, image)
+
+    # Solo se sube la primera copia de cada contenido que no esté almacenado
+    to_upload = {}
+    for index, (content_hash, _) in enumerate(hashes):
+        if content_hash not in existing:
+            to_upload.setdefault(content_hash, index)
+
+    print(f"Subiendo lote de {len(files)} imagenes de galeria al proyecto {project_id} ({len(to_upload)} nuevas)")
+    folder = f"photosite360/gallery/project_{project_id}"
+    timestamp = datetime.utcnow().timestamp()
+    public_ids = [f"gallery_{timestamp}_{index}_{file.filename}" for index, file in enumerate(files)]
+    uploads = dict(zip(to_upload.values(), await asyncio.gather(*(
+        CloudinaryService.upload_stream_async(
+            files[index].file, folder, public_ids[index], files[index].filename, hashes[index][0]
+        )
+        for index in to_upload.values()
+    ))))
+
+    results = []
+    gallery_images = []
+    saved_by_hash = {}
+    for index, (file, item, (content_hash, file_size)) in enumerate(zip(files, items, hashes)):
+        result = {"index": index, "filename": file.filename}
+        results.append(result)
+        duplicate = existing.get(content_hash)
+
+        if duplicate is not None and duplicate.project_id == project_id:
+            result.update(status="duplicate", id=duplicate.id, url=duplicate.url)
+            continue
+        if content_hash in saved_by_hash:
+            # Repetido dentro del propio lote: se guarda una sola vez
+            first = saved_by_hash[content_hash]
+            result.update(status="duplicate", duplicate_of=first["index"], url=first["url"], image=first["image"])
+            continue
+
+        if duplicate is not None:
+            url = duplicate.url
+            result["status"] = "reused"
+        else:
+            url = uploads[index]["url"]
+            if not url:
+                result.update(status="error", error="Error uploading image to storage")
+                continue
+            result["status"] = "uploaded"
+
+        gallery_image = GalleryImage(
+            filename=file.filename,
+            url=url,
+            unique_url=f"gallery_{project_id}_{timestamp}_{index}_{file.filename}",
+            file_size=file_size,
+            mime_type=file.content_type,
+            project_id=project_id,
+            image_type=item.image_type,
+            level=item.level,
+            room=item.room,
+            pk_value=item.pk_value,
+            section=item.section,
+            custom_tags=item.custom_tags,
+            geo_latitude=item.geo_latitude if item.geo_latitude is not None else item.latitude,
+            geo_longitude=item.geo_longitude if item.geo_longitude is not None else item.longitude,
+            geo_altitude=item.geo_altitude,
+            heading=item.heading,
+            utm_easting=item.utm_easting,
+            utm_northing=item.utm_northing,
+            utm_zone=item.utm_zone,
+            utm_hemisphere=item.utm_hemisphere,
+            utm_datum=item.utm_datum,
+            project_x=item.project_x,
+            project_y=item.project_y,
+            project_z=item.project_z,
+            object_type="image",
+            content_hash=content_hash,
+            **reused_derivatives(GalleryImage, duplicate)
+        )
+        apply_embedded_coordinates(gallery_image, await run_in_threadpool(embedded_coordinates, file.file, project))
+        gallery_images.append(gallery_image)
+        result.update(url=url, size=file_size, image=gallery_image)
+        saved_by_hash[content_hash] = result
+
+    db.add_all(gallery_images)
+    db.commit()
+
+    for result in results:
+        image = result.pop("image", None)
+        if image is None:
+            continue
+        result["id"] = image.id
+        if derivative_pipeline and result["status"] != "duplicate" and not image.thumbnail_url:
+            source_path = await run_in_threadpool(derivative_pipeline.stage, files[result["index"]].file)
+            derivative_pipeline.submit(source_path, folder, public_ids[result["index"]], save_derivatives(GalleryImage, image.id))
+
+    uploaded = len(gallery_images)
+    failed = sum(1 for result in results if result["status"] == "error")
+    print(f"Lote guardado: {uploaded} imagenes, {len(files) - uploaded - failed} duplicadas, {failed} errores")
+
+    return {
+        "total": len(files),
+        "uploaded": uploaded,
+        "duplicates": len(files) - uploaded - failed,
+        "failed": failed,
+        "results": results
+    }
+
 @app.put("/api/projects/{project_id}/gallery/{image_id}/coordinates")
 async def update_gallery_coordinates(
     project_id: int,
@@ -1166,18 +2182,10 @@ async def update_gallery_coordinates(
     project_x: Optional[float] = None,
     project_y: Optional[float] = None,
     project_z: Optional[float] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
     """Update coordinates of an existing gallery image"""
-    # Verify project ownership
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Get image
     image = db.query(GalleryImage).filter(
         GalleryImage.id == image_id,
@@ -1220,65 +2228,50 @@ async def update_gallery_coordinates(
 @app.get("/api/projects/{project_id}/gallery", response_model=List[GalleryImageResponse])
 def get_gallery_images(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    include_total: bool = False,
+    level: Optional[str] = None,
+    room: Optional[str] = None,
+    image_type: Optional[str] = None,
+    object_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    bbox_crs: str = "local",
+    fields: Optional[str] = None,
+    list_format: str = Query("objects", alias="format"),
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    images = db.query(GalleryImage).filter(GalleryImage.project_id == project_id).all()
-
-    result = []
-    for image in images:
-        image_data = {
-            "id": image.id,
-            "filename": image.filename,
-            "url": image.url,
-            "unique_url": image.unique_url,
-            "file_size": image.file_size,
-            "mime_type": image.mime_type,
-            "project_id": image.project_id,
-            "uploaded_at": image.uploaded_at,
-            "image_type": image.image_type,
-            "level": image.level,
-            "room": image.room,
-            "pk_value": image.pk_value,
-            "section": image.section,
-            "custom_tags": image.custom_tags.split(",") if image.custom_tags else [],
-            "geo_latitude": image.geo_latitude,
-            "geo_longitude": image.geo_longitude,
-            "utm_easting": image.utm_easting,
-            "utm_northing": image.utm_northing,
-            "utm_zone": image.utm_zone,
-            "utm_hemisphere": image.utm_hemisphere,
-            "utm_datum": image.utm_datum,
-            "project_x": image.project_x,
-            "project_y": image.project_y,
-            "project_z": image.project_z,
-            "object_type": image.object_type or "image"
-        }
-        result.append(image_data)
-
-    return result
+    """Imágenes de galería del proyecto, paginadas por cursor (ver paginate_listing)"""
+    query = filter_listing(
+        db.query(GalleryImage).filter(GalleryImage.project_id == project_id), GalleryImage, GalleryImage.uploaded_at,
+        {"level": level, "room": room, "image_type": image_type, "object_type": object_type},
+        date_from, date_to, bbox, bbox_crs
+    )
+    columns = listing_columns(GalleryImage, GalleryImageResponse.model_fields, fields, list_format)
+    images = paginate_listing(query, response, GalleryImage, GalleryImage.uploaded_at, sort, order, limit, cursor, include_total, columns)
+    return render_rows(
+        request, columns, images, list_format,
+        transforms={
+            "custom_tags": lambda tags: tags.split(",") if tags else [],
+            "object_type": lambda object_type: object_type or "image",
+        },
+        headers=response.headers
+    )
 
 @app.delete("/api/projects/{project_id}/gallery/{image_id}")
 def delete_gallery_image(
     project_id: int,
     image_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     image = db.query(GalleryImage).filter(
         GalleryImage.id == image_id,
         GalleryImage.project_id == project_id
@@ -1308,17 +2301,9 @@ async def create_incident(
     project_x: Optional[float] = Form(None),
     project_y: Optional[float] = Form(None),
     project_z: Optional[float] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Crear incidencia
     incident = Incident(
         title=title,
@@ -1351,18 +2336,35 @@ async def create_incident(
 @app.get("/api/projects/{project_id}/incidents")
 def get_incidents(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = "asc",
+    include_total: bool = False,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    incident_type: Optional[str] = None,
+    object_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    bbox: Optional[str] = None,
+    bbox_crs: str = "local",
+    fields: Optional[str] = None,
+    list_format: str = Query("objects", alias="format"),
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    incidents = db.query(Incident).filter(Incident.project_id == project_id).all()
-    return incidents
+    """Incidencias del proyecto, paginadas por cursor (ver paginate_listing)"""
+    query = filter_listing(
+        db.query(Incident).filter(Incident.project_id == project_id), Incident, Incident.created_at,
+        {"severity": severity, "status": status, "incident_type": incident_type, "object_type": object_type},
+        date_from, date_to, bbox, bbox_crs
+    )
+    columns = listing_columns(Incident, Incident.__table__.columns.keys(), fields, list_format)
+    rows = paginate_listing(query, response, Incident, Incident.created_at, sort, order, limit, cursor, include_total, columns)
+    return render_rows(request, columns, rows, list_format, headers=response.headers)
 
 @app.put("/api/projects/{project_id}/incidents/{incident_id}")
 async def update_incident(
@@ -1383,17 +2385,9 @@ async def update_incident(
     project_x: Optional[float] = None,
     project_y: Optional[float] = None,
     project_z: Optional[float] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     # Get incident
     incident = db.query(Incident).filter(
         Incident.id == incident_id,
@@ -1445,16 +2439,9 @@ async def update_incident(
 def delete_incident(
     project_id: int,
     incident_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     incident = db.query(Incident).filter(
         Incident.id == incident_id,
         Incident.project_id == project_id
@@ -1466,6 +2453,509 @@ def delete_incident(
     db.commit()
     return {"message": "Incident deleted successfully"}
 
+# ============================================================================
+# CONSULTAS ESPACIALES (VISTAS DE MAPA)
+# ============================================================================
+
+# Capas del mapa: nombre -> (modelo, campos devueltos)
+MAP_LAYERS = {
+    "photos": (Photo, (
+        "id", "title", "object_type", "utm_easting", "utm_northing", "geo_latitude", "geo_longitude",
+        "project_x", "project_y", "heading", "thumbnail_url"
+    )),
+    "gallery": (GalleryImage, (
+        "id", "filename", "object_type", "image_type", "level", "room", "utm_easting", "utm_northing",
+        "geo_latitude", "geo_longitude", "project_x", "project_y", "thumbnail_url"
+    )),
+    "incidents": (Incident, (
+        "id", "title", "incident_type", "severity", "status", "object_type", "utm_easting", "utm_northing",
+        "geo_latitude", "geo_longitude", "project_x", "project_y"
+    )),
+    "objects": (ProjectObject, (
+        "id", "name", "object_type", "group_name", "level", "pk", "utm_easting", "utm_northing", "elevation"
+    )),
+}
+
+# Máximo de objetos por capa en una consulta de bbox
+MAX_BBOX_OBJECTS = int(os.getenv("MAX_BBOX_OBJECTS", "5000"))
+# Con zoom, los objetos de una capa a menos de estos píxeles se reducen a uno
+MAP_THINNING_PIXELS = float(os.getenv("MAP_THINNING_PIXELS", "2"))
+# Latitud de referencia si el proyecto no tiene origen (centro de España)
+DEFAULT_MAP_LATITUDE = 40.0
+# Un bbox geográfico se recorta a la zona UTM ± este margen (fuera de ahí la
+# proyección transversa deja de ser útil) y a las latitudes UTM
+UTM_BBOX_MARGIN_DEGREES = 6.0
+UTM_LATITUDE_RANGE = (-80.0, 84.0)
+# Puntos por lado del bbox al calcular su envolvente UTM
+BBOX_EDGE_SAMPLES = 16
+
+def bbox_to_utm(project: Project, bbox: tuple, bbox_crs: str) -> dict:
+    """
+    Convierte un bbox del mapa a su envolvente en UTM
+
+    Args:
+        bbox: (min_x, min_y, max_x, max_y); en 'geo' es (lon, lat, lon, lat)
+        bbox_crs: 'utm', 'geo' o 'local' (requiere origen de proyecto)
+
+    Returns:
+        Dict con bbox (UTM), utm_zone y latitude (para la resolución del zoom)
+
+    Raises:
+        HTTPException 400/503: sistema desconocido, proyecto sin origen o
+        transformaciones no disponibles
+    """
+    if bbox_crs not in BBOX_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"bbox_crs must be one of: {', '.join(BBOX_COLUMNS)}")
+
+    frame = get_project_frame(project) if COORDINATES_AVAILABLE else None
+    latitude = frame.origin_lat if frame else DEFAULT_MAP_LATITUDE
+    if bbox_crs == "utm":
+        return {"bbox": bbox, "utm_zone": frame.utm_zone if frame else None, "latitude": latitude}
+
+    if not COORDINATES_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Coordinate features not available. Install pyproj to use geo or local bounding boxes."
+        )
+
+    if bbox_crs == "geo":
+        transformer = get_coordinate_transformer()
+        center_lat, center_lng = (bbox[1] + bbox[3]) / 2, (bbox[0] + bbox[2]) / 2
+        # Todos los puntos en la misma zona (la del proyecto o la del centro)
+        zone = frame.utm_zone if frame else transformer.geo_to_utm(center_lat, center_lng)["utm_zone"]
+        points = [transformer.geo_to_utm(lat, lng, zone) for lng, lat in geo_bbox_samples(bbox, zone)]
+        latitude = center_lat
+    else:
+        if frame is None:
+            raise HTTPException(status_code=400, detail="Project has no map origin; use bbox_crs=utm or geo")
+        # Transformación afín: basta con las esquinas
+        zone = frame.utm_zone
+        corners = [(bbox[0], bbox[1]), (bbox[0], bbox[3]), (bbox[2], bbox[1]), (bbox[2], bbox[3])]
+        points = [frame.local_to_utm(x, y) for x, y in corners]
+
+    eastings = [point["utm_easting"] for point in points]
+    northings = [point["utm_northing"] for point in points]
+    return {
+        "bbox": (min(eastings), min(northings), max(eastings), max(northings)),
+        "utm_zone": zone,
+        "latitude": latitude,
+    }
+
+def geo_bbox_samples(bbox: tuple, zone: int) -> list:
+    """
+    Puntos (lon, lat) del contorno de un bbox geográfico para proyectarlo a UTM
+
+    Los paralelos se curvan en la proyección transversa, así que con solo las
+    esquinas la envolvente se queda corta (o se anula si el bbox abarca todo
+    el mundo). Se recorta el bbox a la zona ± UTM_BBOX_MARGIN_DEGREES, se
+    muestrea cada lado y se añade el meridiano central, donde los paralelos
+    alcanzan su northing extremo.
+    """
+    central_meridian = zone * 6 - 183
+    min_lng = min(max(bbox[0], central_meridian - UTM_BBOX_MARGIN_DEGREES), central_meridian + UTM_BBOX_MARGIN_DEGREES)
+    max_lng = min(max(bbox[2], central_meridian - UTM_BBOX_MARGIN_DEGREES), central_meridian + UTM_BBOX_MARGIN_DEGREES)
+    min_lat = min(max(bbox[1], UTM_LATITUDE_RANGE[0]), UTM_LATITUDE_RANGE[1])
+    max_lat = min(max(bbox[3], UTM_LATITUDE_RANGE[0]), UTM_LATITUDE_RANGE[1])
+
+    steps = [i / BBOX_EDGE_SAMPLES for i in range(BBOX_EDGE_SAMPLES + 1)]
+    longitudes = [min_lng + (max_lng - min_lng) * t for t in steps]
+    latitudes = [min_lat + (max_lat - min_lat) * t for t in steps]
+    if min_lng < central_meridian < max_lng:
+        longitudes.append(central_meridian)
+
+    points = [(lng, lat) for lng in longitudes for lat in (min_lat, max_lat)]
+    points += [(lng, lat) for lng in (min_lng, max_lng) for lat in latitudes]
+    return points
+
+def map_resolution(zoom: float, latitude: float) -> float:
+    """Metros por píxel de un mapa web (Web Mercator, teselas de 256 px) a ese zoom"""
+    return 156543.03392 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+def thin_rows(rows, x_index: int, y_index: int, cell_size: float):
+    """Deja una fila por celda de `cell_size` metros (la primera); devuelve (filas, descartadas)"""
+    seen = set()
+    kept = []
+    for row in rows:
+        key = (math.floor(row[x_index] / cell_size), math.floor(row[y_index] / cell_size))
+        if key not in seen:
+            seen.add(key)
+            kept.append(row)
+    return kept, len(rows) - len(kept)
+
+@app.get("/api/projects/{project_id}/objects/in-bbox")
+def get_objects_in_bbox(
+    project_id: int,
+    request: Request,
+    bbox: str,
+    bbox_crs: str = "geo",
+    zoom: Optional[float] = None,
+    layers: Optional[str] = None,
+    list_format: str = Query("objects", alias="format"),
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Fotos, imágenes, incidencias y objetos dentro del bbox visible del mapa
+
+    La consulta usa el índice espacial UTM (GiST en PostgreSQL, R*Tree en
+    SQLite), de modo que su coste depende de los objetos visibles y no del
+    tamaño del proyecto.
+
+    Args:
+        bbox: 'min_x,min_y,max_x,max_y' (en 'geo': lon,lat,lon,lat)
+        bbox_crs: 'geo' (por defecto), 'utm' o 'local'
+        zoom: Zoom del mapa web; si se indica, se deja un objeto por cada
+            MAP_THINNING_PIXELS píxeles en cada capa
+        layers: Capas separadas por comas (photos, gallery, incidents, objects)
+        format: 'objects', 'columnar' o 'arrays' (ver utils.response_formats)
+    """
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if box is None:
+        raise HTTPException(status_code=400, detail="bbox is required")
+
+    selected = parse_list(layers) or list(MAP_LAYERS)
+    unknown = [name for name in selected if name not in MAP_LAYERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown layers: {', '.join(unknown)}")
+    if list_format not in LIST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(LIST_FORMATS)}")
+
+    area = bbox_to_utm(project, box, bbox_crs)
+    cell_size = map_resolution(zoom, area["latitude"]) * MAP_THINNING_PIXELS if zoom is not None else None
+
+    result = {}
+    for name in selected:
+        model, fields = MAP_LAYERS[name]
+        rows = (
+            db.query(*[getattr(model, field) for field in fields])
+            .filter(model.project_id == project_id, bbox_filter(model, area["bbox"]))
+            .order_by(model.id)
+            .limit(MAX_BBOX_OBJECTS + 1)
+            .all()
+        )
+        truncated = len(rows) > MAX_BBOX_OBJECTS
+        rows = rows[:MAX_BBOX_OBJECTS]
+        thinned = 0
+        if cell_size:
+            rows, thinned = thin_rows(rows, fields.index("utm_easting"), fields.index("utm_northing"), cell_size)
+        result[name] = {
+            "items": format_rows(list(fields), rows, list_format),
+            "count": len(rows),
+            "thinned": thinned,
+            "truncated": truncated,
+        }
+
+    return encode_body(request, {
+        "bbox_utm": list(area["bbox"]),
+        "utm_zone": area["utm_zone"],
+        "layers": result,
+    })
+
+# Tamaño de celda de agrupación en píxeles de pantalla (teselas de 256 px)
+CLUSTER_CELL_PIXELS = int(os.getenv("CLUSTER_CELL_PIXELS", "64"))
+# Máximo de teselas por consulta (evita agregar todo el proyecto a zoom alto)
+MAX_CLUSTER_TILES = int(os.getenv("MAX_CLUSTER_TILES", "256"))
+
+def cell_index(column, size: float):
+    """Índice entero de celda (floor(column / size)) en SQL"""
+    if IS_POSTGRES:
+        return func.floor(column / size)
+    # Las coordenadas UTM son positivas: truncar equivale a floor
+    return cast(column / size, Integer)
+
+def aggregate_cells(db: Session, project_id: int, layers: list, cell_size: float, bbox: tuple) -> dict:
+    """
+    Agrega los objetos del bbox en celdas de `cell_size` metros
+
+    Returns:
+        {(cx, cy): {count, sum_x, sum_y, layers, types, severity, first}}
+        donde first es (capa, id) del objeto de menor id de la celda
+    """
+    cells = {}
+    for name in layers:
+        model = MAP_LAYERS[name][0]
+        cx = cell_index(model.utm_easting, cell_size).label("cx")
+        cy = cell_index(model.utm_northing, cell_size).label("cy")
+        group = [cx, cy, model.object_type]
+        if name == "incidents":
+            group.append(model.severity)
+        rows = (
+            db.query(*group, func.count(model.id), func.sum(model.utm_easting), func.sum(model.utm_northing), func.min(model.id))
+            .filter(model.project_id == project_id, bbox_filter(model, bbox))
+            .group_by(*group)
+            .all()
+        )
+
+        for row in rows:
+            key = (int(row[0]), int(row[1]))
+            object_type = row[2] or ("image" if name == "gallery" else None)
+            severity = row[3] if name == "incidents" else None
+            count, sum_x, sum_y, first_id = row[-4:]
+
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {"count": 0, "sum_x": 0.0, "sum_y": 0.0, "layers": {}, "types": {}, "severity": {}, "first": None}
+            cell["count"] += count
+            cell["sum_x"] += sum_x
+            cell["sum_y"] += sum_y
+            cell["layers"][name] = cell["layers"].get(name, 0) + count
+            if object_type:
+                cell["types"][object_type] = cell["types"].get(object_type, 0) + count
+            if severity:
+                cell["severity"][severity] = cell["severity"].get(severity, 0) + count
+            if cell["first"] is None:
+                cell["first"] = (name, first_id)
+    return cells
+
+def finish_cluster(cell: dict) -> dict:
+    """Cluster en UTM a partir de una celda agregada"""
+    cluster = {
+        "utm_easting": round(cell["sum_x"] / cell["count"], 3),
+        "utm_northing": round(cell["sum_y"] / cell["count"], 3),
+        "count": cell["count"],
+        "layers": cell["layers"],
+        "types": cell["types"],
+    }
+    if cell["severity"]:
+        cluster["severity"] = cell["severity"]
+    if cell["count"] == 1:
+        cluster["layer"], cluster["id"] = cell["first"]
+    return cluster
+
+@app.get("/api/projects/{project_id}/objects/clusters")
+def get_object_clusters(
+    project_id: int,
+    request: Request,
+    bbox: str,
+    zoom: int = Query(..., ge=0, le=24),
+    bbox_crs: str = "geo",
+    layers: Optional[str] = None,
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Agrupación de los objetos del mapa en celdas según el zoom
+
+    Cada celda mide CLUSTER_CELL_PIXELS píxeles de pantalla al zoom pedido
+    y devuelve número de objetos, centroide, reparto por capa y tipo y, para
+    incidencias, por severidad. Las celdas de un objeto incluyen su capa e id.
+
+    Las agregaciones se calculan por teselas de 256 px alineadas a una
+    rejilla UTM fija y se cachean por (proyecto, revisión, zoom, tesela):
+    al mover o crear objetos la revisión del proyecto cambia y las teselas
+    se recalculan.
+
+    Args:
+        bbox: 'min_x,min_y,max_x,max_y' en bbox_crs ('geo', 'utm' o 'local')
+        zoom: Zoom entero del mapa web
+        layers: Capas separadas por comas (photos, gallery, incidents, objects)
+    """
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if box is None:
+        raise HTTPException(status_code=400, detail="bbox is required")
+
+    selected = parse_list(layers) or list(MAP_LAYERS)
+    unknown = [name for name in selected if name not in MAP_LAYERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown layers: {', '.join(unknown)}")
+
+    area = bbox_to_utm(project, box, bbox_crs)
+    min_x, min_y, max_x, max_y = area["bbox"]
+
+    # La rejilla depende solo del proyecto y el zoom, no del bbox visible
+    frame = get_project_frame(project) if COORDINATES_AVAILABLE else None
+    cell_size = round(map_resolution(zoom, frame.origin_lat if frame else DEFAULT_MAP_LATITUDE) * CLUSTER_CELL_PIXELS, 3)
+    cells_per_tile = max(256 // CLUSTER_CELL_PIXELS, 1)
+    tile_size = cell_size * cells_per_tile
+
+    tiles_x = range(math.floor(min_x / tile_size), math.floor(max_x / tile_size) + 1)
+    tiles_y = range(math.floor(min_y / tile_size), math.floor(max_y / tile_size) + 1)
+    if len(tiles_x) * len(tiles_y) > MAX_CLUSTER_TILES:
+        raise HTTPException(status_code=400, detail="Bounding box too large for this zoom level")
+
+    revision = project.objects_revision or 0
+    layer_key = tuple(sorted(selected))
+    tiles = {}
+    missing = []
+    for tx in tiles_x:
+        for ty in tiles_y:
+            key = (project_id, revision, zoom, cell_size, tx, ty, layer_key)
+            cached = map_cluster_cache.get(key)
+            if cached is None:
+                missing.append((tx, ty))
+            else:
+                tiles[(tx, ty)] = cached
+
+    if missing:
+        # Una consulta por capa sobre la envolvente de las teselas que faltan
+        missing_x = [tx for tx, _ in missing]
+        missing_y = [ty for _, ty in missing]
+        envelope = (
+            min(missing_x) * tile_size, min(missing_y) * tile_size,
+            (max(missing_x) + 1) * tile_size, (max(missing_y) + 1) * tile_size
+        )
+        computed = {tile: [] for tile in missing}
+        for (cx, cy), cell in aggregate_cells(db, project_id, selected, cell_size, envelope).items():
+            tile = (cx // cells_per_tile, cy // cells_per_tile)
+            if tile in computed:
+                computed[tile].append(finish_cluster(cell))
+        for (tx, ty), clusters in computed.items():
+            map_cluster_cache.set((project_id, revision, zoom, cell_size, tx, ty, layer_key), clusters)
+        tiles.update(computed)
+
+    transformer = get_coordinate_transformer() if COORDINATES_AVAILABLE else None
+    clusters = []
+    for tile_clusters in tiles.values():
+        for cluster in tile_clusters:
+            if not (min_x <= cluster["utm_easting"] <= max_x and min_y <= cluster["utm_northing"] <= max_y):
+                continue
+            cluster = dict(cluster)
+            if bbox_crs == "geo" and transformer and area["utm_zone"]:
+                cluster.update(transformer.utm_to_geo(cluster["utm_easting"], cluster["utm_northing"], area["utm_zone"]))
+            elif bbox_crs == "local" and frame:
+                cluster.update(frame.utm_to_local(cluster["utm_easting"], cluster["utm_northing"]))
+            clusters.append(cluster)
+
+    return encode_body(request, {
+        "zoom": zoom,
+        "cell_size": cell_size,
+        "revision": revision,
+        "tiles": len(tiles),
+        "computed_tiles": len(missing),
+        "total": sum(cluster["count"] for cluster in clusters),
+        "clusters": clusters,
+    })
+
+# Teselas vectoriales: atributos publicados por capa
+MVT_LAYER_PROPERTIES = {
+    "photos": ("title", "object_type", "heading", "thumbnail_url"),
+    "gallery": ("filename", "object_type", "image_type", "level", "room", "pk_value", "thumbnail_url"),
+    "incidents": ("title", "incident_type", "severity", "status", "object_type"),
+    "objects": ("name", "object_type", "group_name", "level", "pk", "axis"),
+}
+# Margen alrededor de la tesela (unidades de tesela) para no cortar marcadores
+MVT_BUFFER = 64
+# Máximo de elementos por capa y tesela
+MVT_MAX_FEATURES = int(os.getenv("MVT_MAX_FEATURES", "20000"))
+
+tile_cache = TileCache()
+
+@app.get("/api/projects/{project_id}/tiles/{z}/{x}/{y}.mvt")
+def get_project_tile(
+    project_id: int,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    layers: Optional[str] = None,
+    object_type: Optional[str] = None,
+    incident_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    image_type: Optional[str] = None,
+    level: Optional[str] = None,
+    group_name: Optional[str] = None,
+    axis: Optional[str] = None,
+    pk_min: Optional[float] = None,
+    pk_max: Optional[float] = None,
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
+):
+    """
+    Tesela vectorial (Mapbox Vector Tile) con los objetos del proyecto
+
+    Una capa por tipo (photos, gallery, incidents, objects) con geometría de
+    punto y los atributos de MVT_LAYER_PROPERTIES. Los filtros por atributo
+    admiten listas separadas por comas y se aplican a las capas que tienen
+    esa columna; pk_min/pk_max filtran el PK de los objetos de obra lineal.
+
+    Las teselas se cachean en disco por revisión de objetos del proyecto y
+    se revalidan con ETag. Las teselas vacías devuelven 204.
+    """
+    if not 0 <= z <= 24 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    selected = sorted(parse_list(layers) or MAP_LAYERS)
+    unknown = [name for name in selected if name not in MAP_LAYERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown layers: {', '.join(unknown)}")
+
+    filters = {
+        name: parse_list(value) for name, value in (
+            ("object_type", object_type), ("incident_type", incident_type), ("severity", severity),
+            ("status", status), ("image_type", image_type), ("level", level),
+            ("group_name", group_name), ("axis", axis),
+        ) if parse_list(value)
+    }
+
+    # Variante de caché: capas y filtros de la petición
+    variant_key = json.dumps([selected, filters, pk_min, pk_max], sort_keys=True)
+    variant = hashlib.sha1(variant_key.encode()).hexdigest()[:16]
+    revision = project.objects_revision or 0
+    headers = {"ETag": f'"{revision}-{variant}"', "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    data = tile_cache.get(project_id, revision, variant, z, x, y)
+    if data is None:
+        data = render_project_tile(db, project, selected, filters, pk_min, pk_max, z, x, y)
+        tile_cache.put(project_id, revision, variant, z, x, y, data)
+
+    if not data:
+        return Response(status_code=204, headers=headers)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+def render_project_tile(db: Session, project: Project, layers: list, filters: dict,
+                        pk_min: Optional[float], pk_max: Optional[float], z: int, x: int, y: int) -> bytes:
+    """Consulta los objetos de una tesela y la codifica en MVT"""
+    min_mx, min_my, max_mx, max_my = tile_bounds(z, x, y)
+    span = max_mx - min_mx
+    margin = span * MVT_BUFFER / DEFAULT_EXTENT
+
+    # Envolvente UTM de la tesela con margen (los bordes de una tesela no son rectos en UTM)
+    west, south = mercator_to_geo(min_mx - 2 * margin, min_my - 2 * margin)
+    east, north = mercator_to_geo(max_mx + 2 * margin, max_my + 2 * margin)
+    area = bbox_to_utm(project, (west, south, east, north), "geo")
+    transformer = get_coordinate_transformer()
+
+    encoded = []
+    for name in layers:
+        model, _ = MAP_LAYERS[name]
+        properties = MVT_LAYER_PROPERTIES[name]
+        query = db.query(
+            model.id, model.utm_easting, model.utm_northing, *[getattr(model, field) for field in properties]
+        ).filter(model.project_id == project.id, bbox_filter(model, area["bbox"]))
+        for field, values in filters.items():
+            if hasattr(model, field):
+                query = query.filter(getattr(model, field).in_(values))
+        if model is ProjectObject and pk_min is not None:
+            query = query.filter(ProjectObject.pk >= pk_min)
+        if model is ProjectObject and pk_max is not None:
+            query = query.filter(ProjectObject.pk <= pk_max)
+        rows = query.order_by(model.id).limit(MVT_MAX_FEATURES).all()
+        if not rows:
+            continue
+
+        # UTM del proyecto -> Web Mercator en una sola llamada a pyproj
+        mercator_x, mercator_y = transformer.transform(
+            [row[1] for row in rows], [row[2] for row in rows], 25800 + area["utm_zone"], 3857
+        )
+        features = []
+        for row, mx, my in zip(rows, mercator_x, mercator_y):
+            tile_x = round((mx - min_mx) / span * DEFAULT_EXTENT)
+            tile_y = round((max_my - my) / span * DEFAULT_EXTENT)
+            if -MVT_BUFFER <= tile_x <= DEFAULT_EXTENT + MVT_BUFFER and -MVT_BUFFER <= tile_y <= DEFAULT_EXTENT + MVT_BUFFER:
+                features.append((row[0], tile_x, tile_y, dict(zip(properties, row[3:]))))
+        encoded.append(encode_layer(name, features))
+
+    return encode_tile(encoded)
+
 # Endpoints de invitaciones
 @app.get("/api/invitations/pending")
 def get_pending_invitations(
@@ -1482,14 +2972,17 @@ def get_pending_invitations(
 # ENDPOINT DE IMPORTACIÓN DE COORDENADAS
 # ============================================================================
 
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+MAX_IMPORT_ERRORS = 500
+
 @app.post("/api/projects/{project_id}/import-coordinates")
-async def import_coordinates(
+def import_coordinates(
     project_id: int,
     file: UploadFile = File(...),
     coordinate_type: str = Form(...),  # 'local', 'utm', 'geo'
     object_type: str = Form("foto360"),  # 'foto360', 'imagen', 'incidencia'
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
     """
     Importa coordenadas desde archivo CSV/Excel/TXT
@@ -1502,6 +2995,9 @@ async def import_coordinates(
       - 'local': Coordenadas locales del proyecto (X, Y, Z)
       - 'utm': Coordenadas UTM ETRS89 (Easting, Northing, Z)
       - 'geo': Coordenadas geográficas WGS84 (Latitud, Longitud, altitud)
+
+    Los otros dos sistemas se calculan en la misma importación usando el
+    origen del proyecto (las locales solo si el proyecto tiene origen).
     """
     if not COORDINATES_AVAILABLE:
         raise HTTPException(
@@ -1509,141 +3005,175 @@ async def import_coordinates(
             detail="Coordinate import feature temporarily unavailable. Please contact support."
         )
 
-    import io
-
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     try:
-        # Leer archivo
-        content = await file.read()
-        filename = file.filename.lower()
-
-        # Parsear según extensión
-        if filename.endswith('.csv') or filename.endswith('.txt'):
-            # Intentar detectar separador
-            text_content = content.decode('utf-8-sig')  # utf-8-sig ignora BOM
-
-            # Detectar separador
-            if ';' in text_content.split('\n')[0]:
-                df = pd.read_csv(io.StringIO(text_content), sep=';')
-            elif ',' in text_content.split('\n')[0]:
-                df = pd.read_csv(io.StringIO(text_content), sep=',')
-            else:
-                df = pd.read_csv(io.StringIO(text_content), sep='\t')
-
-        elif filename.endswith('.xlsx') or filename.endswith('.xls'):
-            df = pd.read_excel(io.BytesIO(content))
-
-        else:
-            raise HTTPException(status_code=400, detail="Formato de archivo no soportado. Use CSV, TXT o Excel")
-
-        # Normalizar nombres de columnas (quitar espacios, minúsculas)
-        df.columns = df.columns.str.strip().str.lower()
-
-        # Mapeo flexible de nombres de columnas
-        column_mappings = {
-            'nombre': ['nombre_imagen', 'nombre', 'imagen', 'filename', 'file', 'name', 'photo'],
-            'x': ['x', 'easting', 'longitude', 'lon', 'lng', 'project_x'],
-            'y': ['y', 'northing', 'latitude', 'lat', 'project_y'],
-            'z': ['z', 'altura', 'elevation', 'altitud', 'height', 'project_z', 'cota'],
-            'tipo': ['tipo', 'type', 'object_type', 'categoria']
-        }
-
-        # Encontrar columnas reales
-        def find_column(df_columns, possible_names):
-            for col in df_columns:
-                if col in possible_names:
-                    return col
-            return None
-
-        nombre_col = find_column(df.columns, column_mappings['nombre'])
-        x_col = find_column(df.columns, column_mappings['x'])
-        y_col = find_column(df.columns, column_mappings['y'])
-        z_col = find_column(df.columns, column_mappings['z'])
-        tipo_col = find_column(df.columns, column_mappings['tipo'])
-
-        if not nombre_col:
-            raise HTTPException(status_code=400, detail=f"No se encontró columna de nombre de imagen. Columnas disponibles: {list(df.columns)}")
+        # Índices en memoria con los nombres del proyecto (una consulta por tabla)
+        photo_index = NameMatchIndex(
+            (title, photo_id) for photo_id, title in db.query(Photo.id, Photo.title)
+            .filter(Photo.project_id == project_id)
+            .order_by(Photo.id)
+        )
+        gallery_index = NameMatchIndex(
+            (filename, image_id) for image_id, filename in db.query(GalleryImage.id, GalleryImage.filename)
+            .filter(GalleryImage.project_id == project_id)
+            .order_by(GalleryImage.id)
+        )
 
-        if not x_col or not y_col:
-            raise HTTPException(status_code=400, detail=f"No se encontraron columnas X e Y. Columnas disponibles: {list(df.columns)}")
+        # Marco local del proyecto para completar UTM/geo/local en la importación
+        transformer = get_coordinate_transformer()
+        frame = get_project_frame(project)
 
-        # Procesar cada fila
         imported_count = 0
-        updated_count = 0
+        # (tabla, id) actualizados: varias filas del mismo objeto cuentan una vez
+        updated_targets = set()
+        total_rows = 0
+        error_count = 0
         errors = []
+        columns = None
 
-        for idx, row in df.iterrows():
-            try:
-                nombre_imagen = str(row[nombre_col]).strip()
-                x_value = float(row[x_col])
-                y_value = float(row[y_col])
-                z_value = float(row[z_col]) if z_col and pd.notna(row[z_col]) else 0.0
-                tipo_objeto = str(row[tipo_col]).strip() if tipo_col and pd.notna(row[tipo_col]) else object_type
-
-                # Buscar foto/imagen existente por nombre
-                photo = db.query(Photo).filter(
-                    Photo.project_id == project_id,
-                    Photo.title.contains(nombre_imagen)
-                ).first()
-
-                gallery_image = db.query(GalleryImage).filter(
-                    GalleryImage.project_id == project_id,
-                    GalleryImage.filename.contains(nombre_imagen)
-                ).first()
-
-                target = photo or gallery_image
-
-                if target:
-                    # Actualizar coordenadas según tipo
-                    if coordinate_type == 'local':
-                        target.project_x = x_value
-                        target.project_y = y_value
-                        target.project_z = z_value
-                        target.coordinate_source = 'local'
-
-                    elif coordinate_type == 'utm':
-                        target.utm_easting = x_value
-                        target.utm_northing = y_value
-                        target.project_z = z_value
-                        target.coordinate_source = 'utm'
-                        # También calcular coordenadas locales (si hay origen definido)
-                        # TODO: implementar transformación UTM -> Local
-
-                    elif coordinate_type == 'geo':
-                        target.geo_latitude = x_value
-                        target.geo_longitude = y_value
-                        target.project_z = z_value
-                        target.coordinate_source = 'geo'
-                        # También calcular UTM y Local
-                        # TODO: implementar transformación Geo -> UTM -> Local
-
-                    target.object_type = tipo_objeto
-                    updated_count += 1
-                else:
-                    errors.append(f"Fila {idx + 2}: Imagen '{nombre_imagen}' no encontrada en el proyecto")
+        def add_error(message):
+            nonlocal error_count
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append(message)
 
-            except Exception as e:
-                errors.append(f"Fila {idx + 2}: Error procesando - {str(e)}")
+        # El fichero se lee por bloques desde el temporal de la subida y cada
+        # bloque se escribe antes de leer el siguiente
+        try:
+            chunks = iter_coordinate_chunks(file.file, file.filename, IMPORT_CHUNK_SIZE)
+            first_chunk = next(chunks, None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if first_chunk is None:
+            raise HTTPException(status_code=400, detail="El archivo no contiene filas de coordenadas")
+
+        for chunk in itertools.chain([first_chunk], chunks):
+            if columns is None:
+                columns = find_columns(chunk.columns)
+                if not columns['nombre']:
+                    raise HTTPException(status_code=400, detail=f"No se encontró columna de nombre de imagen. Columnas disponibles: {list(chunk.columns)}")
+
+                if not columns['x'] or not columns['y']:
+                    raise HTTPException(status_code=400, detail=f"No se encontraron columnas X e Y. Columnas disponibles: {list(chunk.columns)}")
+
+                # Con columnas genéricas X/Y el fichero geo trae (latitud, longitud);
+                # si las columnas se llaman lat/lon se respeta su nombre
+                named_geo_columns = columns['x'] in ('longitude', 'lon', 'lng') or columns['y'] in ('latitude', 'lat')
+
+            total_rows += len(chunk)
+
+            # Conversión vectorizada del bloque
+            names = chunk[columns['nombre']]
+            x_values = pd.to_numeric(chunk[columns['x']], errors='coerce')
+            y_values = pd.to_numeric(chunk[columns['y']], errors='coerce')
+            if columns['z']:
+                z_values = pd.to_numeric(chunk[columns['z']], errors='coerce').fillna(0.0)
+            else:
+                z_values = pd.Series(0.0, index=chunk.index)
+            if columns['tipo']:
+                tipos = chunk[columns['tipo']].where(chunk[columns['tipo']].notna(), object_type).astype(str).str.strip()
+            else:
+                tipos = pd.Series(object_type, index=chunk.index)
+
+            photo_updates = {}
+            gallery_updates = {}
+
+            for idx, nombre, x_value, y_value, z_value, tipo_objeto in zip(
+                chunk.index, names, x_values, y_values, z_values, tipos
+            ):
+                if pd.isna(x_value) or pd.isna(y_value):
+                    add_error(f"Fila {idx + 2}: Error procesando - coordenadas X/Y no numéricas")
+                    continue
+
+                nombre_imagen = str(nombre).strip() if pd.notna(nombre) else ''
+
+                # Buscar foto/imagen existente por nombre (las fotos tienen prioridad)
+                target_id = photo_index.resolve(nombre_imagen)
+                target_model, target_updates = Photo, photo_updates
+                if target_id is None:
+                    target_id = gallery_index.resolve(nombre_imagen)
+                    target_model, target_updates = GalleryImage, gallery_updates
+
+                if target_id is None:
+                    add_error(f"Fila {idx + 2}: Imagen '{nombre_imagen}' no encontrada en el proyecto")
+                    continue
+
+                # Actualizar coordenadas según tipo
+                if coordinate_type == 'local':
+                    update = {
+                        'project_x': float(x_value),
+                        'project_y': float(y_value),
+                        'project_z': float(z_value),
+                        'coordinate_source': 'local'
+                    }
+
+                elif coordinate_type == 'utm':
+                    update = {
+                        'utm_easting': float(x_value),
+                        'utm_northing': float(y_value),
+                        'project_z': float(z_value),
+                        'coordinate_source': 'utm'
+                    }
+
+                elif coordinate_type == 'geo':
+                    latitude, longitude = (y_value, x_value) if named_geo_columns else (x_value, y_value)
+                    update = {
+                        'geo_latitude': float(latitude),
+                        'geo_longitude': float(longitude),
+                        'project_z': float(z_value),
+                        'coordinate_source': 'geo'
+                    }
 
+                else:
+                    update = {}
+
+                update['id'] = target_id
+                update['object_type'] = tipo_objeto
+                # Número de fila del fichero para los errores (se quita antes de escribir)
+                update['_row'] = idx + 2
+                target_updates[target_id] = update
+                updated_targets.add((target_model, target_id))
+
+            # Calcular el resto de sistemas (UTM/geo/local) del bloque en un solo pase
+            pending = list(photo_updates.values()) + list(gallery_updates.values())
+            if pending and coordinate_type in ('local', 'utm', 'geo'):
+                completed = transformer.complete_coordinates(
+                    {field: [update.get(field) for update in pending] for field in BATCH_FIELDS},
+                    coordinate_type,
+                    frame
+                )
+                for index, update in enumerate(pending):
+                    if completed['ok'][index]:
+                        update.update(batch_row(completed, index))
+                    elif completed['error'][index]:
+                        add_error(f"Fila {update['_row']}: Coordenadas guardadas sin transformar - {completed['error_messages'].get(index)}")
+            for update in pending:
+                del update['_row']
+
+            # Escritura del bloque: una sentencia por tabla
+            if photo_updates:
+                db.bulk_update_mappings(Photo, list(photo_updates.values()))
+            if gallery_updates:
+                db.bulk_update_mappings(GalleryImage, list(gallery_updates.values()))
+
+        bump_objects_revision(db, [project_id])
         db.commit()
 
         return {
             "message": "Importación completada",
             "imported": imported_count,
-            "updated": updated_count,
-            "total_rows": len(df),
+            "updated": len(updated_targets),
+            "total_rows": total_rows,
             "errors": errors if errors else None,
+            "error_count": error_count,
             "coordinate_type": coordinate_type
         }
 
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
+        db.rollback()
         print(f"[ERROR] Failed to import coordinates: {e}")
         raise HTTPException(status_code=400, detail=f"Error al importar coordenadas: {str(e)}")
 
@@ -1658,15 +3188,20 @@ async def update_project_positioning(
     map_origin_lng: float = Body(...),
     map_rotation: float = Body(0.0),
     recalculate_coordinates: bool = Body(True),
+    project: Project = Depends(get_project_access),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Actualiza el origen y rotación del proyecto en el mapa
 
-    Si recalculate_coordinates=True, recalcula todas las coordenadas:
-    - Si las fotos tienen coordenadas locales → calcula UTM y Geo
-    - Si las fotos tienen coordenadas UTM → recalcula locales
+    Si recalculate_coordinates=True, encola un trabajo que recalcula todas las
+    coordenadas (ver run_positioning_job) y devuelve su id; el progreso se
+    consulta en GET /api/jobs/{job_id}
+
+    Mientras haya un recálculo pendiente o en curso el posicionamiento no se
+    puede cambiar (409 con el id de ese trabajo): dos trabajos a la vez
+    escribirían coordenadas de orígenes distintos sobre las mismas filas.
     """
     if not COORDINATES_AVAILABLE:
         raise HTTPException(
@@ -1674,115 +3209,51 @@ async def update_project_positioning(
             detail="Coordinate transformation feature temporarily unavailable."
         )
 
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
+    active_job = db.query(BackgroundJob).filter(
+        BackgroundJob.project_id == project_id,
+        BackgroundJob.job_type == "recalculate_positioning",
+        BackgroundJob.status.in_(["queued", "running"])
+    ).order_by(BackgroundJob.id.desc()).first()
+    if active_job:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "A positioning recalculation is already in progress for this project",
+                "job_id": active_job.id,
+                "job_status": active_job.status,
+                "job_url": f"/api/jobs/{active_job.id}"
+            }
+        )
 
     # Actualizar origen y rotación
     project.map_origin_lat = map_origin_lat
     project.map_origin_lng = map_origin_lng
     project.map_rotation = map_rotation
+    invalidate_project_frame(project_id)
 
     if recalculate_coordinates:
-        transformer = CoordinateTransformer()
-
-        # Obtener todas las fotos del proyecto
-        photos = db.query(Photo).filter(Photo.project_id == project_id).all()
-        gallery_images = db.query(GalleryImage).filter(GalleryImage.project_id == project_id).all()
-
-        all_items = photos + gallery_images
-        updated_count = 0
-
-        for item in all_items:
-            try:
-                # Si tiene coordenadas locales, calcular UTM y Geo
-                if item.project_x is not None and item.project_y is not None and item.coordinate_source == 'local':
-                    utm = transformer.local_to_utm(
-                        item.project_x,
-                        item.project_y,
-                        item.project_z or 0,
-                        map_origin_lat,
-                        map_origin_lng,
-                        map_rotation
-                    )
-                    item.utm_easting = utm['utm_easting']
-                    item.utm_northing = utm['utm_northing']
-                    item.utm_zone = utm['utm_zone']
-                    item.utm_hemisphere = utm['utm_hemisphere']
-                    item.utm_datum = utm['utm_datum']
-
-                    # También calcular coordenadas geográficas
-                    geo = transformer.utm_to_geo(
-                        utm['utm_easting'],
-                        utm['utm_northing'],
-                        utm['utm_zone']
-                    )
-                    item.geo_latitude = geo['geo_latitude']
-                    item.geo_longitude = geo['geo_longitude']
-
-                    updated_count += 1
-
-                # Si tiene coordenadas UTM, recalcular locales
-                elif item.utm_easting is not None and item.utm_northing is not None:
-                    local = transformer.utm_to_local(
-                        item.utm_easting,
-                        item.utm_northing,
-                        map_origin_lat,
-                        map_origin_lng,
-                        map_rotation
-                    )
-                    item.project_x = local['project_x']
-                    item.project_y = local['project_y']
-
-                    # También calcular coordenadas geográficas si no existen
-                    if item.geo_latitude is None or item.geo_longitude is None:
-                        geo = transformer.utm_to_geo(
-                            item.utm_easting,
-                            item.utm_northing,
-                            item.utm_zone or 30
-                        )
-                        item.geo_latitude = geo['geo_latitude']
-                        item.geo_longitude = geo['geo_longitude']
-
-                    updated_count += 1
-
-                # Si tiene coordenadas geográficas, calcular UTM y locales
-                elif item.geo_latitude is not None and item.geo_longitude is not None:
-                    utm = transformer.geo_to_utm(item.geo_latitude, item.geo_longitude)
-                    item.utm_easting = utm['utm_easting']
-                    item.utm_northing = utm['utm_northing']
-                    item.utm_zone = utm['utm_zone']
-                    item.utm_hemisphere = utm['utm_hemisphere']
-                    item.utm_datum = utm['utm_datum']
-
-                    local = transformer.utm_to_local(
-                        utm['utm_easting'],
-                        utm['utm_northing'],
-                        map_origin_lat,
-                        map_origin_lng,
-                        map_rotation
-                    )
-                    item.project_x = local['project_x']
-                    item.project_y = local['project_y']
-
-                    updated_count += 1
-
-            except Exception as e:
-                print(f"[WARNING] Error transforming coordinates for item {item.id}: {e}")
-
+        # El recálculo se hace en segundo plano para no bloquear la petición
+        job = BackgroundJob(
+            job_type="recalculate_positioning",
+            project_id=project_id,
+            owner_id=current_user.id,
+            status="queued"
+        )
+        db.add(job)
         db.commit()
-        print(f"[POSITIONING] Project {project_id} positioned at ({map_origin_lat}, {map_origin_lng}) rotation={map_rotation}°. {updated_count} items updated")
+        db.refresh(job)
+
+        job_runner.submit(job.id, run_positioning_job, job.id, project_id)
+        print(f"[POSITIONING] Project {project_id} positioned at ({map_origin_lat}, {map_origin_lng}) rotation={map_rotation}°. Recalculation job {job.id} queued")
 
         return {
             "message": "Posicionamiento actualizado",
             "origin": {"lat": map_origin_lat, "lng": map_origin_lng},
             "rotation": map_rotation,
-            "coordinates_recalculated": recalculate_coordinates,
-            "items_updated": updated_count
+            "coordinates_recalculated": True,
+            "job_id": job.id,
+            "job_status": job.status,
+            "job_url": f"/api/jobs/{job.id}"
         }
 
     db.commit()
@@ -1793,11 +3264,107 @@ async def update_project_positioning(
         "coordinates_recalculated": False
     }
 
+def run_positioning_job(job_id: int, project_id: int):
+    """
+    Worker: recalcula las coordenadas del proyecto tras cambiar su origen
+
+    Prioridad por elemento (igual que antes en la petición síncrona):
+    - Coordenadas locales (coordinate_source='local') → calcula UTM y Geo
+    - Coordenadas UTM → recalcula locales (y Geo si faltan)
+    - Coordenadas geográficas → calcula UTM y locales
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if not job:
+            return
+
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        job.total_items = (
+            db.query(Photo).filter(Photo.project_id == project_id).count() +
+            db.query(GalleryImage).filter(GalleryImage.project_id == project_id).count()
+        )
+        db.commit()
+
+        frame = get_project_frame(project) if project else None
+        if frame is None:
+            raise ValueError("El proyecto no existe o no tiene origen definido")
+
+        def on_progress(stats):
+            job.processed_items = stats['total_items']
+            job.updated_items = stats['updated']
+            job.rows_per_second = stats['rows_per_second']
+            job.error_count = len(stats['errors'])
+            job.errors = stats['errors'][:MAX_STORED_JOB_ERRORS]
+
+        recalculator = CoordinateRecalculator(db, frame, mode='positioning')
+        stats = recalculator.run([Photo, GalleryImage], project_id, commit_each_chunk=True, on_progress=on_progress)
+
+        on_progress(stats)
+        bump_objects_revision(db, [project_id])
+        job.status = "completed"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+        print(f"[POSITIONING] Job {job_id}: project {project_id}, {stats['updated']} items updated ({stats['rows_per_second']} rows/s)")
+
+    except Exception as e:
+        db.rollback()
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if job:
+            job.status = "failed"
+            job.errors = (job.errors or [])[:MAX_STORED_JOB_ERRORS - 1] + [str(e)]
+            job.error_count = (job.error_count or 0) + 1
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+@app.get("/api/jobs/{job_id}")
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Estado, progreso y errores de un trabajo en segundo plano"""
+    job = db.query(BackgroundJob).filter(
+        BackgroundJob.id == job_id,
+        BackgroundJob.owner_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    progress = None
+    if job.total_items:
+        progress = round(min((job.processed_items or 0) / job.total_items, 1.0), 4)
+    elif job.status == "completed":
+        progress = 1.0
+
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "project_id": job.project_id,
+        "status": job.status,
+        "total_items": job.total_items,
+        "processed_items": job.processed_items,
+        "updated_items": job.updated_items,
+        "progress": progress,
+        "rows_per_second": job.rows_per_second,
+        "error_count": job.error_count,
+        "errors": job.errors or None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
 @app.post("/api/projects/{project_id}/recalculate-coordinates")
 async def recalculate_all_coordinates(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    project: Project = Depends(get_project_access),
+    db: Session = Depends(get_db)
 ):
     """
     Recalcula todas las coordenadas del proyecto basándose en el origen y rotación actuales
@@ -1810,65 +3377,27 @@ async def recalculate_all_coordinates(
             detail="Coordinate recalculation feature temporarily unavailable."
         )
 
-    # Verificar proyecto
-    project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
     if not project.map_origin_lat or not project.map_origin_lng:
         raise HTTPException(
             status_code=400,
             detail="El proyecto no tiene origen definido. Configura primero el posicionamiento."
         )
 
-    transformer = CoordinateTransformer()
-
-    # Obtener todas las fotos del proyecto
-    photos = db.query(Photo).filter(Photo.project_id == project_id).all()
-    gallery_images = db.query(GalleryImage).filter(GalleryImage.project_id == project_id).all()
-
-    all_items = photos + gallery_images
-    updated_count = 0
-    errors = []
-
-    for item in all_items:
-        try:
-            # Prioridad: local → UTM → geo
-            if item.project_x is not None and item.project_y is not None:
-                # Calcular desde locales
-                utm = transformer.local_to_utm(
-                    item.project_x,
-                    item.project_y,
-                    item.project_z or 0,
-                    project.map_origin_lat,
-                    project.map_origin_lng,
-                    project.map_rotation
-                )
-                geo = transformer.utm_to_geo(utm['utm_easting'], utm['utm_northing'], utm['utm_zone'])
-
-                item.utm_easting = utm['utm_easting']
-                item.utm_northing = utm['utm_northing']
-                item.utm_zone = utm['utm_zone']
-                item.utm_hemisphere = utm['utm_hemisphere']
-                item.utm_datum = utm['utm_datum']
-                item.geo_latitude = geo['geo_latitude']
-                item.geo_longitude = geo['geo_longitude']
-
-                updated_count += 1
-
-        except Exception as e:
-            errors.append(f"Item {item.id}: {str(e)}")
+    # Prioridad: local → UTM → geo. Se procesa en bloques con SQL por lotes
+    recalculator = CoordinateRecalculator(db, get_project_frame(project), mode='local')
+    stats = recalculator.run([Photo, GalleryImage], project_id)
 
+    bump_objects_revision(db, [project_id])
     db.commit()
+    print(f"[RECALCULATE] Project {project_id}: {stats['updated']}/{stats['total_items']} items in {stats['elapsed_seconds']}s ({stats['rows_per_second']} rows/s)")
 
     return {
         "message": "Coordenadas recalculadas",
-        "total_items": len(all_items),
-        "updated": updated_count,
-        "errors": errors if errors else None
+        "total_items": stats['total_items'],
+        "updated": stats['updated'],
+        "errors": stats['errors'] if stats['errors'] else None,
+        "elapsed_seconds": stats['elapsed_seconds'],
+        "rows_per_second": stats['rows_per_second']
     }
 
 # ============================================================================
@@ -2082,10 +3611,32 @@ async def get_project_stats(current_user: dict = Depends(get_current_user), db:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/cache-stats")
+async def get_cache_stats(current_user: User = Depends(require_admin)):
+    """
+    Contadores de las cachés internas del proceso (aciertos, fallos, coste)
+
+    Solo para los usuarios de ADMIN_EMAILS.
+    """
+    return {
+        "coordinate_transformers": get_transformer_registry().stats() if COORDINATES_AVAILABLE else None,
+        "project_frames": project_frame_cache_stats() if COORDINATES_AVAILABLE else None,
+        "background_jobs": job_runner.stats(),
+        "upload_sessions": upload_sessions.stats(),
+        "image_derivatives": derivative_pipeline.stats() if derivative_pipeline else None,
+        "map_clusters": map_cluster_cache.stats(),
+        "vector_tiles": tile_cache.stats(),
+        "users": user_cache.stats(),
+        "project_access": project_access_cache.stats(),
+        "password_hasher": password_hasher.stats()
+    }
+
 print("\n" + "=" * 60)
 print("INICIANDO PHOTOSITE360 BACKEND")
 print("=" * 60)
-print(f"Cloudinary configurado: {cloudinary.config().cloud_name}")
+print(f"Almacenamiento: {STORAGE_BACKEND}")
+if STORAGE_BACKEND == "cloudinary":
+    print(f"Cloudinary configurado: {cloudinary.config().cloud_name}")
 print("Limpieza automatica activada")
 print("Sistema de invitaciones activado")
 print("Servidor en puerto: 5000")
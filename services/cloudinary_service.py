@@ -1,38 +1,114 @@
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from typing import Optional
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import io
+from typing import BinaryIO, Dict, Optional
+from services.storage import get_storage_backend
+from utils.upload_stream import HashingReader
+
+# Las subidas al almacenamiento son bloqueantes: se ejecutan en un pool propio y
+# acotado para no congelar el event loop ni agotar el threadpool de FastAPI
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+_upload_executor = ThreadPoolExecutor(
+    max_workers=UPLOAD_MAX_CONCURRENCY,
+    thread_name_prefix="photosite360-upload"
+)
 
 class CloudinaryService:
+    """
+    Punto de entrada de las subidas de imágenes
+
+    El nombre se mantiene por compatibilidad: el almacenamiento real lo
+    hace el backend elegido con STORAGE_BACKEND (ver services/storage.py).
+    """
+
     @staticmethod
     def upload_image(file_content: bytes, folder: str, public_id: str) -> Optional[str]:
         """
-        Upload image to Cloudinary
+        Upload image to the configured storage backend
 
         Args:
             file_content: Image binary content
-            folder: Cloudinary folder path
+            folder: Storage folder path
             public_id: Public ID for the image
 
         Returns:
-            Secure URL of uploaded image or None if upload fails
-        """
-        try:
-            response = cloudinary.uploader.upload(
-                file_content,
-                folder=folder,
-                public_id=public_id,
-                resource_type="image"
-            )
-            return response.get("secure_url")
-        except Exception as e:
-            print(f"Error uploading to Cloudinary: {e}")
-            return None
+            Public URL of uploaded image or None if upload fails
+        """
+        return get_storage_backend().upload(io.BytesIO(file_content), folder, public_id)
+
+    @staticmethod
+    async def upload_image_async(file_content: bytes, folder: str, public_id: str) -> Optional[str]:
+        """
+        Versión no bloqueante de upload_image
+
+        La subida se ejecuta en el pool de subidas (UPLOAD_MAX_CONCURRENCY
+        hilos); si todos están ocupados la petición espera su turno sin
+        bloquear el event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _upload_executor,
+            partial(CloudinaryService.upload_image, file_content, folder, public_id)
+        )
+
+    @staticmethod
+    def upload_stream(
+        fileobj: BinaryIO,
+        folder: str,
+        public_id: str,
+        filename: Optional[str] = None,
+        sha256: Optional[str] = None
+    ) -> Dict:
+        """
+        Upload a file-like object to the configured storage backend
+
+        The backend reads the file in blocks, so the image is never held in
+        memory as a single bytes object. Size and SHA-256 are computed while
+        reading, unless the caller already has the hash.
+
+        Args:
+            fileobj: Seekable binary file (e.g. UploadFile.file)
+            folder: Storage folder path
+            public_id: Public ID for the image
+            filename: Original file name
+            sha256: Precomputed hash (e.g. from hash_stream); skips hashing
+
+        Returns:
+            Dict with url (None if upload fails), size and sha256
+        """
+        if sha256 is not None:
+            size = fileobj.seek(0, os.SEEK_END)
+            fileobj.seek(0)
+            url = get_storage_backend().upload(fileobj, folder, public_id, filename)
+            return {"url": url, "size": size, "sha256": sha256}
+
+        reader = HashingReader(fileobj, name=filename)
+        reader.seek(0)
+        url = get_storage_backend().upload(reader, folder, public_id, filename)
+
+        return {"url": url, "size": reader.size, "sha256": reader.hexdigest()}
+
+    @staticmethod
+    async def upload_stream_async(
+        fileobj: BinaryIO,
+        folder: str,
+        public_id: str,
+        filename: Optional[str] = None,
+        sha256: Optional[str] = None
+    ) -> Dict:
+        """Versión no bloqueante de upload_stream (pool de subidas)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _upload_executor,
+            partial(CloudinaryService.upload_stream, fileobj, folder, public_id, filename, sha256)
+        )
 
     @staticmethod
     def delete_image(public_id: str) -> bool:
         """
-        Delete image from Cloudinary
+        Delete image from the configured storage backend
 
         Args:
             public_id: Public ID of the image to delete
@@ -40,9 +116,4 @@ class CloudinaryService:
         Returns:
             True if deletion was successful, False otherwise
         """
-        try:
-            result = cloudinary.uploader.destroy(public_id)
-            return result.get("result") == "ok"
-        except Exception as e:
-            print(f"Error deleting from Cloudinary: {e}")
-            return False
+        return get_storage_backend().delete(public_id)
@@ -0,0 +1,280 @@
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from utils.coordinate_transforms import CoordinateTransformer, ProjectFrame, get_coordinate_transformer
+
+# Columnas leídas de cada fila (solo coordenadas, nunca el objeto ORM completo)
+READ_COLUMNS = (
+    'id', 'project_x', 'project_y', 'utm_easting', 'utm_northing', 'utm_zone',
+    'utm_hemisphere', 'utm_datum', 'geo_latitude', 'geo_longitude', 'coordinate_source',
+)
+
+# Columnas escritas de vuelta (todas las filas actualizadas llevan las mismas)
+WRITE_COLUMNS = (
+    'project_x', 'project_y', 'utm_easting', 'utm_northing', 'utm_zone',
+    'utm_hemisphere', 'utm_datum', 'geo_latitude', 'geo_longitude',
+)
+
+_POSTGRES_TYPES = {
+    'id': 'integer',
+    'utm_zone': 'integer',
+    'utm_hemisphere': 'varchar',
+    'utm_datum': 'varchar',
+}
+
+
+class CoordinateRecalculator:
+    """
+    Recalcula coordenadas de un proyecto por lotes en SQL
+
+    Lee las filas en bloques ordenados por id (solo las columnas de
+    coordenadas), transforma cada bloque con operaciones vectorizadas y lo
+    escribe con una única sentencia por bloque: UPDATE ... FROM (VALUES ...)
+    en PostgreSQL y executemany (bulk_update_mappings) en el resto.
+
+    Modos:
+    - 'local': filas con coordenadas locales -> UTM y geográficas
+      (comportamiento de /recalculate-coordinates)
+    - 'positioning': prioridad local (coordinate_source='local') -> UTM -> geo
+      (comportamiento de /positioning tras mover el origen)
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        frame: ProjectFrame,
+        mode: str = 'local',
+        chunk_size: int = 2000,
+        transformer: Optional[CoordinateTransformer] = None
+    ):
+        if mode not in ('local', 'positioning'):
+            raise ValueError(f"Modo de recálculo no válido: {mode}")
+
+        self.db = db
+        self.frame = frame
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.transformer = transformer or get_coordinate_transformer()
+        self.is_postgres = db.get_bind().dialect.name == 'postgresql'
+
+    def run(
+        self,
+        models: Sequence,
+        project_id: int,
+        commit_each_chunk: bool = False,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        Recalcula todas las filas del proyecto en los modelos indicados
+
+        Args:
+            models: Modelos ORM con columnas de coordenadas (Photo, GalleryImage...)
+            project_id: Proyecto a recalcular
+            commit_each_chunk: Confirmar la transacción tras cada bloque
+            on_progress: Callback llamado tras cada bloque (antes del commit) con las estadísticas parciales
+
+        Returns:
+            Dict con total_items, updated, errors, elapsed_seconds, rows_per_second
+        """
+        stats = {'total_items': 0, 'updated': 0, 'errors': []}
+        start = time.perf_counter()
+
+        for model in models:
+            for rows in self.iter_chunks(model, project_id):
+                updates, errors = self.transform_chunk(rows)
+                self.write_chunk(model, updates)
+
+                stats['total_items'] += len(rows)
+                stats['updated'] += len(updates)
+                stats['errors'].extend(errors)
+
+                # El progreso se registra en la misma transacción que el bloque
+                if on_progress:
+                    on_progress(self._with_throughput(stats, start))
+
+                if commit_each_chunk:
+                    self.db.commit()
+
+        return self._with_throughput(stats, start)
+
+    def iter_chunks(self, model, project_id: int) -> Iterator[List]:
+        """Recorre las filas del proyecto en bloques por id (keyset pagination)"""
+        columns = [getattr(model, name) for name in READ_COLUMNS]
+        last_id = 0
+
+        while True:
+            rows = self.db.execute(
+                select(*columns)
+                .where(model.project_id == project_id, model.id > last_id)
+                .order_by(model.id)
+                .limit(self.chunk_size)
+            ).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def transform_chunk(self, rows: Sequence) -> tuple:
+        """
+        Transforma un bloque de filas
+
+        Returns:
+            (lista de mappings para actualizar, lista de mensajes de error)
+        """
+        size = len(rows)
+        data = {name: [row[index] for row in rows] for index, name in enumerate(READ_COLUMNS)}
+        ids = data['id']
+        values = {
+            name: np.array(data[name], dtype=np.float64)
+            for name in READ_COLUMNS if name not in ('id', 'utm_hemisphere', 'utm_datum', 'coordinate_source')
+        }
+        output = {name: np.array(data[name], dtype=object) for name in WRITE_COLUMNS}
+
+        has_local = ~np.isnan(values['project_x']) & ~np.isnan(values['project_y'])
+        has_utm = ~np.isnan(values['utm_easting']) & ~np.isnan(values['utm_northing'])
+        has_geo = ~np.isnan(values['geo_latitude']) & ~np.isnan(values['geo_longitude'])
+
+        if self.mode == 'local':
+            from_local = has_local
+            from_utm = from_geo = np.zeros(size, dtype=bool)
+        else:
+            is_local_source = np.array([source == 'local' for source in data['coordinate_source']], dtype=bool)
+            from_local = has_local & is_local_source
+            from_utm = ~from_local & has_utm
+            from_geo = ~from_local & ~from_utm & has_geo
+
+        updated = np.zeros(size, dtype=bool)
+        failed = {}
+
+        # 1. Local -> UTM -> geo
+        if from_local.any():
+            easting, northing = self.frame.local_to_utm_arrays(values['project_x'], values['project_y'])
+            geo = self.transformer.batch_transform_arrays({
+                'utm_easting': easting,
+                'utm_northing': northing,
+                'utm_zone': np.full(size, self.frame.utm_zone),
+            }, 'utm_to_geo')
+            ok = from_local & geo['ok']
+            self._assign(output, ok, {
+                'utm_easting': easting,
+                'utm_northing': northing,
+                'utm_zone': np.full(size, self.frame.utm_zone),
+                'utm_hemisphere': np.full(size, 'N', dtype=object),
+                'utm_datum': np.full(size, 'ETRS89', dtype=object),
+                'geo_latitude': geo['geo_latitude'],
+                'geo_longitude': geo['geo_longitude'],
+            })
+            updated |= ok
+            self._collect_errors(failed, from_local, geo)
+
+        # 2. UTM -> local (y geo si falta)
+        if from_utm.any():
+            project_x, project_y = self.frame.utm_to_local_arrays(values['utm_easting'], values['utm_northing'])
+            self._assign(output, from_utm, {'project_x': project_x, 'project_y': project_y})
+
+            missing_geo = from_utm & ~has_geo
+            geo = self.transformer.batch_transform_arrays({
+                'utm_easting': np.where(missing_geo, values['utm_easting'], np.nan),
+                'utm_northing': np.where(missing_geo, values['utm_northing'], np.nan),
+                'utm_zone': values['utm_zone'],
+            }, 'utm_to_geo')
+            self._assign(output, missing_geo & geo['ok'], {
+                'geo_latitude': geo['geo_latitude'],
+                'geo_longitude': geo['geo_longitude'],
+            })
+            updated |= from_utm
+            self._collect_errors(failed, missing_geo, geo)
+
+        # 3. Geo -> UTM -> local
+        if from_geo.any():
+            utm = self.transformer.batch_transform_arrays({
+                'geo_latitude': np.where(from_geo, values['geo_latitude'], np.nan),
+                'geo_longitude': np.where(from_geo, values['geo_longitude'], np.nan),
+            }, 'geo_to_utm')
+            ok = from_geo & utm['ok']
+            project_x, project_y = self.frame.utm_to_local_arrays(utm['utm_easting'], utm['utm_northing'])
+            self._assign(output, ok, {
+                'utm_easting': utm['utm_easting'],
+                'utm_northing': utm['utm_northing'],
+                'utm_zone': utm['utm_zone'],
+                'utm_hemisphere': utm['utm_hemisphere'],
+                'utm_datum': utm['utm_datum'],
+                'project_x': project_x,
+                'project_y': project_y,
+            })
+            updated |= ok
+            self._collect_errors(failed, from_geo, utm)
+
+        updates = []
+        for index in np.flatnonzero(updated):
+            mapping = {'id': ids[index]}
+            for name in WRITE_COLUMNS:
+                mapping[name] = self._to_python(output[name][index], name)
+            updates.append(mapping)
+
+        errors = [f"Item {ids[index]}: {message}" for index, message in sorted(failed.items())]
+        return updates, errors
+
+    def write_chunk(self, model, updates: List[Dict]):
+        """Escribe un bloque de actualizaciones con una única sentencia"""
+        if not updates:
+            return
+
+        if self.is_postgres:
+            self._update_from_values(model.__tablename__, updates)
+        else:
+            self.db.bulk_update_mappings(model, updates)
+
+    def _update_from_values(self, table: str, updates: List[Dict]):
+        """UPDATE ... FROM (VALUES ...) para PostgreSQL"""
+        columns = ('id',) + WRITE_COLUMNS
+        params = {}
+        rows = []
+        for row_index, mapping in enumerate(updates):
+            placeholders = []
+            for name in columns:
+                key = f"{name}_{row_index}"
+                params[key] = mapping[name]
+                placeholders.append(f"CAST(:{key} AS {_POSTGRES_TYPES.get(name, 'double precision')})")
+            rows.append(f"({', '.join(placeholders)})")
+
+        assignments = ', '.join(f"{name} = v.{name}" for name in WRITE_COLUMNS)
+        statement = (
+            f"UPDATE {table} AS t SET {assignments} "
+            f"FROM (VALUES {', '.join(rows)}) AS v({', '.join(columns)}) "
+            f"WHERE t.id = v.id"
+        )
+        self.db.execute(text(statement), params)
+
+    @staticmethod
+    def _assign(output: Dict, mask: np.ndarray, columns: Dict):
+        for name, column in columns.items():
+            output[name][mask] = column[mask]
+
+    @staticmethod
+    def _collect_errors(failed: Dict, rows: np.ndarray, batch: Dict):
+        for index in np.flatnonzero(rows & batch['error']):
+            failed.setdefault(int(index), batch['error_messages'].get(int(index), 'Transformación no válida'))
+
+    @staticmethod
+    def _to_python(value, name: str):
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        if name == 'utm_zone':
+            return int(value)
+        return float(value)
+
+    @staticmethod
+    def _with_throughput(stats: Dict, start: float) -> Dict:
+        elapsed = time.perf_counter() - start
+        return {
+            **stats,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(stats['total_items'] / elapsed, 1) if elapsed > 0 else None,
+        }
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+from typing import BinaryIO, Callable, Dict, Optional
+
+from services.storage import STORAGE_BACKEND, get_storage_backend
+from utils.image_derivatives import render_derivatives, tile_url_template
+
+# Procesos dedicados a redimensionar y teselar (trabajo de CPU)
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", "1"))
+# Copias temporales de los originales hasta que se generan los derivados
+DERIVATIVES_DIR = os.getenv(
+    "DERIVATIVES_DIR",
+    os.path.join(tempfile.gettempdir(), "photosite360-derivatives")
+)
+# Pirámide de teselas para las fotos 360. Cada tesela es una subida: una
+# panorámica de 8K son 6 caras × (1+4+16) = 126 ficheros, que en Cloudinary
+# son 126 llamadas a la API (y cuota), así que ahí está desactivada por defecto
+DERIVATIVE_TILES_ENABLED = os.getenv(
+    "DERIVATIVE_TILES_ENABLED",
+    "false" if STORAGE_BACKEND == "cloudinary" else "true"
+).lower() in ("1", "true", "yes")
+# Subidas simultáneas de teselas de una misma foto
+DERIVATIVE_UPLOAD_CONCURRENCY = int(os.getenv("DERIVATIVE_UPLOAD_CONCURRENCY", "4"))
+
+
+class DerivativePipeline:
+    """
+    Generación de miniaturas, vistas previas y teselas tras cada subida
+
+    El trabajo de imagen se ejecuta en un ProcessPoolExecutor (no compite
+    con el GIL del servidor) y la subida de los derivados al almacenamiento
+    en hilos propios. Al terminar se llama a `on_complete` con las URLs,
+    que es quien las guarda en la base de datos.
+    """
+
+    def __init__(self, workers: int = None, work_dir: str = None):
+        self.workers = max(workers or DERIVATIVE_WORKERS, 1)
+        self.work_dir = work_dir or DERIVATIVES_DIR
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="photosite360-derivatives"
+        )
+        # Pool propio para las teselas: no compite con las subidas de los usuarios
+        self._uploads = ThreadPoolExecutor(
+            max_workers=max(DERIVATIVE_UPLOAD_CONCURRENCY, 1),
+            thread_name_prefix="photosite360-derivative-uploads"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._render_seconds = 0.0
+        os.makedirs(self.work_dir, exist_ok=True)
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Se crea al primer uso; 'spawn' evita heredar hilos y conexiones del servidor
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+    def stage(self, fileobj: BinaryIO) -> str:
+        """
+        Copia el fichero subido al directorio de trabajo
+
+        El UploadFile se cierra al terminar la petición; los derivados se
+        generan después a partir de esta copia, que se borra al acabar.
+        """
+        path = os.path.join(self.work_dir, f"{secrets.token_hex(8)}.src")
+        fileobj.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+        return path
+
+    def stage_path(self, source_path: str) -> str:
+        """Mueve un fichero ya en disco (p.ej. una subida por bloques) al directorio de trabajo"""
+        path = os.path.join(self.work_dir, f"{secrets.token_hex(8)}.src")
+        shutil.move(source_path, path)
+        return path
+
+    def submit(
+        self,
+        source_path: str,
+        folder: str,
+        public_id: str,
+        on_complete: Callable[[Dict], None],
+        tiles: bool = False
+    ) -> Future:
+        """
+        Encola la generación de derivados de un fichero preparado con stage()
+
+        Args:
+            source_path: Copia del original (se borra al terminar)
+            folder: Carpeta de almacenamiento del original
+            public_id: Identificador del original; los derivados usan sufijos
+            on_complete: Recibe thumbnail_url, preview_url y tiles
+            tiles: Generar teselas 360 (si DERIVATIVE_TILES_ENABLED)
+        """
+        with self._lock:
+            self._pending += 1
+        tiles = tiles and DERIVATIVE_TILES_ENABLED
+        return self._threads.submit(self._run, source_path, folder, public_id, on_complete, tiles)
+
+    def _run(self, source_path, folder, public_id, on_complete, tiles):
+        output_dir = tempfile.mkdtemp(dir=self.work_dir)
+        start = time.perf_counter()
+        try:
+            rendered = self._process_pool().submit(render_derivatives, source_path, output_dir, tiles).result()
+            render_seconds = time.perf_counter() - start
+
+            storage = get_storage_backend()
+            derivatives = {
+                "thumbnail_url": self._upload(storage, output_dir, rendered["thumbnail"], folder, f"{public_id}_thumb"),
+                "preview_url": self._upload(storage, output_dir, rendered["preview"], folder, f"{public_id}_preview"),
+                "tiles": None,
+            }
+
+            if rendered["tiles"]:
+                config = dict(rendered["tiles"])
+                tile_urls = self._upload_tiles(storage, output_dir, config.pop("files"), f"{folder}/{public_id}_tiles")
+                config["url_template"] = tile_url_template(tile_urls)
+                if config["url_template"] is None:
+                    config["urls"] = {relative[len("tiles/"):]: url for relative, url in tile_urls.items()}
+                derivatives["tiles"] = config
+
+            on_complete(derivatives)
+            with self._lock:
+                self._completed += 1
+                self._render_seconds += render_seconds
+            print(f"[DERIVATIVES] {public_id}: derivados generados en {time.perf_counter() - start:.2f}s")
+            return derivatives
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            print(f"[DERIVATIVES] Error generando derivados de {public_id}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+            shutil.rmtree(output_dir, ignore_errors=True)
+            if os.path.exists(source_path):
+                os.remove(source_path)
+
+    def _upload_tiles(self, storage, output_dir: str, files, folder: str) -> Dict[str, str]:
+        """
+        Sube las teselas en paralelo (DERIVATIVE_UPLOAD_CONCURRENCY)
+
+        Returns:
+            URL de cada tesela por su ruta relativa
+
+        Raises:
+            RuntimeError: alguna tesela no se pudo subir (las pendientes se cancelan)
+        """
+        futures = {}
+        for relative in files:
+            _, level, name = relative.split("/")
+            futures[relative] = self._uploads.submit(
+                self._upload, storage, output_dir, relative, f"{folder}/{level}", os.path.splitext(name)[0]
+            )
+
+        try:
+            tile_urls = {}
+            for relative, future in futures.items():
+                url = future.result()
+                if not url:
+                    raise RuntimeError(f"Error uploading tile {relative}")
+                tile_urls[relative] = url
+            return tile_urls
+        except BaseException:
+            # Los ficheros se borran al terminar: esperar a las subidas en curso
+            for future in futures.values():
+                future.cancel()
+            wait_futures(list(futures.values()))
+            raise
+
+    @staticmethod
+    def _upload(storage, output_dir: str, relative: str, folder: str, public_id: str) -> Optional[str]:
+        with open(os.path.join(output_dir, *relative.split("/")), "rb") as f:
+            return storage.upload(f, folder, public_id, os.path.basename(relative))
+
+    def stats(self) -> Dict:
+        """Estado de la cola de derivados"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_render_seconds": round(self._render_seconds / self._completed, 3) if self._completed else None,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._threads.shutdown(wait=wait)
+        self._uploads.shutdown(wait=wait, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,74 @@
+import os
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class JobRunner:
+    """
+    Ejecutor local de trabajos en segundo plano
+
+    Los trabajos se registran en la base de datos (tabla background_jobs) y
+    se ejecutan en un pool de hilos del propio proceso, sin broker externo.
+    Cada función de trabajo abre su propia sesión de base de datos.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="photosite360-job"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    def submit(self, job_id: int, func: Callable, *args, **kwargs) -> Future:
+        """
+        Encola un trabajo
+
+        Args:
+            job_id: Id del registro BackgroundJob (solo para logs)
+            func: Función a ejecutar en el worker
+        """
+        with self._lock:
+            self._pending += 1
+
+        def run():
+            with self._lock:
+                self._pending -= 1
+                self._running += 1
+            try:
+                result = func(*args, **kwargs)
+                with self._lock:
+                    self._completed += 1
+                return result
+            except Exception as e:
+                with self._lock:
+                    self._failed += 1
+                print(f"[JOBS] Job {job_id} failed: {e}")
+                traceback.print_exc()
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        print(f"[JOBS] Job {job_id} queued")
+        return self._executor.submit(run)
+
+    def stats(self) -> Dict:
+        """Estado del pool de trabajos"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
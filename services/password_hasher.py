@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Coste de bcrypt para los hashes nuevos; los hashes con otro coste se
+# regeneran en el siguiente login correcto (ver verify_and_update)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hilos dedicados a bcrypt (libera el GIL mientras calcula)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Operaciones en cola o en curso a partir de las cuales se rechazan nuevas
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+
+class PasswordHasherBusy(Exception):
+    """La cola de hashing está llena"""
+
+
+class PasswordHasher:
+    """
+    Hashing y verificación de contraseñas en un pool propio
+
+    bcrypt es lento a propósito (decenas de milisegundos por operación). Si
+    se ejecuta en el threadpool de FastAPI, una avalancha de logins ocupa
+    todos sus hilos y retrasa el resto de peticiones; aquí se ejecuta en un
+    ThreadPoolExecutor con su propio límite de operaciones pendientes, y las
+    peticiones que no caben se rechazan (PasswordHasherBusy) en lugar de
+    acumularse.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, rounds: int = None):
+        self.workers = max(workers or PASSWORD_HASH_WORKERS, 1)
+        self.max_pending = max(max_pending or PASSWORD_HASH_MAX_PENDING, self.workers)
+        self.rounds = rounds or BCRYPT_ROUNDS
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=self.rounds)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="photosite360-passwords"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    async def _run(self, func: Callable, *args):
+        """Ejecuta `func` en el pool, con control de la cola y métricas"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy(f"{self._pending} password operations pending")
+            self._pending += 1
+        queued_at = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                waited = started - queued_at
+                self._wait_seconds += waited
+                self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._completed += 1
+                    self._hash_seconds += time.perf_counter() - started
+
+        try:
+            future = self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """Hash bcrypt de una contraseña nueva"""
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifica una contraseña y, si su hash usa otros parámetros, lo regenera
+
+        Returns:
+            (válida, hash nuevo o None si no hay que actualizar el guardado)
+
+        Raises:
+            PasswordHasherBusy: cola llena
+        """
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        if new_hash:
+            with self._lock:
+                self._rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> Dict:
+        """Estado del pool y tiempos medios de espera y cálculo"""
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.workers,
+                "bcrypt_rounds": self.rounds,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": self._running,
+                "completed": completed,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "avg_wait_ms": round(self._wait_seconds / completed * 1000, 1) if completed else None,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 1),
+                "avg_hash_ms": round(self._hash_seconds / completed * 1000, 1) if completed else None,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
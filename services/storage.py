@@ -0,0 +1,201 @@
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+
+import cloudinary
+import cloudinary.uploader
+
+# Backend de almacenamiento: 'cloudinary' (por defecto), 'local' o 's3'
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary").strip().lower()
+
+# Backend local: directorio de ficheros y ruta pública con la que se sirven
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "./media")
+STORAGE_LOCAL_URL = os.getenv("STORAGE_LOCAL_URL", "/media")
+
+# Tamaño de bloque de las subidas en streaming (Cloudinary exige >= 5 MB)
+UPLOAD_CHUNK_SIZE = max(int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024))), 5 * 1024 * 1024)
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class StorageBackend(ABC):
+    """
+    Interfaz común de los backends de almacenamiento de imágenes
+
+    Las implementaciones son síncronas y leen el fichero por bloques; se
+    ejecutan en el pool de subidas de CloudinaryService.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def upload(self, fileobj: BinaryIO, folder: str, public_id: str, filename: Optional[str] = None) -> Optional[str]:
+        """
+        Guarda el contenido de `fileobj`
+
+        Args:
+            fileobj: Fichero binario posicionado al inicio
+            folder: Carpeta lógica (p.ej. photosite360/photos/project_1)
+            public_id: Identificador del fichero dentro de la carpeta
+            filename: Nombre original (para la extensión y el tipo MIME)
+
+        Returns:
+            URL pública o None si la subida falla
+        """
+
+    @abstractmethod
+    def delete(self, public_id: str) -> bool:
+        """Borra un fichero por su identificador completo (carpeta/public_id)"""
+
+
+class CloudinaryStorage(StorageBackend):
+    name = "cloudinary"
+
+    def upload(self, fileobj, folder, public_id, filename=None):
+        try:
+            response = cloudinary.uploader.upload_large(
+                fileobj,
+                folder=folder,
+                public_id=public_id,
+                resource_type="image",
+                chunk_size=UPLOAD_CHUNK_SIZE
+            )
+            return response.get("secure_url") if response else None
+        except Exception as e:
+            print(f"Error uploading to Cloudinary: {e}")
+            return None
+
+    def delete(self, public_id):
+        try:
+            result = cloudinary.uploader.destroy(public_id)
+            return result.get("result") == "ok"
+        except Exception as e:
+            print(f"Error deleting from Cloudinary: {e}")
+            return False
+
+
+class LocalStorage(StorageBackend):
+    """
+    Ficheros en disco local, servidos por la propia API en STORAGE_LOCAL_URL
+
+    Pensado para instalaciones on-premise y para medir subidas y descargas
+    sin depender de un CDN externo.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = None, base_url: str = None):
+        self.root = os.path.abspath(root or STORAGE_LOCAL_DIR)
+        self.base_url = (base_url or STORAGE_LOCAL_URL).rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def relative_path(self, folder: str, public_id: str, filename: Optional[str] = None) -> str:
+        """Ruta relativa (con extensión) en la que se guarda un fichero"""
+        extension = os.path.splitext(filename or "")[1].lower()
+        name = _SAFE_NAME.sub("_", public_id)
+        if extension and not name.lower().endswith(extension):
+            name += extension
+        parts = [_SAFE_NAME.sub("_", part) for part in folder.split("/") if part and part not in (".", "..")]
+        return "/".join(parts + [name])
+
+    def upload(self, fileobj, folder, public_id, filename=None):
+        relative = self.relative_path(folder, public_id, filename)
+        path = os.path.join(self.root, *relative.split("/"))
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as out:
+                shutil.copyfileobj(fileobj, out, 1024 * 1024)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing to local storage: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        return f"{self.base_url}/{relative}"
+
+    def delete(self, public_id):
+        relative = public_id[len(self.base_url) + 1:] if public_id.startswith(self.base_url + "/") else public_id
+        path = os.path.abspath(os.path.join(self.root, *relative.split("/")))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return False
+        os.remove(path)
+        return True
+
+
+class S3Storage(StorageBackend):
+    """
+    Almacenamiento compatible con S3 (AWS, MinIO, R2...)
+
+    Requiere boto3. Configuración: S3_BUCKET, S3_ENDPOINT_URL, S3_REGION,
+    S3_PUBLIC_URL (URL base pública del bucket) y las credenciales
+    estándar de AWS en el entorno.
+    """
+
+    name = "s3"
+
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = os.getenv("S3_BUCKET")
+        if not self.bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+
+        endpoint_url = os.getenv("S3_ENDPOINT_URL") or None
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=os.getenv("S3_REGION") or None)
+        self.public_url = (
+            os.getenv("S3_PUBLIC_URL")
+            or (f"{endpoint_url.rstrip('/')}/{self.bucket}" if endpoint_url else f"https://{self.bucket}.s3.amazonaws.com")
+        ).rstrip("/")
+
+    def upload(self, fileobj, folder, public_id, filename=None):
+        extension = os.path.splitext(filename or "")[1].lower()
+        key = f"{folder.strip('/')}/{public_id}"
+        if extension and not key.lower().endswith(extension):
+            key += extension
+        content_type = mimetypes.guess_type(filename or key)[0] or "application/octet-stream"
+        try:
+            # upload_fileobj hace subida multiparte leyendo por bloques
+            self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs={"ContentType": content_type})
+        except Exception as e:
+            print(f"Error uploading to S3: {e}")
+            return None
+        return f"{self.public_url}/{key}"
+
+    def delete(self, public_id):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=public_id)
+            return True
+        except Exception as e:
+            print(f"Error deleting from S3: {e}")
+            return False
+
+
+_BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_storage_backend() -> StorageBackend:
+    """Backend configurado en STORAGE_BACKEND (instancia única del proceso)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = _BACKENDS.get(STORAGE_BACKEND)
+                if backend_class is None:
+                    raise RuntimeError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (use: {', '.join(_BACKENDS)})")
+                _backend = backend_class()
+                print(f"[STORAGE] Backend de almacenamiento: {_backend.name}")
+    return _backend
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional
+
+# Directorio de la caché de teselas vectoriales (se puede borrar en cualquier momento)
+MVT_CACHE_DIR = os.getenv(
+    "MVT_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "photosite360-tiles")
+)
+
+
+class TileCache:
+    """
+    Caché en disco de teselas vectoriales por proyecto y revisión
+
+    Las teselas se guardan en {root}/{proyecto}/{revisión}/{variante}/{z}/{x}/{y}.mvt,
+    donde la variante identifica los filtros de la petición. La revisión es
+    Project.objects_revision: cuando cambia, las teselas antiguas dejan de
+    usarse y se borran al escribir la primera de la revisión nueva.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = os.path.abspath(root or MVT_CACHE_DIR)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._purged = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, project_id: int, revision: int, variant: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, str(project_id), str(revision), variant, str(z), str(x), f"{y}.mvt")
+
+    def get(self, project_id: int, revision: int, variant: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """Contenido de la tesela o None si no está en caché"""
+        try:
+            with open(self._path(project_id, revision, variant, z, x, y), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._hits += 1
+        return data
+
+    def put(self, project_id: int, revision: int, variant: str, z: int, x: int, y: int, data: bytes):
+        """Guarda una tesela (escritura atómica) y borra las revisiones anteriores"""
+        path = self._path(project_id, revision, variant, z, x, y)
+        project_dir = os.path.join(self.root, str(project_id))
+        new_revision = not os.path.isdir(os.path.join(project_dir, str(revision)))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._writes += 1
+
+        if new_revision:
+            self.purge(project_id, keep_revision=revision)
+
+    def purge(self, project_id: int, keep_revision: Optional[int] = None) -> int:
+        """Borra las teselas de un proyecto (salvo las de `keep_revision`)"""
+        project_dir = os.path.join(self.root, str(project_id))
+        if not os.path.isdir(project_dir):
+            return 0
+
+        removed = 0
+        for name in os.listdir(project_dir):
+            if keep_revision is not None and name == str(keep_revision):
+                continue
+            shutil.rmtree(os.path.join(project_dir, name), ignore_errors=True)
+            removed += 1
+        with self._lock:
+            self._purged += removed
+        if removed:
+            print(f"[TILES] Proyecto {project_id}: {removed} revisiones de teselas eliminadas")
+        return removed
+
+    def stats(self) -> Dict:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "purged_revisions": self._purged,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            }
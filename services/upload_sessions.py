@@ -0,0 +1,323 @@
+import hashlib
+import json
+import math
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import AsyncIterable, Dict, List, Optional
+
+import anyio
+
+# Directorio donde se guardan los bloques recibidos hasta completar la subida
+UPLOAD_SESSION_DIR = os.getenv(
+    "UPLOAD_SESSION_DIR",
+    os.path.join(tempfile.gettempdir(), "photosite360-uploads")
+)
+# Horas sin actividad tras las que una sesión se considera abandonada
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+# Tamaño máximo de un fichero subido por bloques
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(500 * 1024 * 1024)))
+
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 50 * 1024 * 1024
+GC_INTERVAL_SECONDS = 600
+
+_META_FILE = "session.json"
+_ASSEMBLED_FILE = "assembled.bin"
+_COPY_BUFFER = 1024 * 1024
+
+
+class UploadSessionStore:
+    """
+    Sesiones de subida reanudable guardadas en disco local
+
+    Cada sesión es un directorio con un session.json (propietario, proyecto,
+    tamaño y metadatos de la foto) y un fichero por bloque recibido. Los
+    bloques se escriben en un temporal y se renombran al terminar, así que
+    pueden llegar en paralelo, en cualquier orden y repetirse sin riesgo.
+
+    Errores:
+        LookupError: la sesión no existe o no pertenece al usuario
+        ValueError: bloque o sesión inválidos
+    """
+
+    def __init__(self, base_dir: str = None, ttl_hours: float = None):
+        self.base_dir = base_dir or UPLOAD_SESSION_DIR
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None else UPLOAD_SESSION_TTL_HOURS) * 3600
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def create(
+        self,
+        owner_id: int,
+        project_id: int,
+        filename: str,
+        total_size: int,
+        chunk_size: Optional[int] = None,
+        sha256: Optional[str] = None,
+        fields: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Abre una sesión nueva
+
+        Args:
+            owner_id: Usuario que sube el fichero
+            project_id: Proyecto destino
+            filename: Nombre original del fichero
+            total_size: Tamaño total en bytes
+            chunk_size: Tamaño de bloque pedido por el cliente
+            sha256: Hash esperado del fichero completo (opcional)
+            fields: Metadatos con los que se creará el registro final
+
+        Returns:
+            Metadatos de la sesión
+        """
+        if total_size <= 0:
+            raise ValueError("total_size must be positive")
+        if total_size > MAX_UPLOAD_SIZE:
+            raise ValueError(f"File too large (max {MAX_UPLOAD_SIZE} bytes)")
+
+        chunk_size = min(max(chunk_size or DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        self.collect_garbage(force=False)
+
+        upload_id = secrets.token_urlsafe(16)
+        now = time.time()
+        meta = {
+            "upload_id": upload_id,
+            "owner_id": owner_id,
+            "project_id": project_id,
+            "filename": os.path.basename(filename or "upload"),
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": math.ceil(total_size / chunk_size),
+            "sha256": sha256.lower() if sha256 else None,
+            "fields": fields or {},
+            "created_at": now,
+        }
+
+        os.makedirs(self._session_dir(upload_id))
+        self._write_meta(meta)
+        return meta
+
+    def get(self, upload_id: str, owner_id: int, project_id: int) -> Dict:
+        """Lee la sesión comprobando propietario y proyecto"""
+        path = os.path.join(self._session_dir(upload_id), _META_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise LookupError("Upload session not found")
+
+        if meta["owner_id"] != owner_id or meta["project_id"] != project_id:
+            raise LookupError("Upload session not found")
+        return meta
+
+    def status(self, meta: Dict) -> Dict:
+        """Bloques recibidos y pendientes de una sesión"""
+        received = self.received_chunks(meta)
+        missing = sorted(set(range(meta["total_chunks"])) - set(received))
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "total_size": meta["total_size"],
+            "chunk_size": meta["chunk_size"],
+            "total_chunks": meta["total_chunks"],
+            "received_chunks": received,
+            "missing_chunks": missing,
+            "complete": not missing,
+            "expires_at": self._touched_at(meta) + self.ttl_seconds,
+        }
+
+    def discard(self, upload_id: str):
+        """Borra la sesión y todos sus bloques"""
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Bloques
+    # ------------------------------------------------------------------
+
+    def expected_chunk_size(self, meta: Dict, index: int) -> int:
+        """Tamaño exacto que debe tener el bloque `index`"""
+        if index < 0 or index >= meta["total_chunks"]:
+            raise ValueError(f"Chunk index out of range (0..{meta['total_chunks'] - 1})")
+        if index == meta["total_chunks"] - 1:
+            return meta["total_size"] - meta["chunk_size"] * index
+        return meta["chunk_size"]
+
+    async def write_chunk(self, meta: Dict, index: int, pieces: AsyncIterable[bytes]) -> int:
+        """
+        Guarda un bloque a partir de los fragmentos del cuerpo de la petición
+
+        El bloque solo pasa a contar como recibido si su tamaño es el
+        esperado; si no, el temporal se descarta y se lanza ValueError.
+        La escritura se hace en hilos (anyio) por tramos de _COPY_BUFFER
+        para no bloquear el bucle de eventos con bloques grandes.
+
+        Returns:
+            Bytes escritos
+        """
+        expected = self.expected_chunk_size(meta, index)
+        final_path = self._chunk_path(meta["upload_id"], index)
+        tmp_path = f"{final_path}.{secrets.token_hex(4)}.tmp"
+
+        written = 0
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as f:
+                buffer = bytearray()
+                async for piece in pieces:
+                    written += len(piece)
+                    if written > expected:
+                        raise ValueError(f"Chunk {index} larger than expected ({expected} bytes)")
+                    buffer += piece
+                    if len(buffer) >= _COPY_BUFFER:
+                        await f.write(bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await f.write(bytes(buffer))
+            if written != expected:
+                raise ValueError(f"Chunk {index} has {written} bytes, expected {expected}")
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._touch(meta)
+        return written
+
+    def received_chunks(self, meta: Dict) -> List[int]:
+        """Índices de los bloques ya recibidos"""
+        received = []
+        for name in os.listdir(self._session_dir(meta["upload_id"])):
+            if name.startswith("chunk_") and name.endswith(".part"):
+                received.append(int(name[6:-5]))
+        return sorted(received)
+
+    def assemble(self, meta: Dict) -> Dict:
+        """
+        Une los bloques en un único fichero dentro de la sesión
+
+        Returns:
+            Dict con path, size y sha256 del fichero resultante
+
+        Raises:
+            ValueError: faltan bloques o el hash no coincide
+        """
+        missing = self.status(meta)["missing_chunks"]
+        if missing:
+            raise ValueError(f"Missing chunks: {missing[:20]}")
+
+        digest = hashlib.sha256()
+        size = 0
+        path = os.path.join(self._session_dir(meta["upload_id"]), _ASSEMBLED_FILE)
+        with open(path, "wb") as out:
+            for index in range(meta["total_chunks"]):
+                with open(self._chunk_path(meta["upload_id"], index), "rb") as chunk:
+                    while True:
+                        buffer = chunk.read(_COPY_BUFFER)
+                        if not buffer:
+                            break
+                        digest.update(buffer)
+                        size += len(buffer)
+                        out.write(buffer)
+
+        sha256 = digest.hexdigest()
+        if meta["sha256"] and meta["sha256"] != sha256:
+            os.remove(path)
+            raise ValueError("Checksum mismatch: upload the chunks again")
+
+        return {"path": path, "size": size, "sha256": sha256}
+
+    # ------------------------------------------------------------------
+    # Limpieza de sesiones abandonadas
+    # ------------------------------------------------------------------
+
+    def collect_garbage(self, force: bool = True) -> int:
+        """
+        Borra las sesiones sin actividad durante más de ttl_seconds
+
+        Args:
+            force: Si es False solo se ejecuta cada GC_INTERVAL_SECONDS
+
+        Returns:
+            Número de sesiones borradas
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_gc < GC_INTERVAL_SECONDS:
+                return 0
+            self._last_gc = now
+
+        removed = 0
+        for upload_id in os.listdir(self.base_dir):
+            session_dir = self._session_dir(upload_id)
+            if not os.path.isdir(session_dir):
+                continue
+            try:
+                touched = os.path.getmtime(os.path.join(session_dir, _META_FILE))
+            except OSError:
+                touched = os.path.getmtime(session_dir)
+            if now - touched > self.ttl_seconds:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                removed += 1
+
+        if removed:
+            print(f"[UPLOADS] {removed} sesiones de subida abandonadas eliminadas")
+        return removed
+
+    def stats(self) -> Dict:
+        """Sesiones abiertas y bytes ocupados en disco"""
+        sessions = 0
+        disk_bytes = 0
+        for upload_id in os.listdir(self.base_dir):
+            session_dir = self._session_dir(upload_id)
+            if not os.path.isdir(session_dir):
+                continue
+            sessions += 1
+            for name in os.listdir(session_dir):
+                try:
+                    disk_bytes += os.path.getsize(os.path.join(session_dir, name))
+                except OSError:
+                    pass
+        return {"sessions": sessions, "disk_bytes": disk_bytes, "ttl_hours": self.ttl_seconds / 3600}
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _session_dir(self, upload_id: str) -> str:
+        if not upload_id or os.sep in upload_id or upload_id.startswith("."):
+            raise LookupError("Upload session not found")
+        return os.path.join(self.base_dir, upload_id)
+
+    def _chunk_path(self, upload_id: str, index: int) -> str:
+        return os.path.join(self._session_dir(upload_id), f"chunk_{index:06d}.part")
+
+    def _write_meta(self, meta: Dict):
+        path = os.path.join(self._session_dir(meta["upload_id"]), _META_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _touch(self, meta: Dict):
+        """La actividad de la sesión se guarda como mtime de session.json"""
+        try:
+            os.utime(os.path.join(self._session_dir(meta["upload_id"]), _META_FILE))
+        except OSError:
+            pass
+
+    def _touched_at(self, meta: Dict) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self._session_dir(meta["upload_id"]), _META_FILE))
+        except OSError:
+            return meta["created_at"]
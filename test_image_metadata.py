@@ -0,0 +1,185 @@
+"""
+Pruebas de la lectura de metadatos GPS/GPano (utils/image_metadata.py)
+
+Los JPEG de prueba se generan con Pillow; el XMP se inserta como segmento
+APP1 justo después del SOI, igual que lo escriben las cámaras 360.
+"""
+
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from utils.image_metadata import read_image_metadata
+
+_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+
+
+def make_jpeg(gps=None, endian="<", xmp=None) -> bytes:
+    """JPEG 16x8 con el bloque GPS indicado (etiquetas TIFF) y XMP opcional"""
+    output = io.BytesIO()
+    options = {}
+    if gps is not None:
+        exif = Image.Exif()
+        exif.endian = endian
+        exif[0x8825] = gps
+        options["exif"] = exif
+    Image.new("RGB", (16, 8), (40, 80, 120)).save(output, "JPEG", **options)
+    data = output.getvalue()
+
+    if xmp is not None:
+        payload = _XMP_HEADER + xmp.encode("utf-8")
+        segment = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+        data = data[:2] + segment + data[2:]
+    return data
+
+
+def read(data: bytes):
+    fileobj = io.BytesIO(data)
+    metadata = read_image_metadata(fileobj)
+    assert fileobj.tell() == 0
+    return metadata
+
+
+def test_exif_little_endian_north_east():
+    metadata = read(make_jpeg({
+        1: "N", 2: (40.0, 25.0, 0.6),
+        3: "E", 4: (3.0, 42.0, 13.68),
+        5: b"\x00", 6: 654.5,
+        16: "T", 17: 91.25,
+    }, endian="<"))
+
+    assert metadata == {
+        "geo_latitude": pytest.approx(40.41683333),
+        "geo_longitude": pytest.approx(3.7038),
+        "geo_altitude": 654.5,
+        "heading": 91.25,
+    }
+
+
+def test_exif_big_endian_south_west_below_sea_level():
+    metadata = read(make_jpeg({
+        1: "S", 2: (33.0, 52.0, 4.0),
+        3: "W", 4: (70.0, 36.0, 36.0),
+        5: b"\x01", 6: 12.5,
+        17: 371.0,
+    }, endian=">"))
+
+    assert metadata["geo_latitude"] == pytest.approx(-(33 + 52 / 60 + 4 / 3600))
+    assert metadata["geo_longitude"] == pytest.approx(-(70 + 36 / 60 + 36 / 3600))
+    assert metadata["geo_altitude"] == -12.5
+    assert metadata["heading"] == 11.0
+
+
+def test_exif_zero_position_is_ignored():
+    metadata = read(make_jpeg({
+        1: "N", 2: (0.0, 0.0, 0.0),
+        3: "E", 4: (0.0, 0.0, 0.0),
+        6: 100.0,
+    }))
+
+    assert "geo_latitude" not in metadata
+    assert "geo_longitude" not in metadata
+    assert metadata["geo_altitude"] == 100.0
+
+
+def test_xmp_gpano_and_coordinates():
+    xmp = (
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description '
+        'GPano:ProjectionType="equirectangular" GPano:PoseHeadingDegrees="370.5">'
+        "<exif:GPSLatitude>40,25.01N</exif:GPSLatitude>"
+        "<exif:GPSLongitude>3,42,13.68W</exif:GPSLongitude>"
+        "<exif:GPSAltitude>6545/10</exif:GPSAltitude>"
+        "<exif:GPSAltitudeRef>1</exif:GPSAltitudeRef>"
+        "</rdf:Description></rdf:RDF></x:xmpmeta>"
+    )
+    metadata = read(make_jpeg(xmp=xmp))
+
+    assert metadata == {
+        "geo_latitude": pytest.approx(40 + 25.01 / 60),
+        "geo_longitude": pytest.approx(-(3 + 42 / 60 + 13.68 / 3600)),
+        "geo_altitude": -654.5,
+        "heading": pytest.approx(10.5),
+        "projection_type": "equirectangular",
+    }
+
+
+def test_exif_position_and_xmp_heading_take_priority():
+    xmp = '<rdf:Description GPano:PoseHeadingDegrees="45" exif:GPSLatitude="10,0N" exif:GPSLongitude="20,0E"/>'
+    metadata = read(make_jpeg({
+        1: "N", 2: (40.0, 0.0, 0.0),
+        3: "W", 4: (3.0, 0.0, 0.0),
+        17: 300.0,
+    }, xmp=xmp))
+
+    assert metadata["geo_latitude"] == 40.0
+    assert metadata["geo_longitude"] == -3.0
+    assert metadata["heading"] == 45.0
+
+
+def test_without_metadata():
+    assert read(make_jpeg()) == {}
+
+
+def test_truncated_or_corrupt_headers_return_empty():
+    data = make_jpeg({1: "N", 2: (40.0, 25.0, 0.6), 3: "E", 4: (3.0, 42.0, 13.68)})
+    exif_at = data.index(b"Exif\x00\x00")
+
+    # Fichero cortado dentro del segmento EXIF
+    assert read(data[:exif_at + 20]) == {}
+    # Orden de bytes desconocido
+    corrupt = bytearray(data)
+    corrupt[exif_at + 6:exif_at + 8] = b"XX"
+    assert read(bytes(corrupt)) == {}
+    # Offset del IFD0 fuera del bloque
+    corrupt = bytearray(data)
+    corrupt[exif_at + 10:exif_at + 14] = struct.pack("<I", 0xFFFFFF)
+    assert read(bytes(corrupt)) == {}
+    # Longitud de segmento imposible
+    assert read(b"\xff\xd8\xff\xe1\x00\x01") == {}
+    # No es un JPEG
+    png = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(png, "PNG")
+    assert read(png.getvalue()) == {}
+    assert read(b"") == {}
+
+
+def make_tiff_gps(entries, order="<") -> bytes:
+    """Cabecera TIFF mínima con un IFD GPS de entradas (etiqueta, tipo, cuenta, datos)"""
+    gps_offset = 8 + 2 + 12 + 4
+    data_offset = gps_offset + 2 + 12 * len(entries) + 4
+    ifd0 = struct.pack(order + "H", 1) + struct.pack(order + "HHII", 0x8825, 4, 1, gps_offset) + b"\x00" * 4
+
+    gps, extra = struct.pack(order + "H", len(entries)), b""
+    for tag, value_type, count, data in entries:
+        if len(data) <= 4:
+            gps += struct.pack(order + "HHI", tag, value_type, count) + data.ljust(4, b"\x00")
+        else:
+            gps += struct.pack(order + "HHII", tag, value_type, count, data_offset + len(extra))
+            extra += data
+    gps += b"\x00" * 4
+    header = (b"II" if order == "<" else b"MM") + struct.pack(order + "HI", 42, 8)
+    return header + ifd0 + gps + extra
+
+
+def test_exif_refs_stored_as_byte_or_undefined():
+    def rationals(*values):
+        return b"".join(struct.pack("<II", int(v * 100), 100) for v in values)
+
+    tiff = make_tiff_gps([
+        (1, 7, 2, b"S\x00"),
+        (2, 5, 3, rationals(33, 52, 4)),
+        (3, 1, 1, b"W"),
+        (4, 5, 3, rationals(70, 36, 36)),
+        (5, 1, 1, b"\x01"),
+        (6, 5, 1, rationals(12.5)),
+    ])
+    payload = b"Exif\x00\x00" + tiff
+    segment = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+    data = make_jpeg()
+    metadata = read(data[:2] + segment + data[2:])
+
+    assert metadata["geo_latitude"] == pytest.approx(-(33 + 52 / 60 + 4 / 3600))
+    assert metadata["geo_longitude"] == pytest.approx(-(70 + 36 / 60 + 36 / 3600))
+    assert metadata["geo_altitude"] == -12.5
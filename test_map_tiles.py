@@ -0,0 +1,146 @@
+"""
+Pruebas de la revalidación de las teselas vectoriales del proyecto
+
+Se levanta la aplicación con una base de datos SQLite temporal y se
+comprueba que editar un atributo publicado en las teselas cambia el ETag
+y el contenido de la tesela (no solo mover o reclasificar el objeto).
+"""
+
+import importlib
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+from test_mvt import decode_tile
+
+ORIGIN_LAT, ORIGIN_LNG = 40.4461, -3.7035
+ZOOM = 15
+
+
+def tile_of(lat: float, lng: float, z: int):
+    n = 2 ** z
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+@pytest.fixture(scope="module")
+def app_env(tmp_path_factory):
+    root = tmp_path_factory.mktemp("photosite360")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{root}/test.db")
+        monkeypatch.setenv("STORAGE_BACKEND", "local")
+        monkeypatch.setenv("STORAGE_LOCAL_DIR", str(root / "media"))
+        monkeypatch.setenv("UPLOAD_SESSION_DIR", str(root / "uploads"))
+        monkeypatch.setenv("DERIVATIVES_DIR", str(root / "derivatives"))
+        monkeypatch.setenv("MVT_CACHE_DIR", str(root / "tiles"))
+        main = importlib.import_module("main")
+        if str(main.engine.url) != f"sqlite:///{root}/test.db":
+            pytest.skip("main ya estaba importado con otra base de datos")
+
+        with TestClient(main.app) as client:
+            db = main.SessionLocal()
+            try:
+                user = main.User(email="tiles@example.com", username="tiles", full_name="Tiles", hashed_password="x")
+                db.add(user)
+                db.commit()
+                project = main.Project(
+                    name="Teselas", owner_id=user.id,
+                    map_origin_lat=ORIGIN_LAT, map_origin_lng=ORIGIN_LNG, map_rotation=0
+                )
+                db.add(project)
+                db.commit()
+                utm = main.get_project_frame(project).local_to_utm(0, 0)
+                incident = main.Incident(
+                    title="Fisura", project_id=project.id, severity="alta", status="pendiente",
+                    utm_easting=utm["utm_easting"], utm_northing=utm["utm_northing"]
+                )
+                photo = main.Photo(
+                    title="360", url="/media/360.jpg", project_id=project.id,
+                    utm_easting=utm["utm_easting"], utm_northing=utm["utm_northing"]
+                )
+                db.add_all([incident, photo])
+                db.commit()
+                ids = {"project": project.id, "incident": incident.id, "photo": photo.id}
+            finally:
+                db.close()
+
+            client.headers["Authorization"] = "Bearer " + main.create_access_token({"sub": "tiles@example.com"})
+            yield main, client, ids
+
+
+def get_tile(client, project_id, **params):
+    x, y = tile_of(ORIGIN_LAT, ORIGIN_LNG, ZOOM)
+    return client.get(
+        f"/api/projects/{project_id}/tiles/{ZOOM}/{x}/{y}.mvt",
+        params={"layers": "incidents", **params}
+    )
+
+
+def incident_features(response):
+    if response.status_code == 204:
+        return []
+    assert response.status_code == 200
+    return decode_tile(response.content)["incidents"]["features"]
+
+
+def test_tile_columns_cover_layer_properties(app_env):
+    main, _, _ = app_env
+    tracked = set(main.MAP_TRACKED_COLUMNS + main.MAP_TILE_COLUMNS)
+    for properties in main.MVT_LAYER_PROPERTIES.values():
+        assert set(properties) <= tracked
+
+
+def test_status_change_invalidates_filtered_tile(app_env):
+    _, client, ids = app_env
+    project_id, incident_id = ids["project"], ids["incident"]
+
+    pending = get_tile(client, project_id, status="pendiente")
+    assert [f["id"] for f in incident_features(pending)] == [incident_id]
+    etag = pending.headers["etag"]
+    assert get_tile(client, project_id, status="pendiente").headers["etag"] == etag
+
+    response = client.put(f"/api/projects/{project_id}/incidents/{incident_id}", params={"status": "resuelta"})
+    assert response.status_code == 200
+
+    revalidated = client.get(pending.request.url, headers={"If-None-Match": etag})
+    assert revalidated.status_code != 304
+    assert incident_features(revalidated) == []
+
+    resolved = get_tile(client, project_id, status="resuelta")
+    feature, = incident_features(resolved)
+    assert feature["properties"]["status"] == "resuelta"
+
+
+def test_title_change_updates_tile_properties(app_env):
+    _, client, ids = app_env
+    project_id, incident_id = ids["project"], ids["incident"]
+
+    before = get_tile(client, project_id)
+    response = client.put(f"/api/projects/{project_id}/incidents/{incident_id}", params={"title": "Fisura sellada"})
+    assert response.status_code == 200
+    after = get_tile(client, project_id)
+
+    assert after.headers["etag"] != before.headers["etag"]
+    feature, = incident_features(after)
+    assert feature["properties"]["title"] == "Fisura sellada"
+
+
+def test_saved_derivatives_bump_revision(app_env):
+    main, _, ids = app_env
+    db = main.SessionLocal()
+    try:
+        revision = db.get(main.Project, ids["project"]).objects_revision
+    finally:
+        db.close()
+
+    main.save_derivatives(main.Photo, ids["photo"])({
+        "thumbnail_url": "/media/thumb.jpg", "preview_url": "/media/preview.jpg"
+    })
+
+    db = main.SessionLocal()
+    try:
+        assert db.get(main.Project, ids["project"]).objects_revision == revision + 1
+    finally:
+        db.close()
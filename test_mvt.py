@@ -0,0 +1,229 @@
+"""
+Pruebas del codificador de teselas vectoriales (utils/mvt.py)
+
+Las teselas se decodifican con un lector protobuf mínimo (sin dependencias)
+y, si está instalado, también con mapbox_vector_tile.
+"""
+
+import math
+import struct
+
+import pytest
+
+from utils.mvt import (
+    DEFAULT_EXTENT,
+    MERCATOR_HALF_WORLD,
+    encode_layer,
+    encode_tile,
+    mercator_to_geo,
+    tile_bounds,
+)
+
+
+# ----------------------------------------------------------------------------
+# Decodificador mínimo de MVT 2.1
+# ----------------------------------------------------------------------------
+
+def _read_varint(data: bytes, pos: int):
+    result, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _fields(data: bytes):
+    """(campo, tipo de cable, valor) de un mensaje protobuf"""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        else:
+            raise ValueError(f"Tipo de cable no soportado: {wire_type}")
+        yield field, wire_type, value
+
+
+def _packed(data: bytes):
+    pos, values = 0, []
+    while pos < len(data):
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _decode_value(data: bytes):
+    for field, _, value in _fields(data):
+        if field == 1:
+            return value.decode("utf-8")
+        if field == 3:
+            return struct.unpack("<d", value)[0]
+        if field == 5:
+            return value
+        if field == 6:
+            return _unzigzag(value)
+        if field == 7:
+            return bool(value)
+    raise ValueError("Value vacío")
+
+
+def _decode_points(geometry):
+    points, pos, x, y = [], 0, 0, 0
+    while pos < len(geometry):
+        command, count = geometry[pos] & 0x7, geometry[pos] >> 3
+        assert command == 1, "solo se esperan MoveTo"
+        pos += 1
+        for _ in range(count):
+            x += _unzigzag(geometry[pos])
+            y += _unzigzag(geometry[pos + 1])
+            points.append((x, y))
+            pos += 2
+    return points
+
+
+def decode_tile(data: bytes):
+    """Capas de la tesela con sus tablas de claves y valores sin resolver"""
+    layers = {}
+    for field, _, layer_data in _fields(data):
+        assert field == 3
+        layer = {"keys": [], "values": [], "features": []}
+        for layer_field, _, value in _fields(layer_data):
+            if layer_field == 15:
+                layer["version"] = value
+            elif layer_field == 1:
+                layer["name"] = value.decode("utf-8")
+            elif layer_field == 2:
+                feature = {"id": None, "tags": []}
+                for feature_field, _, feature_value in _fields(value):
+                    if feature_field == 1:
+                        feature["id"] = feature_value
+                    elif feature_field == 2:
+                        feature["tags"] = _packed(feature_value)
+                    elif feature_field == 3:
+                        feature["type"] = feature_value
+                    elif feature_field == 4:
+                        feature["points"] = _decode_points(_packed(feature_value))
+                layer["features"].append(feature)
+            elif layer_field == 3:
+                layer["keys"].append(value.decode("utf-8"))
+            elif layer_field == 4:
+                layer["values"].append(_decode_value(value))
+            elif layer_field == 5:
+                layer["extent"] = value
+        for feature in layer["features"]:
+            tags = feature["tags"]
+            feature["properties"] = {
+                layer["keys"][tags[i]]: layer["values"][tags[i + 1]] for i in range(0, len(tags), 2)
+            }
+        layers[layer["name"]] = layer
+    return layers
+
+
+# ----------------------------------------------------------------------------
+# Pruebas
+# ----------------------------------------------------------------------------
+
+def test_round_trip_property_types():
+    properties = {
+        "count": 7,
+        "negative": -3,
+        "big": 2 ** 40,
+        "ratio": 0.25,
+        "visible": True,
+        "hidden": False,
+        "title": "Pórtico 3 – eje B",
+        "missing": None,
+    }
+    tile = encode_tile([encode_layer("photos", [(42, 100, 200, properties)])])
+    layer = decode_tile(tile)["photos"]
+
+    assert layer["version"] == 2
+    assert layer["extent"] == DEFAULT_EXTENT
+    feature, = layer["features"]
+    assert feature["id"] == 42
+    assert feature["type"] == 1
+    assert feature["points"] == [(100, 200)]
+
+    expected = {key: value for key, value in properties.items() if value is not None}
+    assert feature["properties"] == expected
+    for key, value in expected.items():
+        assert type(feature["properties"][key]) is type(value)
+
+
+def test_negative_coordinates_in_buffer():
+    features = [
+        (1, -64, -10, {}),
+        (2, DEFAULT_EXTENT + 64, 5, {}),
+        (3, 0, DEFAULT_EXTENT + 1, {}),
+        (None, -1, -1, {}),
+    ]
+    layer = decode_tile(encode_tile([encode_layer("objects", features)]))["objects"]
+
+    assert [f["points"][0] for f in layer["features"]] == [(x, y) for _, x, y, _ in features]
+    assert [f["id"] for f in layer["features"]] == [1, 2, 3, None]
+
+
+def test_keys_and_values_are_deduplicated():
+    features = [
+        (1, 0, 0, {"type": "photo", "level": 1, "flag": True}),
+        (2, 1, 1, {"type": "photo", "level": 1, "flag": True}),
+        (3, 2, 2, {"type": "incident", "level": 2, "flag": 1}),
+    ]
+    layer = decode_tile(encode_tile([encode_layer("mixed", features)]))["mixed"]
+
+    assert layer["keys"] == ["type", "level", "flag"]
+    # True y 1 son valores distintos (bool frente a entero)
+    assert len(layer["values"]) == 5
+    assert layer["features"][0]["tags"] == layer["features"][1]["tags"]
+    assert [f["properties"] for f in layer["features"]] == [props for *_, props in features]
+    assert layer["features"][2]["properties"]["flag"] is not True
+
+
+def test_empty_layers_are_skipped():
+    assert encode_layer("empty", []) == b""
+    tile = encode_tile([encode_layer("empty", []), encode_layer("photos", [(1, 1, 1, {})])])
+    assert list(decode_tile(tile)) == ["photos"]
+    assert encode_tile([]) == b""
+
+
+def test_tile_bounds_and_mercator_to_geo():
+    assert tile_bounds(0, 0, 0) == pytest.approx(
+        (-MERCATOR_HALF_WORLD, -MERCATOR_HALF_WORLD, MERCATOR_HALF_WORLD, MERCATOR_HALF_WORLD)
+    )
+    # Tesela 1/1/0: cuadrante noreste
+    assert tile_bounds(1, 1, 0) == pytest.approx((0, 0, MERCATOR_HALF_WORLD, MERCATOR_HALF_WORLD))
+
+    assert mercator_to_geo(0, 0) == pytest.approx((0, 0))
+    longitude, latitude = mercator_to_geo(MERCATOR_HALF_WORLD, MERCATOR_HALF_WORLD)
+    assert longitude == pytest.approx(180)
+    assert latitude == pytest.approx(math.degrees(math.atan(math.sinh(math.pi))))
+
+
+def test_matches_mapbox_vector_tile_decoder():
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+    features = [
+        (1, -20, 4100, {"name": "a", "value": 1.5, "n": -2}),
+        (2, 300, 40, {"name": "a", "ok": True}),
+    ]
+    decoded = mapbox_vector_tile.decode(encode_tile([encode_layer("photos", features)]))["photos"]
+
+    assert decoded["extent"] == DEFAULT_EXTENT
+    assert [f["id"] for f in decoded["features"]] == [1, 2]
+    assert [f["properties"] for f in decoded["features"]] == [props for *_, props in features]
+    # mapbox_vector_tile devuelve y hacia arriba por defecto
+    assert [f["geometry"]["coordinates"] for f in decoded["features"]] == [
+        [x, DEFAULT_EXTENT - y] for _, x, y, _ in features
+    ]
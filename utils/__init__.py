@@ -1,3 +1,10 @@
-from .coordinate_transforms import CoordinateTransformer
+from .coordinate_transforms import CoordinateTransformer, get_coordinate_transformer
+from .transformer_registry import TransformerRegistry, get_transformer, get_transformer_registry
 
-__all__ = ['CoordinateTransformer']
+__all__ = [
+    'CoordinateTransformer',
+    'get_coordinate_transformer',
+    'TransformerRegistry',
+    'get_transformer',
+    'get_transformer_registry',
+]
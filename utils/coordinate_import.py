@@ -0,0 +1,118 @@
+"""
+Lectura por bloques de ficheros de coordenadas (CSV/TXT/Excel)
+
+Los ficheros se leen directamente del fichero temporal de la subida, en
+bloques de filas, para que la memoria usada no dependa del tamaño del
+fichero.
+"""
+
+from typing import BinaryIO, Dict, Iterator, Optional
+
+import pandas as pd
+
+# Mapeo flexible de nombres de columnas
+COLUMN_MAPPINGS = {
+    'nombre': ['nombre_imagen', 'nombre', 'imagen', 'filename', 'file', 'name', 'photo'],
+    'x': ['x', 'easting', 'longitude', 'lon', 'lng', 'project_x'],
+    'y': ['y', 'northing', 'latitude', 'lat', 'project_y'],
+    'z': ['z', 'altura', 'elevation', 'altitud', 'height', 'project_z', 'cota'],
+    'tipo': ['tipo', 'type', 'object_type', 'categoria']
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def detect_separator(first_line: str) -> str:
+    """Detecta el separador a partir de la cabecera (; , o tabulador)"""
+    if ';' in first_line:
+        return ';'
+    if ',' in first_line:
+        return ','
+    return '\t'
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza nombres de columnas (quitar espacios, minúsculas)"""
+    df.columns = [str(column).strip().lower() for column in df.columns]
+    return df
+
+
+def find_columns(columns) -> Dict[str, Optional[str]]:
+    """Encuentra las columnas reales para cada campo de COLUMN_MAPPINGS"""
+    found = {}
+    for field, possible_names in COLUMN_MAPPINGS.items():
+        found[field] = next((column for column in columns if column in possible_names), None)
+    return found
+
+
+def iter_coordinate_chunks(
+    fileobj: BinaryIO,
+    filename: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Recorre el fichero en DataFrames de hasta `chunk_size` filas
+
+    El índice de cada bloque continúa la numeración del anterior, de modo
+    que `índice + 2` es la fila del fichero (cabecera = fila 1).
+
+    Raises:
+        ValueError: si la extensión no está soportada
+    """
+    filename = filename.lower()
+    fileobj.seek(0)
+
+    if filename.endswith('.csv') or filename.endswith('.txt'):
+        first_line = fileobj.readline().decode('utf-8-sig', errors='replace')  # utf-8-sig ignora BOM
+        fileobj.seek(0)
+        reader = pd.read_csv(
+            fileobj,
+            sep=detect_separator(first_line),
+            encoding='utf-8-sig',
+            chunksize=chunk_size
+        )
+        for chunk in reader:
+            yield normalize_columns(chunk)
+
+    elif filename.endswith('.xlsx'):
+        yield from _iter_xlsx_chunks(fileobj, chunk_size)
+
+    elif filename.endswith('.xls'):
+        # El formato binario antiguo no permite lectura incremental
+        yield normalize_columns(pd.read_excel(fileobj))
+
+    else:
+        raise ValueError("Formato de archivo no soportado. Use CSV, TXT o Excel")
+
+
+def _iter_xlsx_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lee la primera hoja de un .xlsx en modo streaming (openpyxl read_only)"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = [str(column) if column is not None else '' for column in header]
+        width = len(columns)
+        start = 0
+        batch = []
+        for row in rows:
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) >= chunk_size:
+                yield _xlsx_frame(batch, columns, start)
+                start += len(batch)
+                batch = []
+        if batch:
+            yield _xlsx_frame(batch, columns, start)
+    finally:
+        workbook.close()
+
+
+def _xlsx_frame(batch, columns, start: int) -> pd.DataFrame:
+    df = pd.DataFrame(batch, columns=columns)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return normalize_columns(df)
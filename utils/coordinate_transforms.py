@@ -8,25 +8,61 @@ Sistemas soportados:
 """
 
 import math
-from typing import Dict, Tuple, Optional
-from pyproj import Transformer, CRS
+import threading
+from typing import Dict, Tuple, Optional, Sequence, Union
+import numpy as np
+
+from .cache import LRUCache
+from .transformer_registry import CRSLike, get_transformer
+
+# Campos de coordenadas que maneja el motor por lotes
+BATCH_FIELDS = (
+    'project_x', 'project_y', 'project_z',
+    'utm_easting', 'utm_northing', 'utm_zone',
+    'geo_latitude', 'geo_longitude',
+)
+
+# Zonas UTM soportadas (España)
+SPAIN_UTM_ZONES = (28, 29, 30, 31)
+DEFAULT_UTM_ZONE = 30
 
 
 class CoordinateTransformer:
     """Transforma coordenadas entre diferentes sistemas"""
 
     def __init__(self):
-        # Transformadores pre-configurados para España (zonas UTM 28-31)
+        # Transformadores para España (zonas UTM 28-31), tomados del registro
+        # compartido del proceso: solo se construyen la primera vez
         self.transformers = {}
 
         # WGS84 (EPSG:4326) a UTM ETRS89 para zonas de España
-        for zone in range(28, 32):  # Zonas 28N, 29N, 30N, 31N
+        for zone in SPAIN_UTM_ZONES:  # Zonas 28N, 29N, 30N, 31N
             utm_epsg = 25800 + zone  # EPSG:25828, 25829, 25830, 25831
             self.transformers[zone] = {
-                'to_utm': Transformer.from_crs("EPSG:4326", f"EPSG:{utm_epsg}", always_xy=True),
-                'to_geo': Transformer.from_crs(f"EPSG:{utm_epsg}", "EPSG:4326", always_xy=True)
+                'to_utm': get_transformer(4326, utm_epsg),
+                'to_geo': get_transformer(utm_epsg, 4326)
             }
 
+    def transform(
+        self,
+        x: Union[float, Sequence, np.ndarray],
+        y: Union[float, Sequence, np.ndarray],
+        source_crs: CRSLike,
+        target_crs: CRSLike
+    ) -> Tuple:
+        """
+        Transforma puntos entre dos CRS cualesquiera (p.ej. EPSG:25830 -> EPSG:3857)
+
+        Args:
+            x, y: Coordenadas (escalares o arrays) en orden x/y (lon/lat para geográficas)
+            source_crs: CRS origen (código EPSG o identificador pyproj)
+            target_crs: CRS destino
+
+        Returns:
+            Tupla (x, y) transformada
+        """
+        return get_transformer(source_crs, target_crs).transform(x, y)
+
     def geo_to_utm(self, latitude: float, longitude: float, zone: Optional[int] = None) -> Dict:
         """
         Convierte coordenadas geográficas (WGS84) a UTM ETRS89
@@ -104,32 +140,7 @@ class CoordinateTransformer:
         Returns:
             Dict con coordenadas UTM
         """
-        # 1. Convertir origen a UTM
-        origin_utm = self.geo_to_utm(origin_lat, origin_lng)
-        origin_easting = origin_utm['utm_easting']
-        origin_northing = origin_utm['utm_northing']
-        zone = origin_utm['utm_zone']
-
-        # 2. Aplicar rotación a las coordenadas locales
-        rotation_rad = math.radians(rotation)
-        cos_r = math.cos(rotation_rad)
-        sin_r = math.sin(rotation_rad)
-
-        # Rotar punto
-        x_rotated = project_x * cos_r - project_y * sin_r
-        y_rotated = project_x * sin_r + project_y * cos_r
-
-        # 3. Sumar al origen UTM
-        final_easting = origin_easting + x_rotated
-        final_northing = origin_northing + y_rotated
-
-        return {
-            'utm_easting': round(final_easting, 3),
-            'utm_northing': round(final_northing, 3),
-            'utm_zone': zone,
-            'utm_hemisphere': 'N',
-            'utm_datum': 'ETRS89'
-        }
+        return self.project_frame(origin_lat, origin_lng, rotation).local_to_utm(project_x, project_y)
 
     def utm_to_local(
         self,
@@ -152,27 +163,19 @@ class CoordinateTransformer:
         Returns:
             Dict con project_x, project_y
         """
-        # 1. Convertir origen a UTM
-        origin_utm = self.geo_to_utm(origin_lat, origin_lng)
-        origin_easting = origin_utm['utm_easting']
-        origin_northing = origin_utm['utm_northing']
+        return self.project_frame(origin_lat, origin_lng, rotation).utm_to_local(easting, northing)
 
-        # 2. Restar origen
-        delta_x = easting - origin_easting
-        delta_y = northing - origin_northing
-
-        # 3. Aplicar rotación inversa
-        rotation_rad = math.radians(-rotation)  # Rotación inversa
-        cos_r = math.cos(rotation_rad)
-        sin_r = math.sin(rotation_rad)
-
-        project_x = delta_x * cos_r - delta_y * sin_r
-        project_y = delta_x * sin_r + delta_y * cos_r
+    def project_frame(self, origin_lat: float, origin_lng: float, rotation: float = 0.0) -> 'ProjectFrame':
+        """
+        Marco local (origen UTM + matriz de rotación) para un origen y rotación
 
-        return {
-            'project_x': round(project_x, 6),
-            'project_y': round(project_y, 6)
-        }
+        Los marcos se memorizan por (origen, rotación), así que convertir
+        muchos puntos del mismo proyecto solo proyecta el origen una vez.
+        """
+        key = (origin_lat, origin_lng, rotation or 0.0)
+        return _frames_by_origin.get_or_set(
+            key, lambda: ProjectFrame(origin_lat, origin_lng, rotation, transformer=self)
+        )
 
     def _calculate_utm_zone(self, longitude: float) -> int:
         """
@@ -206,6 +209,10 @@ class CoordinateTransformer:
         """
         Transforma múltiples elementos en lote
 
+        Internamente convierte los items a columnas y delega en
+        batch_transform_arrays, de modo que cada zona UTM se procesa con una
+        única llamada a pyproj.
+
         Args:
             items: Lista de diccionarios con coordenadas
             transform_type: 'local_to_utm', 'utm_to_local', 'geo_to_utm', 'utm_to_geo'
@@ -215,57 +222,479 @@ class CoordinateTransformer:
         Returns:
             Lista de items con coordenadas transformadas
         """
+        columns = {
+            field: [item.get(field) for item in items]
+            for field in BATCH_FIELDS
+        }
+        batch = self.batch_transform_arrays(
+            columns,
+            transform_type,
+            origin_lat=origin_lat,
+            origin_lng=origin_lng,
+            rotation=rotation
+        )
+
         results = []
 
-        for item in items:
+        for index, item in enumerate(items):
             result = item.copy()
 
-            try:
-                if transform_type == 'local_to_utm' and origin_lat and origin_lng:
-                    if item.get('project_x') is not None and item.get('project_y') is not None:
-                        utm = self.local_to_utm(
-                            item['project_x'],
-                            item['project_y'],
-                            item.get('project_z', 0),
-                            origin_lat,
-                            origin_lng,
-                            rotation
-                        )
-                        result.update(utm)
-
-                elif transform_type == 'utm_to_local' and origin_lat and origin_lng:
-                    if item.get('utm_easting') is not None and item.get('utm_northing') is not None:
-                        local = self.utm_to_local(
-                            item['utm_easting'],
-                            item['utm_northing'],
-                            origin_lat,
-                            origin_lng,
-                            rotation
-                        )
-                        result.update(local)
-
-                elif transform_type == 'geo_to_utm':
-                    if item.get('geo_latitude') is not None and item.get('geo_longitude') is not None:
-                        utm = self.geo_to_utm(
-                            item['geo_latitude'],
-                            item['geo_longitude'],
-                            item.get('utm_zone')
-                        )
-                        result.update(utm)
-
-                elif transform_type == 'utm_to_geo':
-                    if item.get('utm_easting') is not None and item.get('utm_northing') is not None:
-                        zone = item.get('utm_zone', 30)
-                        geo = self.utm_to_geo(
-                            item['utm_easting'],
-                            item['utm_northing'],
-                            zone
-                        )
-                        result.update(geo)
-
-            except Exception as e:
-                result['_transform_error'] = str(e)
+            if batch['ok'][index]:
+                result.update(batch_row(batch, index))
+            elif batch['error'][index]:
+                result['_transform_error'] = batch['error_messages'].get(index, 'Transformación no válida')
 
             results.append(result)
 
         return results
+
+    def batch_transform_arrays(
+        self,
+        columns: Dict[str, Union[Sequence, np.ndarray]],
+        transform_type: str,
+        origin_lat: Optional[float] = None,
+        origin_lng: Optional[float] = None,
+        rotation: float = 0.0
+    ) -> Dict:
+        """
+        Motor vectorizado de transformación por lotes
+
+        Trabaja sobre columnas (arrays NumPy o listas) en lugar de filas. Los
+        puntos se agrupan por zona UTM y se transforma cada grupo con una sola
+        llamada a pyproj; la rotación y el desplazamiento al origen se aplican
+        como una única operación matricial.
+
+        Nunca lanza excepciones por una fila inválida: los errores se devuelven
+        en máscaras por fila para que un punto erróneo no detenga el lote.
+
+        Args:
+            columns: Dict campo -> valores (ver BATCH_FIELDS). None/NaN = sin dato
+            transform_type: 'local_to_utm', 'utm_to_local', 'geo_to_utm', 'utm_to_geo'
+            origin_lat, origin_lng: Origen del proyecto (si aplica)
+            rotation: Rotación del proyecto en grados
+
+        Returns:
+            Dict con:
+            - una columna (np.ndarray) por cada campo calculado
+            - 'fields': nombres de los campos calculados
+            - 'ok': máscara de filas transformadas
+            - 'error': máscara de filas con error
+            - 'error_messages': Dict índice -> mensaje de error
+        """
+        size = self._batch_size(columns)
+        values = {}
+        invalid = {}
+        for field in BATCH_FIELDS:
+            values[field], invalid[field] = self._to_float_array(columns.get(field), size)
+
+        result = {
+            'fields': (),
+            'ok': np.zeros(size, dtype=bool),
+            'error': np.zeros(size, dtype=bool),
+            'error_messages': {},
+        }
+
+        def fail(mask: np.ndarray, message: str):
+            for index in np.flatnonzero(mask & ~result['error']):
+                result['error_messages'][int(index)] = message
+            result['error'] |= mask
+
+        has_origin = bool(origin_lat) and bool(origin_lng)
+        if transform_type in ('local_to_utm', 'utm_to_local') and not has_origin:
+            return result
+
+        input_fields = {
+            'local_to_utm': ('project_x', 'project_y'),
+            'utm_to_local': ('utm_easting', 'utm_northing'),
+            'geo_to_utm': ('geo_latitude', 'geo_longitude'),
+            'utm_to_geo': ('utm_easting', 'utm_northing'),
+        }.get(transform_type, ())
+        for field in input_fields:
+            fail(invalid[field], f"Valor no numérico en '{field}'")
+
+        if transform_type == 'local_to_utm':
+            x, y = values['project_x'], values['project_y']
+            rows = ~np.isnan(x) & ~np.isnan(y)
+
+            frame = self.project_frame(origin_lat, origin_lng, rotation)
+            easting, northing = frame.local_to_utm_arrays(x, y)
+
+            result['fields'] = ('utm_easting', 'utm_northing', 'utm_zone', 'utm_hemisphere', 'utm_datum')
+            result['utm_easting'] = easting
+            result['utm_northing'] = northing
+            result['utm_zone'] = np.full(size, frame.utm_zone, dtype=np.int64)
+            result['utm_hemisphere'] = np.full(size, 'N', dtype=object)
+            result['utm_datum'] = np.full(size, 'ETRS89', dtype=object)
+
+        elif transform_type == 'utm_to_local':
+            easting, northing = values['utm_easting'], values['utm_northing']
+            rows = ~np.isnan(easting) & ~np.isnan(northing)
+
+            frame = self.project_frame(origin_lat, origin_lng, rotation)
+            result['fields'] = ('project_x', 'project_y')
+            result['project_x'], result['project_y'] = frame.utm_to_local_arrays(easting, northing)
+
+        elif transform_type == 'geo_to_utm':
+            latitude, longitude = values['geo_latitude'], values['geo_longitude']
+            rows = ~np.isnan(latitude) & ~np.isnan(longitude)
+
+            zones = self._calculate_utm_zones(longitude, values['utm_zone'])
+            easting = np.full(size, np.nan)
+            northing = np.full(size, np.nan)
+            for zone in np.unique(zones[rows]):
+                group = rows & (zones == zone)
+                transformer = self.transformers[int(zone)]['to_utm']
+                easting[group], northing[group] = transformer.transform(longitude[group], latitude[group])
+
+            result['fields'] = ('utm_easting', 'utm_northing', 'utm_zone', 'utm_hemisphere', 'utm_datum')
+            result['utm_easting'] = np.round(easting, 3)
+            result['utm_northing'] = np.round(northing, 3)
+            result['utm_zone'] = zones
+            result['utm_hemisphere'] = np.full(size, 'N', dtype=object)
+            result['utm_datum'] = np.full(size, 'ETRS89', dtype=object)
+
+        elif transform_type == 'utm_to_geo':
+            easting, northing = values['utm_easting'], values['utm_northing']
+            rows = ~np.isnan(easting) & ~np.isnan(northing)
+
+            zone_values = np.where(np.isnan(values['utm_zone']), DEFAULT_UTM_ZONE, values['utm_zone'])
+            bad_zone = rows & ~np.isin(zone_values, SPAIN_UTM_ZONES)
+            fail(bad_zone, "Zona UTM no válida para España. Use 28-31")
+            rows &= ~bad_zone
+
+            latitude = np.full(size, np.nan)
+            longitude = np.full(size, np.nan)
+            for zone in np.unique(zone_values[rows]):
+                group = rows & (zone_values == zone)
+                transformer = self.transformers[int(zone)]['to_geo']
+                longitude[group], latitude[group] = transformer.transform(easting[group], northing[group])
+
+            result['fields'] = ('geo_latitude', 'geo_longitude')
+            result['geo_latitude'] = np.round(latitude, 8)
+            result['geo_longitude'] = np.round(longitude, 8)
+
+        else:
+            return result
+
+        rows &= ~result['error']
+
+        # pyproj devuelve inf cuando un punto no se puede proyectar
+        for field in result['fields']:
+            column = result[field]
+            if column.dtype.kind == 'f':
+                fail(rows & ~np.isfinite(column), "Transformación fuera de rango")
+        result['ok'] = rows & ~result['error']
+
+        return result
+
+    def complete_coordinates(
+        self,
+        columns: Dict[str, Union[Sequence, np.ndarray]],
+        source: str,
+        frame: Optional['ProjectFrame'] = None
+    ) -> Dict:
+        """
+        Calcula los sistemas que faltan a partir de uno conocido, en un solo pase
+
+        - 'local' -> UTM y geográficas (requiere marco del proyecto)
+        - 'utm'   -> geográficas y locales (locales solo con marco)
+        - 'geo'   -> UTM y locales (locales solo con marco)
+
+        Con marco, la zona UTM es la del origen del proyecto para que todas
+        las coordenadas del proyecto compartan sistema; sin marco se usa la
+        zona por defecto (UTM) o la calculada por longitud (geo).
+
+        Args:
+            columns: Columnas de entrada (ver BATCH_FIELDS)
+            source: Sistema de las coordenadas conocidas
+            frame: Marco local del proyecto (None si no tiene origen)
+
+        Returns:
+            Mismo formato que batch_transform_arrays
+        """
+        size = self._batch_size(columns)
+
+        if source == 'local':
+            if frame is None:
+                return self._merge_batches(size)
+            utm = self.batch_transform_arrays(
+                columns, 'local_to_utm', frame.origin_lat, frame.origin_lng, frame.rotation
+            )
+            geo = self.batch_transform_arrays({
+                'utm_easting': utm['utm_easting'],
+                'utm_northing': utm['utm_northing'],
+                'utm_zone': utm['utm_zone'],
+            }, 'utm_to_geo')
+            return self._merge_batches(size, utm, geo)
+
+        if source == 'utm':
+            zone = frame.utm_zone if frame else DEFAULT_UTM_ZONE
+            zones = np.full(size, zone, dtype=np.int64)
+            geo = self.batch_transform_arrays({**columns, 'utm_zone': zones}, 'utm_to_geo')
+            fixed = {
+                'fields': ('utm_zone', 'utm_hemisphere', 'utm_datum'),
+                'ok': geo['ok'],
+                'error': np.zeros(size, dtype=bool),
+                'error_messages': {},
+                'utm_zone': zones,
+                'utm_hemisphere': np.full(size, 'N', dtype=object),
+                'utm_datum': np.full(size, 'ETRS89', dtype=object),
+            }
+            parts = [geo, fixed]
+            if frame is not None:
+                parts.append(self._local_batch(frame, columns['utm_easting'], columns['utm_northing'], geo['ok']))
+            return self._merge_batches(size, *parts)
+
+        if source == 'geo':
+            zones = np.full(size, frame.utm_zone if frame else np.nan)
+            utm = self.batch_transform_arrays({**columns, 'utm_zone': zones}, 'geo_to_utm')
+            parts = [utm]
+            if frame is not None:
+                parts.append(self._local_batch(frame, utm['utm_easting'], utm['utm_northing'], utm['ok']))
+            return self._merge_batches(size, *parts)
+
+        return self._merge_batches(size)
+
+    @staticmethod
+    def _local_batch(frame: 'ProjectFrame', easting, northing, ok: np.ndarray) -> Dict:
+        """Resultado parcial con las coordenadas locales de puntos UTM"""
+        easting = np.asarray(easting, dtype=np.float64)
+        northing = np.asarray(northing, dtype=np.float64)
+        project_x, project_y = frame.utm_to_local_arrays(easting, northing)
+        return {
+            'fields': ('project_x', 'project_y'),
+            'ok': ok,
+            'error': np.zeros(len(ok), dtype=bool),
+            'error_messages': {},
+            'project_x': project_x,
+            'project_y': project_y,
+        }
+
+    @staticmethod
+    def _merge_batches(size: int, *parts: Dict) -> Dict:
+        """Combina resultados parciales: una fila es válida si lo es en todos"""
+        merged = {
+            'fields': (),
+            'ok': np.ones(size, dtype=bool) if parts else np.zeros(size, dtype=bool),
+            'error': np.zeros(size, dtype=bool),
+            'error_messages': {},
+        }
+        for part in parts:
+            merged['fields'] += tuple(field for field in part['fields'] if field not in merged['fields'])
+            for field in part['fields']:
+                merged[field] = part[field]
+            merged['ok'] &= part['ok']
+            merged['error'] |= part['error']
+            for index, message in part['error_messages'].items():
+                merged['error_messages'].setdefault(index, message)
+        merged['ok'] &= ~merged['error']
+        return merged
+
+    @staticmethod
+    def _rotation_matrix(rotation: float) -> np.ndarray:
+        """Matriz de rotación 2D para un ángulo en grados"""
+        rotation_rad = math.radians(rotation)
+        cos_r = math.cos(rotation_rad)
+        sin_r = math.sin(rotation_rad)
+        return np.array([[cos_r, -sin_r], [sin_r, cos_r]])
+
+    def _calculate_utm_zones(self, longitudes: np.ndarray, zones: np.ndarray) -> np.ndarray:
+        """
+        Versión vectorizada de la selección de zona usada en geo_to_utm
+
+        Las zonas indicadas fuera de 28-31 pasan a la zona por defecto; si no
+        hay zona se calcula a partir de la longitud.
+        """
+        with np.errstate(invalid='ignore'):
+            computed = np.floor((np.nan_to_num(longitudes) + 180) / 6).astype(np.int64) + 1
+        computed = np.clip(computed, SPAIN_UTM_ZONES[0], SPAIN_UTM_ZONES[-1])
+
+        given = ~np.isnan(zones)
+        result = computed.copy()
+        given_zones = zones[given].astype(np.int64)
+        result[given] = np.where(np.isin(given_zones, SPAIN_UTM_ZONES), given_zones, DEFAULT_UTM_ZONE)
+        return result
+
+    @staticmethod
+    def _batch_size(columns: Dict) -> int:
+        """Número de filas del lote (todas las columnas deben coincidir)"""
+        sizes = {len(values) for values in columns.values() if values is not None}
+        if len(sizes) > 1:
+            raise ValueError(f"Las columnas del lote tienen longitudes distintas: {sorted(sizes)}")
+        return sizes.pop() if sizes else 0
+
+    @staticmethod
+    def _to_float_array(values, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convierte una columna a float64 (None -> NaN)
+
+        Returns:
+            (array de valores, máscara de valores no convertibles)
+        """
+        invalid = np.zeros(size, dtype=bool)
+        if values is None:
+            return np.full(size, np.nan), invalid
+
+        try:
+            return np.asarray(values, dtype=np.float64).reshape(size), invalid
+        except (TypeError, ValueError):
+            pass
+
+        array = np.full(size, np.nan)
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            try:
+                array[index] = float(value)
+            except (TypeError, ValueError):
+                invalid[index] = True
+        return array, invalid
+
+
+def batch_row(batch: Dict, index: int) -> Dict:
+    """Valores calculados de una fila de un resultado por lotes, como tipos Python"""
+    row = {}
+    for field in batch['fields']:
+        value = batch[field][index]
+        if field == 'utm_zone':
+            row[field] = int(value)
+        elif isinstance(value, str):
+            row[field] = value
+        else:
+            row[field] = float(value)
+    return row
+
+
+class ProjectFrame:
+    """
+    Marco de referencia local de un proyecto
+
+    Se construye una vez a partir del origen (lat/lng) y la rotación del
+    proyecto: guarda el origen ya proyectado a UTM y la matriz de rotación,
+    de modo que convertir un punto local <-> UTM son unas pocas operaciones.
+    """
+
+    def __init__(
+        self,
+        origin_lat: float,
+        origin_lng: float,
+        rotation: float = 0.0,
+        transformer: Optional[CoordinateTransformer] = None
+    ):
+        transformer = transformer or get_coordinate_transformer()
+        origin_utm = transformer.geo_to_utm(origin_lat, origin_lng)
+
+        self.origin_lat = origin_lat
+        self.origin_lng = origin_lng
+        self.rotation = rotation or 0.0
+        self.origin_easting = origin_utm['utm_easting']
+        self.origin_northing = origin_utm['utm_northing']
+        self.utm_zone = origin_utm['utm_zone']
+
+        rotation_rad = math.radians(self.rotation)
+        self._cos_r = math.cos(rotation_rad)
+        self._sin_r = math.sin(rotation_rad)
+        self.rotation_matrix = CoordinateTransformer._rotation_matrix(self.rotation)
+        self._origin = np.array([self.origin_easting, self.origin_northing])
+
+    @classmethod
+    def from_project(cls, project) -> Optional['ProjectFrame']:
+        """Crea el marco de un Project (None si no tiene origen definido)"""
+        if not project.map_origin_lat or not project.map_origin_lng:
+            return None
+        return cls(project.map_origin_lat, project.map_origin_lng, project.map_rotation or 0.0)
+
+    def matches(self, origin_lat: float, origin_lng: float, rotation: float) -> bool:
+        """Indica si el marco corresponde a ese origen y rotación"""
+        return (
+            self.origin_lat == origin_lat
+            and self.origin_lng == origin_lng
+            and self.rotation == (rotation or 0.0)
+        )
+
+    def local_to_utm(self, project_x: float, project_y: float) -> Dict:
+        """Convierte un punto local a UTM (mismo formato que CoordinateTransformer)"""
+        x_rotated = project_x * self._cos_r - project_y * self._sin_r
+        y_rotated = project_x * self._sin_r + project_y * self._cos_r
+
+        return {
+            'utm_easting': round(self.origin_easting + x_rotated, 3),
+            'utm_northing': round(self.origin_northing + y_rotated, 3),
+            'utm_zone': self.utm_zone,
+            'utm_hemisphere': 'N',
+            'utm_datum': 'ETRS89'
+        }
+
+    def utm_to_local(self, easting: float, northing: float) -> Dict:
+        """Convierte un punto UTM a coordenadas locales del proyecto"""
+        delta_x = easting - self.origin_easting
+        delta_y = northing - self.origin_northing
+
+        # Rotación inversa: la traspuesta de la matriz de rotación
+        return {
+            'project_x': round(delta_x * self._cos_r + delta_y * self._sin_r, 6),
+            'project_y': round(-delta_x * self._sin_r + delta_y * self._cos_r, 6)
+        }
+
+    def local_to_utm_arrays(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Versión vectorizada de local_to_utm (devuelve easting, northing)"""
+        points = np.column_stack([x, y]) @ self.rotation_matrix.T + self._origin
+        return np.round(points[:, 0], 3), np.round(points[:, 1], 3)
+
+    def utm_to_local_arrays(self, easting: np.ndarray, northing: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Versión vectorizada de utm_to_local (devuelve project_x, project_y)"""
+        points = (np.column_stack([easting, northing]) - self._origin) @ self.rotation_matrix
+        return np.round(points[:, 0], 6), np.round(points[:, 1], 6)
+
+
+# Marcos memorizados por (origen, rotación) y por proyecto
+_frames_by_origin = LRUCache(maxsize=256)
+_project_frames = LRUCache(maxsize=1024)
+
+
+def get_project_frame(project) -> Optional[ProjectFrame]:
+    """
+    Marco local cacheado de un Project
+
+    La entrada se reconstruye si el origen o la rotación del proyecto ya no
+    coinciden; además update_project_positioning la invalida explícitamente.
+    """
+    if not project.map_origin_lat or not project.map_origin_lng:
+        return None
+
+    frame = _project_frames.get(project.id)
+    if frame is None or not frame.matches(project.map_origin_lat, project.map_origin_lng, project.map_rotation):
+        frame = get_coordinate_transformer().project_frame(
+            project.map_origin_lat, project.map_origin_lng, project.map_rotation or 0.0
+        )
+        _project_frames.set(project.id, frame)
+    return frame
+
+
+def invalidate_project_frame(project_id: int):
+    """Descarta el marco cacheado de un proyecto (p.ej. al cambiar su origen)"""
+    _project_frames.pop(project_id)
+
+
+def project_frame_cache_stats() -> Dict:
+    """Contadores de la caché de marcos de proyecto"""
+    return _project_frames.stats()
+
+
+_shared_transformer: Optional[CoordinateTransformer] = None
+_shared_transformer_lock = threading.Lock()
+
+
+def get_coordinate_transformer() -> CoordinateTransformer:
+    """
+    Instancia compartida de CoordinateTransformer
+
+    Se crea la primera vez que se solicita y se reutiliza en todas las
+    peticiones; CoordinateTransformer no guarda estado por petición.
+    """
+    global _shared_transformer
+    if _shared_transformer is None:
+        with _shared_transformer_lock:
+            if _shared_transformer is None:
+                _shared_transformer = CoordinateTransformer()
+    return _shared_transformer
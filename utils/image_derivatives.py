@@ -0,0 +1,208 @@
+"""
+Generación de derivados de imagen (miniatura, vista previa y teselas 360)
+
+Las funciones de este módulo trabajan con rutas de fichero y no dependen de
+la base de datos ni del almacenamiento, para poder ejecutarse en un
+ProcessPoolExecutor.
+
+Las teselas siguen el formato multirresolución de Pannellum: seis caras de
+cubo ('f', 'r', 'b', 'l', 'u', 'd'), niveles numerados desde 1 (el más
+pequeño) y ficheros `{nivel}/{cara}{fila}_{columna}.jpg`.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+THUMBNAIL_SIZE = 400
+PREVIEW_SIZE = 2048
+TILE_SIZE = 512
+MAX_FACE_SIZE = 2048
+JPEG_QUALITY = 82
+
+CUBE_FACES = ("f", "r", "b", "l", "u", "d")
+
+# Los paneles 360 muy grandes superan el límite de seguridad de Pillow
+Image.MAX_IMAGE_PIXELS = 400_000_000
+
+
+def render_derivatives(
+    source_path: str,
+    output_dir: str,
+    tiles: bool = False,
+    thumbnail_size: int = THUMBNAIL_SIZE,
+    preview_size: int = PREVIEW_SIZE,
+    tile_size: int = TILE_SIZE,
+    max_face_size: int = MAX_FACE_SIZE
+) -> Dict:
+    """
+    Genera los derivados de una imagen en `output_dir`
+
+    Args:
+        source_path: Imagen original
+        output_dir: Directorio de salida (debe existir)
+        tiles: Generar la pirámide de teselas (solo fotos 360 equirectangulares)
+
+    Returns:
+        Dict con width, height, thumbnail, preview (rutas relativas) y
+        tiles (configuración de la pirámide o None)
+    """
+    with Image.open(source_path) as image:
+        width, height = image.size
+
+    result = {
+        "width": width,
+        "height": height,
+        "thumbnail": _save_resized(source_path, output_dir, "thumbnail.jpg", thumbnail_size),
+        "preview": _save_resized(source_path, output_dir, "preview.jpg", preview_size),
+        "tiles": None,
+    }
+
+    if tiles:
+        result["tiles"] = render_cube_tiles(source_path, output_dir, tile_size, max_face_size)
+    return result
+
+
+def _save_resized(source_path: str, output_dir: str, name: str, size: int) -> str:
+    """Reduce la imagen para que su lado mayor sea `size` y la guarda en JPEG"""
+    with Image.open(source_path) as image:
+        # draft() decodifica el JPEG directamente a escala 1/2, 1/4 u 1/8
+        image.draft("RGB", (size, size))
+        reduced = ImageOps.exif_transpose(image).convert("RGB")
+        reduced.thumbnail((size, size), Image.LANCZOS)
+        reduced.save(os.path.join(output_dir, name), "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return name
+
+
+def render_cube_tiles(source_path: str, output_dir: str, tile_size: int = TILE_SIZE, max_face_size: int = MAX_FACE_SIZE) -> Dict:
+    """
+    Proyecta un panorama equirectangular en un cubo y lo divide en teselas
+
+    El tamaño de cara del nivel superior es el que conserva la resolución
+    original (ancho / π), limitado a `max_face_size`; cada nivel inferior
+    tiene la mitad de resolución hasta llegar a una sola tesela por cara.
+
+    Returns:
+        Configuración multiRes de Pannellum (cubeResolution, tileResolution,
+        maxLevel) y la lista de ficheros generados
+    """
+    with Image.open(source_path) as image:
+        panorama = np.asarray(image.convert("RGB"))
+
+    height, width = panorama.shape[:2]
+    face_size = min(max_face_size, int(2 ** math.floor(math.log2(max(width / math.pi, tile_size)))))
+    face_size = max(face_size, tile_size)
+
+    level_sizes = [face_size]
+    while level_sizes[-1] > tile_size:
+        level_sizes.append(level_sizes[-1] // 2)
+    level_sizes.reverse()
+    max_level = len(level_sizes)
+
+    files: List[str] = []
+    for face in CUBE_FACES:
+        face_image = Image.fromarray(_project_face(panorama, face, face_size))
+        for level, level_size in enumerate(level_sizes, start=1):
+            scaled = face_image if level_size == face_size else face_image.resize((level_size, level_size), Image.LANCZOS)
+            level_dir = os.path.join(output_dir, "tiles", str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            per_side = math.ceil(level_size / tile_size)
+            for row in range(per_side):
+                for col in range(per_side):
+                    box = (col * tile_size, row * tile_size,
+                           min((col + 1) * tile_size, level_size), min((row + 1) * tile_size, level_size))
+                    name = f"{face}{row}_{col}.jpg"
+                    scaled.crop(box).save(os.path.join(level_dir, name), "JPEG", quality=JPEG_QUALITY)
+                    files.append(f"tiles/{level}/{name}")
+
+    return {
+        "type": "multires",
+        "cubeResolution": face_size,
+        "tileResolution": tile_size,
+        "maxLevel": max_level,
+        "extension": "jpg",
+        "files": files,
+    }
+
+
+def _face_directions(face: str, size: int):
+    """Vectores de dirección (x derecha, y arriba, z delante) de cada píxel de una cara"""
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2 - 1
+    u, v = np.meshgrid(coords, coords)
+    one = np.ones_like(u)
+
+    if face == "f":
+        return u, -v, one
+    if face == "r":
+        return one, -v, -u
+    if face == "b":
+        return -u, -v, -one
+    if face == "l":
+        return -one, -v, u
+    if face == "u":
+        return u, one, v
+    if face == "d":
+        return u, -one, -v
+    raise ValueError(f"Unknown cube face '{face}'")
+
+
+def _project_face(panorama: np.ndarray, face: str, size: int) -> np.ndarray:
+    """Muestrea una cara del cubo del panorama con interpolación bilineal"""
+    height, width = panorama.shape[:2]
+    x, y, z = _face_directions(face, size)
+
+    lon = np.arctan2(x, z)
+    lat = np.arctan2(y, np.hypot(x, z))
+
+    # Todo en float32: la precisión sobra para píxeles de 8 bits
+    px = (lon * np.float32(0.5 / np.pi) + np.float32(0.5)) * np.float32(width) - np.float32(0.5)
+    py = (np.float32(0.5) - lat * np.float32(1 / np.pi)) * np.float32(height) - np.float32(0.5)
+    np.clip(py, 0, height - 1, out=py)
+
+    x0 = np.floor(px)
+    y0 = np.floor(py)
+    fx = (px - x0).ravel()[:, None]
+    fy = (py - y0).ravel()[:, None]
+
+    # El eje horizontal es circular; el vertical se recorta en los polos
+    x0 = x0.astype(np.int64).ravel()
+    y0 = y0.astype(np.int64).ravel()
+    x1 = (x0 + 1) % width
+    x0 %= width
+    row0 = y0 * width
+    row1 = np.minimum(y0 + 1, height - 1) * width
+
+    flat = panorama.reshape(-1, panorama.shape[2])
+    top = flat[row0 + x0].astype(np.float32)
+    top += (flat[row0 + x1] - top) * fx
+    bottom = flat[row1 + x0].astype(np.float32)
+    bottom += (flat[row1 + x1] - bottom) * fx
+    top += (bottom - top) * fy + np.float32(0.5)
+    return np.clip(top, 0, 255).astype(np.uint8).reshape(size, size, -1)
+
+
+def tile_url_template(tile_urls: Dict[str, str]) -> Optional[str]:
+    """
+    Plantilla de URL de teselas (formato Pannellum %l/%s%y_%x)
+
+    Solo se devuelve si todas las URLs siguen el mismo patrón; algunos
+    backends (p.ej. Cloudinary con versión) generan URLs no predecibles.
+    """
+    template = None
+    for relative, url in tile_urls.items():
+        _, level, name = relative.split("/")
+        face, position = name[0], os.path.splitext(name[1:])[0]
+        row, col = position.split("_")
+        key = f"{level}/{face}{row}_{col}"
+        if template is None:
+            index = url.rfind(key)
+            if index == -1:
+                return None
+            template = url[:index] + "%l/%s%y_%x" + url[index + len(key):]
+        expected = template.replace("%l", level).replace("%s", face).replace("%y", row).replace("%x", col)
+        if expected != url:
+            return None
+    return template
@@ -0,0 +1,273 @@
+"""
+Lectura de metadatos GPS (EXIF) y GPano (XMP) de imágenes JPEG
+
+Solo se recorren los segmentos de cabecera del JPEG hasta el inicio de los
+datos de imagen (SOS): la imagen no se decodifica y de un panorama de
+decenas de MB se leen normalmente unos pocos KB.
+"""
+
+import re
+import struct
+from typing import BinaryIO, Dict, Optional
+
+# Límite de lectura de cabeceras (los segmentos APP ocupan como mucho 64 KB cada uno)
+MAX_HEADER_BYTES = 1024 * 1024
+
+_EXIF_HEADER = b"Exif\x00\x00"
+_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+
+_GPS_IFD_POINTER = 0x8825
+_GPS_TAGS = {
+    1: "GPSLatitudeRef",
+    2: "GPSLatitude",
+    3: "GPSLongitudeRef",
+    4: "GPSLongitude",
+    5: "GPSAltitudeRef",
+    6: "GPSAltitude",
+    16: "GPSImgDirectionRef",
+    17: "GPSImgDirection",
+}
+# Tamaño en bytes de cada tipo TIFF
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+_XMP_PROPERTIES = (
+    "GPano:PoseHeadingDegrees",
+    "GPano:ProjectionType",
+    "exif:GPSLatitude",
+    "exif:GPSLongitude",
+    "exif:GPSAltitude",
+    "exif:GPSAltitudeRef",
+)
+
+
+def read_image_metadata(fileobj: BinaryIO, max_bytes: int = MAX_HEADER_BYTES) -> Dict:
+    """
+    Extrae posición y orientación de las cabeceras de un JPEG
+
+    El fichero se deja de nuevo al inicio. Los ficheros que no son JPEG o
+    no tienen metadatos devuelven un dict vacío.
+
+    Returns:
+        Dict con las claves encontradas de: geo_latitude, geo_longitude,
+        geo_altitude, heading, projection_type
+    """
+    exif, xmp = {}, {}
+    try:
+        fileobj.seek(0)
+        for marker, payload in _iter_app1_segments(fileobj, max_bytes):
+            if payload.startswith(_EXIF_HEADER) and not exif:
+                exif = _parse_exif_gps(payload[len(_EXIF_HEADER):])
+            elif payload.startswith(_XMP_HEADER) and not xmp:
+                xmp = _parse_xmp(payload[len(_XMP_HEADER):].decode("utf-8", errors="replace"))
+    except (struct.error, ValueError, IndexError, ZeroDivisionError, TypeError, AttributeError):
+        # Los metadatos son opcionales: una cabecera rara nunca debe fallar la subida
+        pass
+    finally:
+        fileobj.seek(0)
+
+    # EXIF tiene prioridad para la posición; GPano para el rumbo del panorama
+    metadata = {}
+    for key in ("geo_latitude", "geo_longitude", "geo_altitude"):
+        value = exif.get(key) if exif.get(key) is not None else xmp.get(key)
+        if value is not None:
+            metadata[key] = value
+    heading = xmp.get("heading") if xmp.get("heading") is not None else exif.get("heading")
+    if heading is not None:
+        metadata["heading"] = heading % 360
+    if xmp.get("projection_type"):
+        metadata["projection_type"] = xmp["projection_type"]
+    return metadata
+
+
+def _iter_app1_segments(fileobj: BinaryIO, max_bytes: int):
+    """Recorre los marcadores JPEG y devuelve (marcador, contenido) de cada APP1"""
+    if fileobj.read(2) != b"\xff\xd8":
+        return
+
+    position = 2
+    while position < max_bytes:
+        byte = fileobj.read(1)
+        if not byte:
+            return
+        if byte != b"\xff":
+            return
+        marker = fileobj.read(1)
+        while marker == b"\xff":
+            marker = fileobj.read(1)
+        if not marker:
+            return
+
+        code = marker[0]
+        # Fin de imagen o comienzo de los datos comprimidos: no hay más cabeceras
+        if code in (0xD9, 0xDA):
+            return
+        # Marcadores sin longitud
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            position += 2
+            continue
+
+        length = struct.unpack(">H", fileobj.read(2))[0] - 2
+        if length < 0:
+            return
+        if code == 0xE1:
+            yield code, fileobj.read(length)
+        else:
+            fileobj.seek(length, 1)
+        position += 4 + length
+
+
+def _parse_exif_gps(tiff: bytes) -> Dict:
+    """Lee el bloque GPS de una cabecera TIFF/EXIF"""
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return {}
+
+    ifd0 = struct.unpack(order + "I", tiff[4:8])[0]
+    gps_offset = _read_ifd(tiff, ifd0, order, {_GPS_IFD_POINTER: "gps"}).get("gps")
+    if not gps_offset:
+        return {}
+
+    gps = _read_ifd(tiff, gps_offset, order, _GPS_TAGS)
+    result = {}
+
+    latitude = _dms_to_degrees(gps.get("GPSLatitude"))
+    longitude = _dms_to_degrees(gps.get("GPSLongitude"))
+    if latitude is not None and longitude is not None:
+        if _ref(gps.get("GPSLatitudeRef")).upper().startswith("S"):
+            latitude = -latitude
+        if _ref(gps.get("GPSLongitudeRef")).upper().startswith("W"):
+            longitude = -longitude
+        # 0,0 es el valor que escriben algunas cámaras sin cobertura GPS
+        if (latitude, longitude) != (0.0, 0.0):
+            result["geo_latitude"] = round(latitude, 8)
+            result["geo_longitude"] = round(longitude, 8)
+
+    altitude = _first(gps.get("GPSAltitude"))
+    if altitude is not None:
+        below_sea = _ref(gps.get("GPSAltitudeRef")) in ("\x01", "1")
+        result["geo_altitude"] = round(-altitude if below_sea else altitude, 3)
+
+    heading = _first(gps.get("GPSImgDirection"))
+    if heading is not None:
+        result["heading"] = float(heading)
+    return result
+
+
+def _read_ifd(tiff: bytes, offset: int, order: str, tags: Dict[int, str]) -> Dict:
+    """Valores de las etiquetas pedidas de un IFD"""
+    values = {}
+    count = struct.unpack(order + "H", tiff[offset:offset + 2])[0]
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        tag, value_type, value_count = struct.unpack(order + "HHI", tiff[entry:entry + 8])
+        name = tags.get(tag)
+        if name is None or value_type not in _TYPE_SIZES:
+            continue
+
+        size = _TYPE_SIZES[value_type] * value_count
+        if size <= 4:
+            data = tiff[entry + 8:entry + 8 + size]
+        else:
+            data_offset = struct.unpack(order + "I", tiff[entry + 8:entry + 12])[0]
+            data = tiff[data_offset:data_offset + size]
+        if len(data) < size:
+            continue
+
+        if name == "gps":
+            values[name] = struct.unpack(order + "I", data[:4])[0]
+        else:
+            values[name] = _decode_value(data, value_type, value_count, order)
+    return values
+
+
+def _decode_value(data: bytes, value_type: int, count: int, order: str):
+    if value_type == 2:
+        return data.rstrip(b"\x00").decode("ascii", errors="replace")
+    if value_type in (1, 7):
+        return list(data[:count])
+    if value_type == 3:
+        return list(struct.unpack(order + "H" * count, data))
+    if value_type in (4, 9):
+        return list(struct.unpack(order + ("I" if value_type == 4 else "i") * count, data))
+
+    raw = struct.unpack(order + ("I" if value_type == 5 else "i") * (2 * count), data)
+    return [raw[i] / raw[i + 1] if raw[i + 1] else None for i in range(0, len(raw), 2)]
+
+
+def _ref(value) -> str:
+    """Referencia GPS (N/S, E/W, 0/1) como texto, sea ASCII, BYTE o UNDEFINED"""
+    if isinstance(value, list):
+        value = bytes(value).rstrip(b"\x00").decode("ascii", errors="replace")
+    return value if isinstance(value, str) else ""
+
+
+def _first(values) -> Optional[float]:
+    if isinstance(values, list) and values and values[0] is not None:
+        return values[0]
+    return None
+
+
+def _dms_to_degrees(values) -> Optional[float]:
+    if not isinstance(values, list) or len(values) != 3 or None in values:
+        return None
+    degrees, minutes, seconds = values
+    return degrees + minutes / 60 + seconds / 3600
+
+
+def _parse_xmp(xml: str) -> Dict:
+    """Extrae GPano y GPS de un paquete XMP (atributos o elementos)"""
+    properties = {}
+    for name in _XMP_PROPERTIES:
+        match = (
+            re.search(rf'{name}\s*=\s*"([^"]*)"', xml)
+            or re.search(rf"<{name}>([^<]*)</{name}>", xml)
+        )
+        if match:
+            properties[name] = match.group(1).strip()
+
+    result = {}
+    if "GPano:PoseHeadingDegrees" in properties:
+        result["heading"] = _parse_float(properties["GPano:PoseHeadingDegrees"])
+    if "GPano:ProjectionType" in properties:
+        result["projection_type"] = properties["GPano:ProjectionType"]
+
+    latitude = _parse_xmp_coordinate(properties.get("exif:GPSLatitude"))
+    longitude = _parse_xmp_coordinate(properties.get("exif:GPSLongitude"))
+    if latitude is not None and longitude is not None:
+        result["geo_latitude"] = round(latitude, 8)
+        result["geo_longitude"] = round(longitude, 8)
+
+    altitude = _parse_float(properties.get("exif:GPSAltitude"))
+    if altitude is not None:
+        below_sea = properties.get("exif:GPSAltitudeRef") == "1"
+        result["geo_altitude"] = round(-altitude if below_sea else altitude, 3)
+    return result
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    """Número decimal o racional XMP ('1234/10')"""
+    if not value:
+        return None
+    try:
+        if "/" in value:
+            numerator, denominator = value.split("/", 1)
+            return float(numerator) / float(denominator)
+        return float(value)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _parse_xmp_coordinate(value: Optional[str]) -> Optional[float]:
+    """Coordenada XMP 'DDD,MM.mmk' o 'DDD,MM,SSk' (k = N, S, E o W)"""
+    if not value or value[-1].upper() not in "NSEW":
+        return None
+    try:
+        parts = [float(part) for part in value[:-1].split(",")]
+    except ValueError:
+        return None
+
+    degrees = parts[0] + (parts[1] / 60 if len(parts) > 1 else 0) + (parts[2] / 3600 if len(parts) > 2 else 0)
+    return -degrees if value[-1].upper() in "SW" else degrees
@@ -0,0 +1,130 @@
+"""
+Codificación de teselas vectoriales Mapbox (MVT 2.1) con geometrías de punto
+
+Implementación mínima del formato protobuf de la especificación
+(https://github.com/mapbox/vector-tile-spec): capas con puntos y
+atributos, sin dependencias externas. Incluye la aritmética de teselas
+XYZ de Web Mercator (EPSG:3857).
+"""
+
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Semieje del mundo en Web Mercator (metros)
+MERCATOR_HALF_WORLD = 20037508.342789244
+DEFAULT_EXTENT = 4096
+
+# Tipos de cable protobuf
+_VARINT = 0
+_FIXED64 = 1
+_LENGTH = 2
+
+_POINT = 1
+_MOVE_TO_ONE = (1 << 3) | 1  # MoveTo con un punto
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Límites (min_x, min_y, max_x, max_y) de una tesela XYZ en metros Web Mercator"""
+    span = 2 * MERCATOR_HALF_WORLD / (2 ** z)
+    min_x = -MERCATOR_HALF_WORLD + x * span
+    max_y = MERCATOR_HALF_WORLD - y * span
+    return min_x, max_y - span, min_x + span, max_y
+
+
+def mercator_to_geo(mx: float, my: float) -> Tuple[float, float]:
+    """Metros Web Mercator a (longitud, latitud)"""
+    longitude = mx / MERCATOR_HALF_WORLD * 180
+    latitude = math.degrees(2 * math.atan(math.exp(my / MERCATOR_HALF_WORLD * math.pi)) - math.pi / 2)
+    return longitude, latitude
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _key(field, _LENGTH) + _varint(len(payload)) + payload
+
+
+def _encode_value(value) -> bytes:
+    """Mensaje Value de la especificación (string, double, uint, sint o bool)"""
+    if isinstance(value, bool):
+        return _key(7, _VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, _VARINT) + _varint(value)
+        return _key(6, _VARINT) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, _FIXED64) + struct.pack("<d", value)
+    return _length_delimited(1, str(value).encode("utf-8"))
+
+
+def encode_layer(
+    name: str,
+    features: Iterable[Tuple[Optional[int], int, int, Dict]],
+    extent: int = DEFAULT_EXTENT
+) -> bytes:
+    """
+    Codifica una capa de puntos
+
+    Args:
+        name: Nombre de la capa
+        features: (id, x, y, atributos) con x/y en coordenadas de tesela
+            (0..extent, y hacia abajo); los atributos None se omiten
+        extent: Resolución de la tesela
+
+    Returns:
+        Mensaje Layer serializado (vacío si no hay elementos)
+    """
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, object], int] = {}
+    encoded_features: List[bytes] = []
+
+    for feature_id, x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            key_index = keys.setdefault(key, len(keys))
+            value_index = values.setdefault((type(value), value), len(values))
+            tags += (key_index, value_index)
+
+        feature = b""
+        if feature_id is not None:
+            feature += _key(1, _VARINT) + _varint(feature_id)
+        if tags:
+            feature += _length_delimited(2, b"".join(_varint(tag) for tag in tags))
+        feature += _key(3, _VARINT) + _varint(_POINT)
+        geometry = _varint(_MOVE_TO_ONE) + _varint(_zigzag(x)) + _varint(_zigzag(y))
+        feature += _length_delimited(4, geometry)
+        encoded_features.append(_length_delimited(2, feature))
+
+    if not encoded_features:
+        return b""
+
+    layer = _key(15, _VARINT) + _varint(2)
+    layer += _length_delimited(1, name.encode("utf-8"))
+    layer += b"".join(encoded_features)
+    layer += b"".join(_length_delimited(3, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_length_delimited(4, _encode_value(value)) for _, value in values)
+    layer += _key(5, _VARINT) + _varint(extent)
+    return layer
+
+
+def encode_tile(layers: Iterable[bytes]) -> bytes:
+    """Mensaje Tile a partir de capas ya codificadas con encode_layer"""
+    return b"".join(_length_delimited(3, layer) for layer in layers if layer)
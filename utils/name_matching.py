@@ -0,0 +1,117 @@
+"""
+Índice en memoria para emparejar nombres de imagen con registros
+
+Sustituye a las consultas `LIKE '%nombre%'` por fila en la importación de
+coordenadas: los nombres del proyecto se cargan una vez y cada búsqueda se
+resuelve en memoria con tres niveles, de más a menos estricto:
+
+1. Coincidencia exacta
+2. Coincidencia normalizada (sin mayúsculas ni espacios sobrantes)
+3. Subcadena: el nombre buscado está contenido en el nombre registrado
+"""
+
+import bisect
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+_SEPARATOR = "\x00"
+_NOT_FOUND = object()
+
+
+def normalize_name(name: str) -> str:
+    """Normaliza un nombre para compararlo (minúsculas y espacios colapsados)"""
+    return _WHITESPACE.sub(" ", str(name)).strip().casefold()
+
+
+class NameMatchIndex:
+    """
+    Índice de nombres -> valor (normalmente el id del registro)
+
+    Si varios registros coinciden se devuelve el primero añadido, igual que
+    hacía `.first()` sobre la consulta ordenada por id.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]] = ()):
+        self._exact: Dict[str, Any] = {}
+        self._normalized: Dict[str, Any] = {}
+        self._values: List[Any] = []
+        self._offsets: List[int] = []
+        self._blob_parts: List[str] = []
+        self._blob_length = 0
+        self._blob: Optional[str] = None
+        self._substring_cache: Dict[str, Any] = {}
+
+        for name, value in entries:
+            self.add(name, value)
+
+    def add(self, name: Optional[str], value: Any):
+        """Añade un nombre al índice"""
+        if not name:
+            return
+
+        normalized = normalize_name(name)
+        self._exact.setdefault(name, value)
+        self._normalized.setdefault(normalized, value)
+
+        self._offsets.append(self._blob_length)
+        self._values.append(value)
+        self._blob_parts.append(normalized)
+        self._blob_length += len(normalized) + len(_SEPARATOR)
+        self._blob = None
+        self._substring_cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def resolve(self, name: Optional[str]) -> Optional[Any]:
+        """Devuelve el valor asociado a `name` o None si no hay coincidencia"""
+        if name is None:
+            return None
+
+        name = str(name).strip()
+        if not name:
+            return None
+
+        value = self._exact.get(name, _NOT_FOUND)
+        if value is not _NOT_FOUND:
+            return value
+
+        normalized = normalize_name(name)
+        value = self._normalized.get(normalized, _NOT_FOUND)
+        if value is not _NOT_FOUND:
+            return value
+
+        return self._resolve_substring(normalized)
+
+    def _resolve_substring(self, normalized: str) -> Optional[Any]:
+        """
+        Busca `normalized` como subcadena de algún nombre registrado
+
+        Todos los nombres se concatenan en un único texto separado por un
+        carácter que no puede aparecer en ellos; str.find recorre ese texto
+        en C y bisect traduce la posición encontrada al registro.
+        """
+        cached = self._substring_cache.get(normalized, _NOT_FOUND)
+        if cached is not _NOT_FOUND:
+            return cached
+
+        if self._blob is None:
+            self._blob = _SEPARATOR.join(self._blob_parts) + _SEPARATOR
+
+        value = None
+        position = self._blob.find(normalized)
+        while position != -1:
+            index = bisect.bisect_right(self._offsets, position) - 1
+            entry_end = self._offsets[index] + len(self._blob_parts[index])
+            if position + len(normalized) <= entry_end:
+                value = self._values[index]
+                break
+            # La coincidencia cruzaba el separador: seguir en el siguiente nombre
+            next_index = index + 1
+            if next_index >= len(self._offsets):
+                break
+            position = self._blob.find(normalized, self._offsets[next_index])
+
+        self._substring_cache[normalized] = value
+        return value
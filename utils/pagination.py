@@ -0,0 +1,123 @@
+"""
+Paginación por cursor (keyset) y filtros comunes de los listados
+
+El cursor codifica el último (valor de orden, id) devuelto, de modo que la
+página siguiente se obtiene con un WHERE sobre el índice en lugar de un
+OFFSET que recorre todas las filas anteriores.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+# Tamaño de página cuando se envía cursor sin limit (sin ninguno de los dos
+# el listado se devuelve completo, como antes de paginar)
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "5000"))
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    """Cursor opaco para continuar después de (value, row_id)"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """
+    Raises:
+        ValueError: cursor mal formado o generado con otro orden
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise ValueError("Cursor does not match the requested sort")
+    if sort != "id" and value is not None:
+        value = datetime.fromisoformat(value)
+    return value, row_id
+
+
+def parse_list(value: Optional[str]) -> Optional[List[str]]:
+    """'a,b' -> ['a', 'b'] (None si no hay valores)"""
+    if value is None:
+        return None
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    return items or None
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    'min_x,min_y,max_x,max_y' -> tupla de floats
+
+    Raises:
+        ValueError: formato incorrecto o mínimos mayores que máximos
+    """
+    if not value:
+        return None
+    try:
+        min_x, min_y, max_x, max_y = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be 'min_x,min_y,max_x,max_y'")
+    if min_x > max_x or min_y > max_y:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_x, min_y, max_x, max_y
+
+
+def paginate(query, id_column, sort_column=None, sort: str = "id", limit: int = None,
+             cursor: Optional[str] = None, descending: bool = False):
+    """
+    Aplica orden, cursor y límite a una consulta
+
+    Args:
+        query: Consulta ya filtrada
+        id_column: Columna id (desempate y orden por defecto)
+        sort_column: Columna de orden si sort != 'id' (p.ej. created_at)
+        sort: Nombre del orden (se guarda en el cursor)
+        limit: Tamaño de página (acotado a MAX_PAGE_SIZE). Sin limit ni
+            cursor se devuelven todas las filas
+        cursor: Cursor devuelto por la página anterior
+        descending: Orden descendente
+
+    Returns:
+        (filas, cursor de la página siguiente o None)
+
+    Raises:
+        ValueError: cursor inválido
+    """
+    sort_column = id_column if sort == "id" else sort_column
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            query = query.filter(id_column < row_id if descending else id_column > row_id)
+        elif descending:
+            query = query.filter(or_(sort_column < value, and_(sort_column == value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_column > value, and_(sort_column == value, id_column > row_id)))
+
+    if sort == "id":
+        order = [id_column.desc() if descending else id_column.asc()]
+    else:
+        order = [sort_column.desc(), id_column.desc()] if descending else [sort_column.asc(), id_column.asc()]
+
+    # Clientes que no paginan: listado completo
+    if limit is None and not cursor:
+        return query.order_by(*order).all(), None
+
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = last.id if sort == "id" else getattr(last, sort_column.key)
+        next_cursor = encode_cursor(sort, value, last.id)
+    return rows, next_cursor
@@ -0,0 +1,152 @@
+"""
+Respuestas compactas de los listados (capas de mapa)
+
+Con ?fields= solo se leen de la base de datos las columnas pedidas y con
+?format= se elige la forma del cuerpo:
+
+- objects: lista de objetos (igual que la respuesta normal)
+- columnar: {"count": n, "columns": {campo: [valores...]}}
+- arrays: {"fields": [campos], "rows": [[valores...], ...]}
+
+Si el cliente envía `Accept: application/msgpack` y msgpack está instalado
+el cuerpo se codifica en MessagePack en lugar de JSON. El JSON se genera con
+orjson cuando está disponible (varias veces más rápido que el módulo json).
+"""
+
+import json
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from utils.pagination import parse_list
+
+# Importaciones opcionales de serializadores rápidos
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+LIST_FORMATS = ("objects", "columnar", "arrays")
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def select_fields(model, fields: Optional[str], default: Iterable[str]) -> List[str]:
+    """
+    Columnas a leer para un listado compacto
+
+    Args:
+        model: Modelo SQLAlchemy del listado
+        fields: Valor de ?fields= ('id,project_x,project_y')
+        default: Campos si no se pide ninguno (los del modelo de respuesta)
+
+    Returns:
+        Nombres de columna, siempre con 'id' en primer lugar
+
+    Raises:
+        ValueError: campos que no son columnas del modelo
+    """
+    columns = model.__table__.columns.keys()
+    names = parse_list(fields)
+    if names is None:
+        names = [name for name in default if name in columns]
+    else:
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def wants_msgpack(request: Request) -> bool:
+    """El cliente acepta MessagePack y está disponible"""
+    accept = request.headers.get("accept", "")
+    return MSGPACK_AVAILABLE and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def _encode_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(body) -> bytes:
+    """JSON compacto en UTF-8 (orjson si está instalado)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(body, default=_encode_default)
+    return json.dumps(body, default=_encode_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def format_rows(
+    names: List[str],
+    rows: Sequence[Sequence],
+    list_format: str = "objects",
+    transforms: Optional[Dict[str, Callable]] = None
+):
+    """
+    Da forma a filas de columnas sueltas ('objects', 'columnar' o 'arrays')
+
+    Args:
+        names: Nombres de los campos, en el orden de cada fila
+        rows: Filas de valores; las columnas sobrantes al final se ignoran
+        list_format: 'objects', 'columnar' o 'arrays'
+        transforms: Conversión por campo (p.ej. etiquetas separadas por comas)
+
+    Raises:
+        ValueError: formato desconocido
+    """
+    if list_format not in LIST_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(LIST_FORMATS)}")
+
+    width = len(names)
+    values = [list(row[:width]) for row in rows]
+    for name, transform in (transforms or {}).items():
+        if name in names:
+            position = names.index(name)
+            for row in values:
+                row[position] = transform(row[position])
+
+    if list_format == "objects":
+        return [dict(zip(names, row)) for row in values]
+    if list_format == "columnar":
+        return {"count": len(values), "columns": {name: [row[i] for row in values] for i, name in enumerate(names)}}
+    return {"fields": names, "rows": values}
+
+
+def encode_body(request: Request, body, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Respuesta JSON o MessagePack según la cabecera Accept"""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept"
+    if wants_msgpack(request):
+        content = msgpack.packb(body, default=_encode_default, use_bin_type=True)
+        return Response(content=content, media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return Response(content=dumps_json(body), media_type="application/json", headers=headers)
+
+
+def render_rows(
+    request: Request,
+    names: List[str],
+    rows: Sequence[Sequence],
+    list_format: str = "objects",
+    transforms: Optional[Dict[str, Callable]] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Serializa filas de columnas sueltas en el formato pedido
+
+    Args:
+        request: Petición (negociación JSON/MessagePack por Accept)
+        headers: Cabeceras a copiar (paginación)
+        (resto como format_rows)
+
+    Raises:
+        ValueError: formato desconocido
+    """
+    return encode_body(request, format_rows(names, rows, list_format, transforms), headers)
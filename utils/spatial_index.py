@@ -0,0 +1,143 @@
+"""
+Índice espacial de los objetos de proyecto (consultas por bbox del mapa)
+
+Se indexan las coordenadas UTM, que comparten fotos, galería, incidencias y
+ProjectObject:
+
+- PostgreSQL: índice GiST sobre point(utm_easting, utm_northing). No
+  requiere PostGIS (tipos geométricos nativos).
+- SQLite: una tabla virtual R*Tree por tabla ({tabla}_rtree), mantenida
+  con triggers de inserción, actualización y borrado.
+
+Si la base de datos no soporta ninguno de los dos (SQLite compilado sin
+R*Tree) las consultas usan solo el filtro por rango de columnas.
+"""
+
+from typing import Tuple
+
+from sqlalchemy import and_, column, func, select, table, text
+
+# Tablas con columnas utm_easting / utm_northing indexadas
+SPATIAL_TABLES = ("photos", "gallery_images", "incidents", "project_objects")
+
+# Modo activo: 'gist', 'rtree' o None (sin índice espacial)
+_mode = None
+
+_RTREE_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS {table}_rtree_insert AFTER INSERT ON {table}
+WHEN NEW.utm_easting IS NOT NULL AND NEW.utm_northing IS NOT NULL
+BEGIN
+    INSERT INTO {table}_rtree VALUES (NEW.id, NEW.utm_easting, NEW.utm_easting, NEW.utm_northing, NEW.utm_northing);
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_rtree_update AFTER UPDATE OF id, utm_easting, utm_northing ON {table}
+BEGIN
+    DELETE FROM {table}_rtree WHERE id = OLD.id;
+    INSERT INTO {table}_rtree
+    SELECT NEW.id, NEW.utm_easting, NEW.utm_easting, NEW.utm_northing, NEW.utm_northing
+    WHERE NEW.utm_easting IS NOT NULL AND NEW.utm_northing IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_rtree_delete AFTER DELETE ON {table}
+BEGIN
+    DELETE FROM {table}_rtree WHERE id = OLD.id;
+END;
+"""
+
+
+def install_spatial_indexes(engine) -> str:
+    """
+    Crea (si faltan) los índices espaciales de SPATIAL_TABLES
+
+    En SQLite además se rellena cada R*Tree cuando no coincide con su tabla
+    (primera instalación o cambios hechos sin los triggers).
+
+    Returns:
+        Modo activo ('gist', 'rtree' o 'none')
+    """
+    global _mode
+    dialect = engine.dialect.name
+
+    with engine.connect() as conn:
+        if dialect == "postgresql":
+            for name in SPATIAL_TABLES:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_{name}_utm_gist "
+                    f"ON {name} USING gist (point(utm_easting, utm_northing))"
+                ))
+            conn.commit()
+            _mode = "gist"
+
+        elif dialect == "sqlite":
+            try:
+                for name in SPATIAL_TABLES:
+                    conn.execute(text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_rtree "
+                        f"USING rtree(id, min_x, max_x, min_y, max_y)"
+                    ))
+                    for statement in _RTREE_TRIGGERS.format(table=name).split("END;"):
+                        if statement.strip():
+                            conn.execute(text(statement + "END;"))
+                    _sync_rtree(conn, name)
+                conn.commit()
+                _mode = "rtree"
+            except Exception as e:
+                conn.rollback()
+                print(f"[SPATIAL] R*Tree no disponible, se usará el filtro por rango: {e}")
+                _mode = None
+
+    print(f"[SPATIAL] Índice espacial: {_mode or 'none'}")
+    return _mode or "none"
+
+
+def _sync_rtree(conn, name: str):
+    """Reconstruye el R*Tree de una tabla si su número de filas no coincide"""
+    indexed = conn.execute(text(f"SELECT count(*) FROM {name}_rtree")).scalar()
+    positioned = conn.execute(text(
+        f"SELECT count(*) FROM {name} WHERE utm_easting IS NOT NULL AND utm_northing IS NOT NULL"
+    )).scalar()
+    if indexed == positioned:
+        return
+
+    conn.execute(text(f"DELETE FROM {name}_rtree"))
+    conn.execute(text(
+        f"INSERT INTO {name}_rtree "
+        f"SELECT id, utm_easting, utm_easting, utm_northing, utm_northing FROM {name} "
+        f"WHERE utm_easting IS NOT NULL AND utm_northing IS NOT NULL"
+    ))
+    print(f"[SPATIAL] {name}_rtree reconstruido ({positioned} puntos)")
+
+
+def bbox_filter(model, bbox: Tuple[float, float, float, float]):
+    """
+    Condición SQLAlchemy "punto UTM dentro del bbox" para un modelo
+
+    El filtro por rango de columnas se aplica siempre: el R*Tree guarda
+    float32 (redondeado hacia fuera) y solo preselecciona candidatos.
+
+    Args:
+        model: Modelo de una de las SPATIAL_TABLES
+        bbox: (min_easting, min_northing, max_easting, max_northing)
+    """
+    min_x, min_y, max_x, max_y = bbox
+    exact = and_(
+        model.utm_easting.between(min_x, max_x),
+        model.utm_northing.between(min_y, max_y),
+    )
+
+    if _mode == "gist":
+        box = func.box(func.point(min_x, min_y), func.point(max_x, max_y))
+        return and_(func.point(model.utm_easting, model.utm_northing).op("<@")(box), exact)
+
+    if _mode == "rtree":
+        rtree = table(
+            f"{model.__tablename__}_rtree",
+            column("id"), column("min_x"), column("max_x"), column("min_y"), column("max_y")
+        )
+        candidates = select(rtree.c.id).where(
+            rtree.c.max_x >= min_x, rtree.c.min_x <= max_x,
+            rtree.c.max_y >= min_y, rtree.c.min_y <= max_y,
+        )
+        return and_(model.id.in_(candidates), exact)
+
+    return exact
@@ -0,0 +1,162 @@
+"""
+Servicio de ficheros locales con peticiones parciales (Range)
+
+La versión de Starlette que usamos no soporta cabeceras Range en
+FileResponse. RangeFileResponse añade respuestas 206 para un único rango
+y, si el servidor ASGI ofrece la extensión `http.response.zerocopysend`,
+envía el fichero con sendfile sin copiarlo por el proceso de Python.
+"""
+
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Los nombres publicados llevan marca de tiempo: el contenido no cambia nunca
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta una cabecera Range de un solo rango
+
+    Returns:
+        (inicio, fin) inclusivos, None si no hay que servir un rango
+        (cabecera ausente, varios rangos o formato desconocido)
+
+    Raises:
+        ValueError: el rango no es satisfacible (respuesta 416)
+    """
+    if not header:
+        return None
+
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: los últimos N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse con soporte de Range y envío zero-copy"""
+
+    def __init__(self, *args, byte_range: Optional[Tuple[int, int]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.byte_range = byte_range
+        self.headers["accept-ranges"] = "bytes"
+
+        size = self.stat_result.st_size if self.stat_result is not None else None
+        if byte_range is not None and size is not None:
+            start, end = byte_range
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        size = self.stat_result.st_size if self.stat_result is not None else os.stat(self.path).st_size
+        offset, last = self.byte_range if self.byte_range is not None else (0, size - 1)
+        count = last - offset + 1
+
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if self.send_header_only or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(offset)
+                remaining = count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+                if remaining > 0:
+                    # El fichero se acortó mientras se enviaba
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        if self.background is not None:
+            await self.background()
+
+
+class RangeStaticFiles(StaticFiles):
+    """StaticFiles que responde con RangeFileResponse"""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        response = RangeFileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, method=scope["method"]
+        )
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if status_code != 200:
+            return response
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_range and if_range != response.headers.get("etag"):
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"content-range": f"bytes */{stat_result.st_size}", "accept-ranges": "bytes"}
+            )
+
+        if byte_range is None:
+            return response
+        return RangeFileResponse(
+            full_path,
+            stat_result=stat_result,
+            method=scope["method"],
+            headers={"cache-control": IMMUTABLE_CACHE_CONTROL},
+            byte_range=byte_range
+        )
@@ -0,0 +1,101 @@
+"""
+Registro compartido de transformadores pyproj
+
+Crear un pyproj.Transformer carga estado de la base de datos PROJ y cuesta
+varios milisegundos. El registro construye cada transformador una sola vez
+por proceso (de forma perezosa) y lo reutiliza entre peticiones e hilos.
+
+Desde pyproj 3.1 los objetos Transformer son thread-safe, por lo que una
+misma instancia puede usarse simultáneamente desde varios workers.
+"""
+
+import threading
+import time
+from typing import Dict, Tuple, Union
+from pyproj import Transformer
+
+CRSLike = Union[int, str]
+
+
+def normalize_crs(crs: CRSLike) -> str:
+    """
+    Normaliza un identificador de CRS para usarlo como clave
+
+    Acepta códigos EPSG como entero (25830), cadena numérica ("25830") o
+    con prefijo ("epsg:25830"). Otros identificadores se usan tal cual.
+    """
+    if isinstance(crs, int):
+        return f"EPSG:{crs}"
+
+    value = str(crs).strip()
+    if value.isdigit():
+        return f"EPSG:{value}"
+    if value.upper().startswith("EPSG:"):
+        return f"EPSG:{value[5:].strip()}"
+    return value
+
+
+class TransformerRegistry:
+    """Caché thread-safe de transformadores indexada por (CRS origen, CRS destino)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transformers: Dict[Tuple[str, str], Transformer] = {}
+        self._hits = 0
+        self._misses = 0
+        self._build_seconds = 0.0
+
+    def get(self, source_crs: CRSLike, target_crs: CRSLike) -> Transformer:
+        """
+        Devuelve el transformador source_crs -> target_crs (always_xy=True)
+
+        Se construye la primera vez que se solicita y se reutiliza después.
+        """
+        key = (normalize_crs(source_crs), normalize_crs(target_crs))
+
+        with self._lock:
+            transformer = self._transformers.get(key)
+            if transformer is not None:
+                self._hits += 1
+                return transformer
+
+            self._misses += 1
+            start = time.perf_counter()
+            transformer = Transformer.from_crs(key[0], key[1], always_xy=True)
+            self._build_seconds += time.perf_counter() - start
+            self._transformers[key] = transformer
+            return transformer
+
+    def stats(self) -> Dict:
+        """Contadores de uso del registro"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "transformers": len(self._transformers),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "build_seconds": round(self._build_seconds, 6),
+                "pairs": [f"{source}->{target}" for source, target in self._transformers],
+            }
+
+    def clear(self):
+        """Vacía el registro y reinicia los contadores"""
+        with self._lock:
+            self._transformers.clear()
+            self._hits = 0
+            self._misses = 0
+            self._build_seconds = 0.0
+
+
+_registry = TransformerRegistry()
+
+
+def get_transformer_registry() -> TransformerRegistry:
+    """Registro global del proceso"""
+    return _registry
+
+
+def get_transformer(source_crs: CRSLike, target_crs: CRSLike) -> Transformer:
+    """Atajo para obtener un transformador del registro global"""
+    return _registry.get(source_crs, target_crs)
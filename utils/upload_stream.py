@@ -0,0 +1,95 @@
+"""
+Lectura en streaming de ficheros subidos
+
+HashingReader envuelve el fichero temporal de un UploadFile y calcula el
+tamaño y el hash del contenido a medida que el backend de almacenamiento lo
+va leyendo por bloques, sin cargar nunca la imagen completa en memoria.
+"""
+
+import hashlib
+import os
+from typing import BinaryIO, Optional, Tuple
+
+
+class HashingReader:
+    """Fichero de solo lectura que acumula tamaño y SHA-256 de lo leído"""
+
+    def __init__(self, fileobj: BinaryIO, name: Optional[str] = None, algorithm: str = "sha256"):
+        self._fileobj = fileobj
+        self._algorithm = algorithm
+        self.name = name or "stream"
+        self._reset()
+
+    def _reset(self):
+        self._hash = hashlib.new(self._algorithm)
+        self._size = 0
+        self._position = 0
+        self._complete = True
+
+    @property
+    def size(self) -> int:
+        """Bytes leídos desde el principio del fichero"""
+        return self._size
+
+    def hexdigest(self) -> Optional[str]:
+        """Hash de lo leído (None si la lectura no fue secuencial desde el inicio)"""
+        return self._hash.hexdigest() if self._complete else None
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._fileobj.read(size)
+        if self._position == self._size:
+            self._hash.update(chunk)
+            self._size += len(chunk)
+        else:
+            self._complete = False
+        self._position += len(chunk)
+        return chunk
+
+    def tell(self) -> int:
+        return self._fileobj.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._fileobj.seek(offset, whence)
+        if position == 0:
+            # Volver al inicio reinicia el cálculo (p.ej. reintentos)
+            self._reset()
+        else:
+            self._position = position
+        return position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self):
+        """No cierra el fichero subyacente: pertenece al UploadFile"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def hash_stream(fileobj: BinaryIO, algorithm: str = "sha256", chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+    """
+    Calcula hash y tamaño de un fichero leyéndolo por bloques
+
+    El fichero queda de nuevo al inicio para poder subirlo después.
+
+    Returns:
+        (hexdigest, tamaño en bytes)
+    """
+    digest = hashlib.new(algorithm)
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size